@@ -0,0 +1,70 @@
+"""Report after an incremental crawl as history grows: in-memory engine over csv files
+(gd_blog_spider.reporting.load_report, O(history)) vs aggregates maintained by the crawl state store
+(gd_blog_spider.reporting.state_report, O(changes)). New articles are added to both before the report,
+as blog_check does, results are checked to be the same.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_aggregates --articles 1000 10000 50000
+"""
+import argparse
+import csv
+import datetime
+import os
+import tempfile
+import time
+
+from benchmarks.bench_streaming import make_dataset
+from gd_blog_spider.pipelines import article_rows
+from gd_blog_spider.reporting import load_report, state_report
+from gd_blog_spider.state import CrawlState
+from report import df_to_str
+
+
+def new_articles(first, count):
+    """Function to make articles published after the history (items of an incremental crawl)"""
+    return [{'title': 'New article {}'.format(i), 'url': 'https://blog.example/new-{}/'.format(i), 'text': 'x' * 160,
+             'publication_date': datetime.date(2021, 1, 1) + datetime.timedelta(days=i),
+             'authors': ['Author {}'.format(i)], 'tags': ['Tag {}'.format(i), 'Tag new']}
+            for i in range(first, first + count)]
+
+
+def rendered(result):
+    return list(result.top7_tags.items()), df_to_str(result.top5_articles), df_to_str(result.top5_authors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--new', type=int, default=10, help='articles scraped by the incremental crawl')
+    args = parser.parse_args()
+
+    print('{:>9} {:>6} {:>16} {:>16} {:>16}'.format('articles', 'new', 'store update, ms', 'csv report, ms',
+                                                    'store report, ms'))
+    for articles in args.articles:
+        with tempfile.TemporaryDirectory() as directory:
+            articles_path, authors_path = make_dataset(directory, articles)
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            state.import_csv(articles_path, authors_path)
+            items = new_articles(articles, args.new)
+
+            start = time.perf_counter()
+            for item in items:  # what the pipeline does with every scraped article
+                state.add_article(item)
+            state.commit()
+            update = time.perf_counter() - start
+            with open(articles_path, mode='a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(row for item in items for row in article_rows(item))
+
+            start = time.perf_counter()
+            expected = load_report(articles_path, authors_path)
+            csv_time = time.perf_counter() - start
+            start = time.perf_counter()
+            result = state_report(state)
+            state_time = time.perf_counter() - start
+            state.close()
+        print('{:>9} {:>6} {:>16.2f} {:>16.1f} {:>16.2f}   {}'.format(
+            articles, args.new, update * 1000, csv_time * 1000, state_time * 1000,
+            'same result' if rendered(result) == rendered(expected) else 'RESULTS DIFFER'))
+
+
+if __name__ == '__main__':
+    main()
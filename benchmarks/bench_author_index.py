@@ -0,0 +1,79 @@
+"""Cost of updating authors counters: full authors.csv rewrite per article (old blog_check behaviour)
+vs AuthorIndex loaded once and saved once
+
+Run from the root directory of the project: python3 -m benchmarks.bench_author_index
+"""
+import csv
+import os
+import shutil
+import tempfile
+import time
+
+from gd_blog_spider.author_index import AuthorIndex
+from gd_blog_spider.pipelines import AUTHORS_HEADER
+
+AUTHORS = 10000
+ARTICLES = 200
+
+
+def make_authors_csv(path):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(AUTHORS_HEADER)
+        for i in range(AUTHORS):
+            writer.writerow(['Author {}'.format(i), 'Engineer', '', 'https://twitter.com/{}'.format(i), 1])
+
+
+def articles_authors():
+    return [['Author {}'.format(i * 37 % AUTHORS), 'Author {}'.format(i * 91 % AUTHORS)] for i in range(ARTICLES)]
+
+
+def rewrite_per_article(path, articles):
+    """Old behaviour: read whole file, nested loop over authors, rewrite whole file"""
+    for looking_for in articles:
+        with open(path, 'r') as f:
+            authors_csv = list(csv.reader(f))
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for author in authors_csv:
+                for target_author in looking_for:
+                    if author[0] == target_author:
+                        author[4] = int(author[4]) + 1
+            writer.writerows(authors_csv)
+
+
+def author_index(path, articles):
+    index = AuthorIndex(path).load()
+    for looking_for in articles:
+        for author in looking_for:
+            index.increment(author)
+    index.save()
+
+
+def main():
+    articles = articles_authors()
+    with tempfile.TemporaryDirectory() as directory:
+        old_path = os.path.join(directory, 'old.csv')
+        new_path = os.path.join(directory, 'new.csv')
+        make_authors_csv(old_path)
+        shutil.copy(old_path, new_path)
+
+        start = time.perf_counter()
+        rewrite_per_article(old_path, articles)
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        author_index(new_path, articles)
+        new = time.perf_counter() - start
+
+        with open(old_path) as f_old, open(new_path) as f_new:
+            assert f_old.read() == f_new.read(), 'outputs differ'
+
+    print('{} authors, {} new articles'.format(AUTHORS, ARTICLES))
+    print('rewrite per article: {:.3f}s'.format(old))
+    print('author index:        {:.3f}s'.format(new))
+    print('speed-up: x{:.0f}'.format(old / new))
+
+
+if __name__ == '__main__':
+    main()
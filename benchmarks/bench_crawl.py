@@ -0,0 +1,138 @@
+"""End-to-end crawl benchmark against the local mock blog (benchmarks/mock_blog.py).
+
+Runs blog_scraper over the whole mock blog, publishes new articles and runs blog_check,
+then edits some articles and authors, updates lastmod of some others and runs blog_update twice
+(second run has nothing to re-crawl).
+For every crawl it reports pages/sec, CPU per page, peak RSS and checks the produced csv files.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_crawl --authors 50 --articles 2000
+Extra scrapy settings can be passed with -s, e.g. -s ADAPTIVE_CONCURRENCY_ENABLED=0
+Slow origin is emulated with --latency and --latency-per-request, failing one with --error-rate
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_blog import MockBlog, MockBlogServer
+from gd_blog_spider.loaders import is_normalized
+from gd_blog_spider.state import CrawlState
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_crawl(spider, base_url, directory, settings=()):
+    """Function to start spider in a separate process inside directory, returns Popen"""
+    command = [sys.executable, '-m', 'scrapy', 'crawl', spider, '-a', 'base_url=' + base_url, '--nolog']
+    for setting in settings:
+        command += ['-s', setting]
+    env = dict(os.environ, SCRAPY_SETTINGS_MODULE='gd_blog_spider.settings',
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    return subprocess.Popen(command, cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_crawl(spider, base_url, directory, settings=()):
+    """Function to run spider in a separate process inside directory. Returns elapsed seconds and rusage"""
+    start = time.perf_counter()
+    process = start_crawl(spider, base_url, directory, settings)
+    _, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError('{} exited with status {}'.format(spider, status))
+    return elapsed, rusage
+
+
+def check_output(blog, directory):
+    """Function to compare csv files with the mock blog content, returns list of problems"""
+    problems = []
+    articles = {}
+    articles_path = os.path.join(directory, 'articles.csv')
+    if is_normalized(articles_path):
+        for url, row in CrawlState.read_normalized_csv(articles_path).items():
+            articles['/' + url.split('/', 3)[3]] = (row['title'], row['text'], row['publication_date'],
+                                                    row['authors'], row['tags'])
+    else:
+        with open(articles_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                path = '/' + row['url'].split('/', 3)[3]
+                article = articles.setdefault(path, (row['title'], row['text'], row['publication_date'], [], []))
+                if row['author'] not in article[3]:
+                    article[3].append(row['author'])
+                if row['tag'] not in article[4]:
+                    article[4].append(row['tag'])
+    expected = blog.expected_articles()
+    if set(articles) != set(expected):
+        problems.append('articles: {} missing, {} unexpected'.format(len(set(expected) - set(articles)),
+                                                                     len(set(articles) - set(expected))))
+    problems += ['article {} differs'.format(path) for path in set(articles) & set(expected)
+                 if articles[path] != expected[path]]
+    authors = {}
+    with open(os.path.join(directory, 'authors.csv'), newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            authors[row['full_name']] = int(row['articles_counter'])
+    expected_authors = blog.expected_authors()
+    if authors != expected_authors:
+        problems.append('authors counters differ for {} author(s)'.format(
+            len(set(authors.items()) ^ set(expected_authors.items()))))
+    return problems
+
+
+def report(name, blog, elapsed, rusage, pages, directory):
+    cpu = rusage.ru_utime + rusage.ru_stime
+    problems = check_output(blog, directory)
+    cpu_per_page = cpu / pages * 1000 if pages else float('nan')  # no pages are fetched, e.g. all of them failed
+    print('{:<12} {:>6} pages {:>8.2f}s {:>9.1f} pages/s {:>8.2f} ms CPU/page {:>8.1f} MiB peak RSS   {}'.format(
+        name, pages, elapsed, pages / elapsed, cpu_per_page, rusage.ru_maxrss / 1024,
+        'output OK' if not problems else '; '.join(problems[:3])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--new-articles', type=int, default=10, help='articles published before blog_check')
+    parser.add_argument('--edited', type=int, default=10,
+                        help='articles (and half as many authors) edited before blog_update')
+    parser.add_argument('--touched', type=int, default=10, help='articles with new lastmod but the same content')
+    parser.add_argument('--latency', type=float, default=0.0, help='injected delay of every response, seconds')
+    parser.add_argument('--latency-per-request', type=float, default=0.0, help='extra delay per request in flight')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 503 responses')
+    parser.add_argument('-s', dest='settings', action='append', default=[], help='scrapy setting NAME=VALUE')
+    args = parser.parse_args()
+
+    blog = MockBlog(args.authors, args.articles)
+    blog.hidden = args.new_articles
+    blog.latency, blog.latency_per_request, blog.error_rate = args.latency, args.latency_per_request, args.error_rate
+    server = MockBlogServer(blog).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            served = blog.requests_served
+            elapsed, rusage = run_crawl('blog_scraper', server.base_url, directory, args.settings)
+            report('blog_scraper', blog, elapsed, rusage, blog.requests_served - served, directory)
+
+            blog.hidden = 0  # new blog-posts are published
+            served = blog.requests_served
+            elapsed, rusage = run_crawl('blog_check', server.base_url, directory, args.settings)
+            report('blog_check', blog, elapsed, rusage, blog.requests_served - served, directory)
+
+            for i in range(args.edited):  # pages changed after the last crawl
+                blog.edit_article(i * len(blog.articles) // args.edited)
+            for i in range(args.touched):
+                blog.touch_article(i * len(blog.articles) // args.touched + 1)
+            for i in range(args.edited // 2):
+                blog.edit_author(i * len(blog.authors) // (args.edited // 2))
+            for name in ('blog_update', 'blog_update'):
+                served, not_modified = blog.requests_served, blog.not_modified_served
+                elapsed, rusage = run_crawl(name, server.base_url, directory, args.settings)
+                report(name, blog, elapsed, rusage, blog.requests_served - served, directory)
+                print('{:<12} {:>6} of them answered 304 Not Modified'.format(
+                    '', blog.not_modified_served - not_modified))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
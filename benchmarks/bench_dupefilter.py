@@ -0,0 +1,73 @@
+"""Requests dedup of a very large crawl: Scrapy RFPDupeFilter (set of fingerprints in memory) vs BloomDupeFilter
+(Bloom filter in memory + exact store on disk, gd_blog_spider.dupefilter). Every url is requested twice, as
+articles of two co-authors are. Every filter runs in a separate process, its peak RSS, time per request,
+memory of the filter and false positives are compared, numbers of dropped requests are checked to be the same.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_dupefilter --urls 100000 1000000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_crawl import ROOT
+
+
+def child(mode, urls, directory):
+    from scrapy.dupefilters import RFPDupeFilter
+    from scrapy.http import Request
+    from gd_blog_spider.dupefilter import BloomDupeFilter
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if mode == 'rfp':
+        dupefilter = RFPDupeFilter()
+    else:
+        dupefilter = BloomDupeFilter(os.path.join(directory, 'dupefilter.db'))
+    dupefilter.open()
+    dropped = 0
+    start = time.perf_counter()
+    for i in range(urls):  # article i // 2 is requested again from the page of its second author
+        for article in (i, i // 2):
+            dropped += bool(dupefilter.request_seen(Request('https://blog.example/article-{}/'.format(article))))
+    elapsed = time.perf_counter() - start
+    if mode == 'rfp':
+        size, false_positives = sum(sys.getsizeof(f) for f in dupefilter.fingerprints), 0
+        size += sys.getsizeof(dupefilter.fingerprints)
+    else:
+        size, false_positives = dupefilter.filter.nbytes, dupefilter.false_positives
+    dupefilter.close('finished')
+    rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+    print(dropped, elapsed, size, false_positives, rss)
+
+
+def run(mode, urls, directory):
+    """Function to run dupefilter in a separate process. Returns dropped, seconds, bytes, false positives, MiB"""
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_dupefilter', '--run', mode, str(urls),
+                             directory], cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    dropped, elapsed, size, false_positives, rss = output.stdout.split()
+    return int(dropped), float(elapsed), int(size), int(false_positives), float(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--urls', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--run', nargs=3, metavar=('MODE', 'URLS', 'DIRECTORY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return child(args.run[0], int(args.run[1]), args.run[2])
+
+    for urls in args.urls:
+        with tempfile.TemporaryDirectory() as directory:
+            results = {mode: run(mode, urls, directory) for mode in ('rfp', 'bloom')}
+        for mode, (dropped, elapsed, size, false_positives, rss) in results.items():
+            print('{:>8} urls  {:<6} {:>8.2f} us/request {:>8.1f} MiB filter {:>8.1f} MiB RSS growth '
+                  '{:>5} false positive(s)   {}'.format(
+                      urls, mode, elapsed / urls / 2 * 1e6, size / 2 ** 20, rss, false_positives,
+                      'same drops' if dropped == results['rfp'][0] == urls else 'DROPS DIFFER'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Articles storage layout: flat csv (row per author and tag pair) vs normalized tables (articles.csv keyed by url
+plus article_authors.csv and article_tags.csv). Compares disk size, written bytes and rows, write time of
+GdBlogSpiderPipeline and report aggregation time.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_layout --articles 50000
+Use --no-report to measure only the writing side (pandas is not needed then)
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from gd_blog_spider.items import ArticleItem
+from gd_blog_spider.pipelines import GdBlogSpiderPipeline
+
+TAGS = 60
+AUTHORS = 400
+
+
+class Spider(object):
+    def __init__(self, directory):
+        self.output_articles = os.path.join(directory, 'articles.csv')
+        self.output_authors = os.path.join(directory, 'authors.csv')
+
+
+def make_items(count, seed=0):
+    """Function to generate article items with up to 3 authors and 3 tags and 160 symbols of text"""
+    rng = random.Random(seed)
+    first_day = datetime.date(2010, 1, 1)
+    return [ArticleItem(title='Article {}'.format(i), url='https://blog.example/article-{}/'.format(i),
+                        text=''.join(rng.choice('abcdefgh ') for _ in range(161)),
+                        publication_date=first_day + datetime.timedelta(days=i % 3650),
+                        authors=['Author {}'.format(rng.randrange(AUTHORS)) for _ in range(rng.randint(1, 3))],
+                        tags=rng.sample(['Tag {}'.format(t) for t in range(TAGS)], rng.randint(1, 3)))
+            for i in range(count)]
+
+
+def write(items, directory, layout):
+    """Function to write items with the pipeline. Returns elapsed seconds, rows and bytes of written files"""
+    spider = Spider(directory)
+    pipeline = GdBlogSpiderPipeline(layout=layout)
+    start = time.perf_counter()
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    elapsed = time.perf_counter() - start
+    writers = [pipeline.articles]
+    if layout == 'normalized':
+        writers += [pipeline.article_authors, pipeline.article_tags]
+    return elapsed, sum(writer.rows_written for writer in writers), sum(os.path.getsize(w.path) for w in writers)
+
+
+def aggregate(directory):
+    from gd_blog_spider.reporting import load_report
+
+    with open(os.path.join(directory, 'authors.csv'), mode='w', encoding='utf-8') as f:
+        f.write('full_name,job_title,linkedin,contact,articles_counter\n')
+        f.writelines('Author {},Engineer,,,{}\n'.format(i, i % 97) for i in range(AUTHORS))
+    start = time.perf_counter()
+    result = load_report(os.path.join(directory, 'articles.csv'), os.path.join(directory, 'authors.csv'))
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=50000)
+    parser.add_argument('--no-report', action='store_true', help="don't measure report aggregation")
+    args = parser.parse_args()
+
+    items = make_items(args.articles)
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        for layout in ('flat', 'normalized'):
+            directory = os.path.join(root, layout)
+            os.mkdir(directory)
+            elapsed, rows, size = write(items, directory, layout)
+            print('{:<10} write {:>7.2f}s {:>9} rows {:>8.1f} MiB on disk'.format(
+                layout, elapsed, rows, size / 2 ** 20))
+            if not args.no_report:
+                results[layout] = aggregate(directory)
+                print('{:<10} report aggregation {:>7.3f}s'.format(layout, results[layout][0]))
+    if results:
+        flat, normalized = results['flat'][1], results['normalized'][1]
+        assert sorted(flat.top7_tags.tolist()) == sorted(normalized.top7_tags.tolist()), 'tags differ'
+        assert flat.top5_articles.url.tolist() == normalized.top5_articles.url.tolist(), 'articles differ'
+
+
+if __name__ == '__main__':
+    main()
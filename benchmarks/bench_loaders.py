@@ -0,0 +1,40 @@
+"""Memory and load time of articles dataset: plain pd.read_csv (old behaviour) vs gd_blog_spider.loaders
+(categorical dtypes, parsed dates, pickle cache)
+
+Run from the root directory of the project: python3 -m benchmarks.bench_loaders [articles]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks import bench_report
+from gd_blog_spider.loaders import load_articles
+
+
+def measure(load):
+    start = time.perf_counter()
+    frame = load()
+    return time.perf_counter() - start, frame.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def main():
+    if len(sys.argv) > 1:
+        bench_report.ARTICLES = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as directory:
+        articles_path, _ = bench_report.make_dataset(directory)
+        print('{} articles ({} rows), {} tags, {} authors, csv {:.1f} MiB'.format(
+            bench_report.ARTICLES, bench_report.ARTICLES * 4, bench_report.TAGS, bench_report.AUTHORS,
+            os.path.getsize(articles_path) / 2 ** 20))
+        results = [('pd.read_csv', measure(lambda: pd.read_csv(articles_path))),
+                   ('load_articles', measure(lambda: load_articles(articles_path))),
+                   ('load_articles, cache miss', measure(lambda: load_articles(articles_path, cache=True))),
+                   ('load_articles, cache hit', measure(lambda: load_articles(articles_path, cache=True)))]
+    for name, (seconds, memory) in results:
+        print('{:<26} {:>8.3f}s {:>9.1f} MiB'.format(name, seconds, memory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Page parsing in worker processes: blog_scraper throughput against the local mock blog
+with PARSE_WORKERS = 0 (parsing in the reactor thread), 1, 2, 4 ... (see gd_blog_spider.parse_pool).
+Article pages are padded with extra markup to be as heavy to parse as real ones.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_parse_pool --workers 0 1 2 4
+Scaling needs free cores: the mock blog server runs in this process and takes one of them
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.bench_crawl import check_output, run_crawl
+from benchmarks.mock_blog import MockBlog, MockBlogServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--authors', type=int, default=20)
+    parser.add_argument('--articles', type=int, default=500)
+    parser.add_argument('--padding', type=int, default=300, help='KiB of extra markup of article pages')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('-s', dest='settings', action='append', default=[], help='scrapy setting NAME=VALUE')
+    args = parser.parse_args()
+
+    blog = MockBlog(args.authors, args.articles)
+    blog.padding = args.padding
+    server = MockBlogServer(blog).start()
+    print('{} cpu(s), {} article pages of {} KiB'.format(os.cpu_count(), args.articles,
+                                                         len(blog.render('/article-0/')) // 1024))
+    try:
+        baseline = None
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as directory:
+                served = blog.requests_served
+                elapsed, rusage = run_crawl('blog_scraper', blog.base_url, directory,
+                                            args.settings + ['PARSE_WORKERS={}'.format(workers)])
+                pages = blog.requests_served - served
+                problems = check_output(blog, directory)
+            rate = pages / elapsed
+            baseline = baseline or rate
+            print('{:>2} worker(s) {:>6} pages {:>8.2f}s {:>9.1f} pages/s  x{:.2f}   {}'.format(
+                workers, pages, elapsed, rate, rate / baseline,
+                'output OK' if not problems else '; '.join(problems[:3])))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Throughput of per-row csv open/append (old spiders behaviour) vs GdBlogSpiderPipeline
+
+Run from the root directory of the project: python3 -m benchmarks.bench_pipeline
+"""
+import csv
+import datetime
+import os
+import tempfile
+import time
+
+from gd_blog_spider.items import ArticleItem
+from gd_blog_spider.pipelines import GdBlogSpiderPipeline, article_rows
+
+ARTICLES = 5000
+
+
+class FakeSpider(object):
+    def __init__(self, directory):
+        self.output_articles = os.path.join(directory, 'articles.csv')
+        self.output_authors = os.path.join(directory, 'authors.csv')
+
+
+def make_items(count):
+    return [ArticleItem(title='Article {}'.format(i), url='https://blog.example/article-{}/'.format(i),
+                        text='x' * 160, publication_date=datetime.date(2020, 1, 1),
+                        authors=['Author {}'.format(i % 50), 'Author {}'.format(i % 7)],
+                        tags=['Search', 'ML & AI', 'E-commerce']) for i in range(count)]
+
+
+def per_row_open(items, path):
+    """Old behaviour: open file in append mode for every parsed page"""
+    for item in items:
+        with open(path, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for row in article_rows(item):
+                writer.writerow(row)
+
+
+def buffered_pipeline(items, directory):
+    pipeline = GdBlogSpiderPipeline()
+    spider = FakeSpider(directory)
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+
+
+def main():
+    items = make_items(ARTICLES)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        per_row_open(items, os.path.join(directory, 'old.csv'))
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        buffered_pipeline(items, directory)
+        new = time.perf_counter() - start
+
+    print('{} articles'.format(ARTICLES))
+    print('per-row open/append: {:.3f}s ({:.0f} items/s)'.format(old, ARTICLES / old))
+    print('buffered pipeline:   {:.3f}s ({:.0f} items/s)'.format(new, ARTICLES / new))
+    print('speed-up: x{:.1f}'.format(old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Overhead of crawl profiling (gd_blog_spider.profiling): instrumented article parsing with profiling
+disabled and enabled vs the same parsing without any instrumentation
+
+Run from the root directory of the project: python3 -m benchmarks.bench_profiling
+A real crawl profile is written with: scrapy crawl blog_scraper -s PROFILING_ENABLED=1
+"""
+import time
+import timeit
+from datetime import datetime
+
+from scrapy.http import HtmlResponse
+
+from gd_blog_spider import profiling
+from gd_blog_spider.extractors import ARTICLE
+from gd_blog_spider.spiders.blog_parse import GDBlogCrawler
+
+REPEAT = 500
+ROUNDS = 7  # best of interleaved rounds, single runs are too noisy for a few percent
+
+
+def bare_articles(response):
+    for article in ARTICLE.extract(response):
+        yield (str(article['title']).replace('\r', '').replace('\n', ' '), response.url, article['text'],
+               datetime.strptime(article['publication_date'], '%b %d, %Y').date(), article['authors'], article['tags'])
+
+
+def cpu_per_page(function, response):
+    start = time.process_time()
+    for _ in range(REPEAT):
+        list(function(response))
+    return (time.process_time() - start) / REPEAT
+
+
+def main():
+    with open('unittests_files/article_sample.htm') as f:
+        response = HtmlResponse(url='https://blog.griddynamics.com/sample/', body=f.read(), encoding='utf-8')
+    assert list(bare_articles(response)) == list(GDBlogCrawler.extract_articles(response)), 'outputs differ'
+
+    stage_disabled = timeit.timeit("with stage('x'): pass", globals={'stage': profiling.stage}, number=10 ** 6)
+    bare, disabled, enabled = [], [], []
+    for _ in range(ROUNDS):
+        bare.append(cpu_per_page(bare_articles, response))
+        disabled.append(cpu_per_page(GDBlogCrawler.extract_articles, response))
+        profiling.active = profiling.Profile()
+        enabled.append(cpu_per_page(GDBlogCrawler.extract_articles, response))
+        profiling.active = None
+    bare, disabled, enabled = min(bare), min(disabled), min(enabled)
+    profiling.active = profiling.Profile()
+    stage_enabled = timeit.timeit("with stage('x'): pass", globals={'stage': profiling.stage}, number=10 ** 5) * 10
+    profiling.active = None
+
+    print('stage(), profiling disabled: {:>8.0f} ns per call'.format(stage_disabled * 1000))
+    print('stage(), profiling enabled:  {:>8.0f} ns per call'.format(stage_enabled * 1000))
+    print('article page, no instrumentation:     {:.1f} us CPU'.format(bare * 10 ** 6))
+    print('article page, profiling disabled:     {:.1f} us CPU ({:+.1f}%)'.format(
+        disabled * 10 ** 6, (disabled / bare - 1) * 100))
+    print('article page, profiling enabled:      {:.1f} us CPU ({:+.1f}%)'.format(
+        enabled * 10 ** 6, (enabled / bare - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
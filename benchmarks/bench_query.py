@@ -0,0 +1,130 @@
+"""Lookups of articles by tag, author, publication dates and words: pandas over articles.csv (load_articles
+and filter, as get_top5_articles_df does) vs the query index (gd_blog_spider.query). The corpus is written to
+the state store and exported as csv, the index is built from the store, then updated incrementally after new
+articles are added (as after blog_check). Newest 10 articles are queried, found urls of every query
+(all of them, without limit) are checked to be the same.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_query --articles 100000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from gd_blog_spider.loaders import load_articles
+from gd_blog_spider.query import ArticleIndex, text_terms
+from gd_blog_spider.state import CrawlState
+
+TAGS = 60
+AUTHORS = 400
+VOCABULARY = 5000
+
+
+def make_corpus(state_db, articles, words=60, seed=0):
+    """Function to fill the state store with articles of Zipf-distributed words, tags and authors"""
+    rng = random.Random(seed)
+    vocabulary = ['w{}'.format(i) for i in range(VOCABULARY)]
+    weights = [1 / (i + 1) for i in range(VOCABULARY)]
+    first_day = datetime.date(2010, 1, 1)
+    state = CrawlState(state_db)
+    for i in range(articles):
+        authors = {'Author {}'.format(int(AUTHORS * rng.random() ** 2)) for _ in range(rng.choice((1, 1, 2)))}
+        tags = {'Tag {}'.format(int(TAGS * rng.random() ** 2)) for _ in range(rng.randint(1, 4))}
+        state.add_article({'title': 'Article {} {}'.format(i, ' '.join(rng.choices(vocabulary, weights, k=5))),
+                           'url': 'https://blog.example/article-{}/'.format(i),
+                           'text': ' '.join(rng.choices(vocabulary, weights, k=words)),
+                           'publication_date': first_day + datetime.timedelta(days=rng.randrange(3650)),
+                           'authors': sorted(authors), 'tags': sorted(tags)})
+    state.close()
+
+
+def pandas_find(articles_path, tag=None, author=None, text=None, since=None, until=None):
+    """Function to answer the query from csv files, returns found urls, newest first"""
+    articles = load_articles(articles_path)
+    mask = articles['url'].notna()
+    if tag is not None:
+        mask &= articles['url'].isin(articles.loc[articles['tag'] == tag, 'url'])
+    if author is not None:
+        mask &= articles['url'].isin(articles.loc[articles['author'] == author, 'url'])
+    if since is not None:
+        mask &= articles['publication_date'] >= since
+    if until is not None:
+        mask &= articles['publication_date'] <= until
+    found = articles[mask].drop_duplicates('url')
+    if text is not None:
+        terms = text_terms(text)
+        found = found[[terms <= text_terms(title + ' ' + body) for title, body in zip(found['title'], found['text'])]]
+    return list(found.sort_values('publication_date', ascending=False)['url'])
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=60, help='words of article text')
+    parser.add_argument('--new', type=int, default=10, help='articles added before the incremental update')
+    parser.add_argument('--repeat', type=int, default=200, help='index lookups of every query')
+    args = parser.parse_args()
+
+    queries = [('tag', {'tag': 'Tag 30'}), ('author', {'author': 'Author 200'}),
+               ('date range', {'since': '2015-03-01', 'until': '2015-03-31'}),
+               ('common word', {'text': 'w3'}), ('two words', {'text': 'w10 w250'}),
+               ('tag + author + dates', {'tag': 'Tag 1', 'author': 'Author 5', 'since': '2014-01-01'})]
+    with tempfile.TemporaryDirectory() as directory:
+        state_db = os.path.join(directory, 'crawl_state.db')
+        articles_path = os.path.join(directory, 'articles.csv')
+        start = time.perf_counter()
+        make_corpus(state_db, args.articles, args.words)
+        state = CrawlState(state_db)
+        state.export_csv(articles_path, os.path.join(directory, 'authors.csv'), layout='normalized')
+        state.close()
+        print('{} articles written in {:.1f}s'.format(args.articles, time.perf_counter() - start))
+
+        index = ArticleIndex(os.path.join(directory, 'articles_index.db'))
+        start = time.perf_counter()
+        indexed = index.update(state_db)
+        print('index built in {:.1f}s: {} articles, {:.1f} MiB'.format(
+            time.perf_counter() - start, indexed, os.path.getsize(index.path) / 2 ** 20))
+        state = CrawlState(state_db)
+        for i in range(args.new):  # new articles of blog_check and one changed article
+            state.add_article({'title': 'New article {}'.format(i), 'url': 'https://blog.example/new-{}/'.format(i),
+                               'text': 'w1 w2', 'publication_date': '2020-06-01', 'authors': ['Author 1'],
+                               'tags': ['Tag 1']})
+        state.add_article({'title': 'Changed', 'url': 'https://blog.example/article-0/', 'text': 'w1',
+                           'publication_date': '2020-06-02', 'authors': ['Author 1'], 'tags': ['Tag 1']})
+        state.close()
+        start = time.perf_counter()
+        indexed = index.update(state_db)
+        print('incremental update: {} articles in {:.1f} ms'.format(indexed, (time.perf_counter() - start) * 1000))
+        state = CrawlState(state_db)
+        state.export_csv(articles_path, os.path.join(directory, 'authors.csv'), layout='normalized')
+        state.close()
+
+        print('{:<22} {:>9} {:>16} {:>15} {:>15}'.format('query', 'found', 'pandas, ms', 'index p50, ms',
+                                                         'index p99, ms'))
+        for name, query in queries:
+            start = time.perf_counter()
+            expected = pandas_find(articles_path, **query)
+            pandas_time = time.perf_counter() - start
+            found = [article['url'] for article in index.find(limit=None, **query)]
+            times = sorted(timed(lambda: index.find(limit=10, **query), args.repeat))
+            print('{:<22} {:>9} {:>16.1f} {:>15.3f} {:>15.3f}   {}'.format(
+                name, len(found), pandas_time * 1000, statistics.median(times) * 1000,
+                times[int(len(times) * 0.99) - 1] * 1000, 'same result' if set(found) == set(expected)
+                else 'RESULTS DIFFER'))
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
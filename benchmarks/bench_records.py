@@ -0,0 +1,109 @@
+"""Memory of a corpus of articles held in memory: dicts of csv rows and scrapy.Item objects (previous items)
+vs compact records with interned tags, authors and dates (gd_blog_spider.items). The corpus is written as
+normalized csv files and read by every loader in a separate process, memory allocated by the loaded corpus is
+measured with tracemalloc, loaded values are checked to be the same.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_records --articles 100000
+"""
+import argparse
+import csv
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_crawl import ROOT
+
+MODES = ('dicts', 'scrapy items', 'records')
+
+
+def load_dicts(articles_path):
+    """Function to load articles as the loader of previous version did: url -> dict with lists"""
+    from gd_blog_spider.loaders import link_paths
+    articles = {}
+    with open(articles_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            articles[row['url']] = dict(row, authors=[], tags=[])
+    for path, column, key in zip(link_paths(articles_path), ('author', 'tag'), ('authors', 'tags')):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                article = articles.get(row['url'])
+                if article is not None and row[column] not in article[key]:
+                    article[key].append(row[column])
+    return articles
+
+
+def load_scrapy_items(articles_path):
+    """Function to load articles as scrapy.Item objects (items of previous version)"""
+    import scrapy
+
+    class ArticleItem(scrapy.Item):
+        title = scrapy.Field()
+        url = scrapy.Field()
+        text = scrapy.Field()
+        publication_date = scrapy.Field()
+        authors = scrapy.Field()
+        tags = scrapy.Field()
+
+    return {url: ArticleItem(article) for url, article in load_dicts(articles_path).items()}
+
+
+def child(mode, articles_path):
+    from gd_blog_spider.state import CrawlState
+    loaders = {'dicts': load_dicts, 'scrapy items': load_scrapy_items, 'records': CrawlState.read_normalized_csv}
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    articles = loaders[mode](articles_path)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    values_size = sum(sys.getsizeof(article['title']) + sys.getsizeof(url) + sys.getsizeof(article['text'])
+                      for url, article in articles.items())  # unique strings, the same for all loaders
+    checksum = hash(tuple((url, article['title'], article['publication_date'], tuple(article['authors']),
+                           tuple(article['tags'])) for url, article in articles.items()))
+    print(len(articles), size, values_size, elapsed, checksum)
+
+
+def run(mode, articles_path):
+    """Function to load the corpus in a separate process. Returns articles, bytes, bytes of titles, urls
+    and texts, seconds and checksum"""
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_records', '--run', mode, articles_path],
+                            cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True,
+                            env=dict(os.environ, PYTHONHASHSEED='0'))
+    articles, size, values_size, elapsed, checksum = output.stdout.split()
+    return int(articles), int(size), int(values_size), float(elapsed), checksum
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=60, help='words of article text')
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'ARTICLES_PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return child(*args.run)
+
+    from benchmarks.bench_query import make_corpus
+    from gd_blog_spider.state import CrawlState
+    with tempfile.TemporaryDirectory() as directory:
+        state_db = os.path.join(directory, 'crawl_state.db')
+        articles_path = os.path.join(directory, 'articles.csv')
+        make_corpus(state_db, args.articles, args.words)
+        state = CrawlState(state_db)
+        state.export_csv(articles_path, os.path.join(directory, 'authors.csv'), layout='normalized')
+        state.close()
+        results = {mode: run(mode, articles_path) for mode in MODES}
+    for mode, (articles, size, values_size, elapsed, checksum) in results.items():
+        print('{:<14} {:>7} articles {:>8.1f} MiB {:>7.0f} bytes/article {:>7.0f} without title, url and text '
+              '{:>7.2f}s load   {}'.format(mode, articles, size / 2 ** 20, size / articles,
+                                           (size - values_size) / articles, elapsed,
+                                           'same values' if checksum == results['dicts'][4] else 'VALUES DIFFER'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Report rendering: previous renderer (chart and text files one after another, as generate_report did), all
+formats rendered one after another and the concurrent renderer (gd_blog_spider.rendering.render_all), then its
+rerun with the same data (skipped by the fingerprint) and with changed data. Every renderer runs in a separate
+process, as report.py does after the crawl, so imports of matplotlib are counted. Files of the same formats are
+checked to be the same.
+On a host with a single CPU the chart and the text formats share one core, concurrency gains little there.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_render --articles 10000
+"""
+import argparse
+import filecmp
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_crawl import ROOT
+
+MODES = ('previous', 'sequential', 'concurrent', 'concurrent, 1 CPU', 'rerun, same data', 'rerun, changed data')
+
+
+def child(mode, result_path, directory):
+    with open(result_path, 'rb') as f:
+        result = pickle.load(f)
+    from gd_blog_spider import rendering
+    start = time.perf_counter()
+    if mode == 'previous':  # png and txt files only
+        plt = rendering.plot_top7_tags(result.top7_tags, headless=True)
+        plt.savefig(os.path.join(directory, 'top7tags.png'), dpi=100)
+        plt.close('all')
+        rendering.render_txt(result, os.path.join(directory, 'top5articles.txt'),
+                             os.path.join(directory, 'top5authors.txt'))
+    elif mode == 'sequential':
+        payload = rendering.report_payload(result)
+        rendering.render_png(list(result.top7_tags.index), list(result.top7_tags.values),
+                             os.path.join(directory, 'top7tags.png'))
+        rendering.render_txt(result, os.path.join(directory, 'top5articles.txt'),
+                             os.path.join(directory, 'top5authors.txt'))
+        rendering.render_json(payload, os.path.join(directory, 'report.json'))
+        rendering.render_html(payload, os.path.join(directory, 'report.html'))
+    else:
+        rendering.CONCURRENT = mode != 'concurrent, 1 CPU'  # as chosen by the renderer on a host with one CPU
+        rendering.render_all(result, directory)
+    print(time.perf_counter() - start)
+
+
+def run(mode, result_path, directory):
+    """Function to render in a separate process. Returns seconds of rendering (without loading the result)"""
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_render', '--run', mode, result_path, directory],
+                            cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return float(output.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every renderer, the best time is reported')
+    parser.add_argument('--run', nargs=3, metavar=('MODE', 'RESULT_PATH', 'DIRECTORY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return child(*args.run)
+
+    from benchmarks.bench_streaming import make_dataset
+    from gd_blog_spider.reporting import load_report
+    with tempfile.TemporaryDirectory() as directory:
+        result = load_report(*make_dataset(directory, args.articles))
+        result_path = os.path.join(directory, 'result.pkl')
+        changed_path = os.path.join(directory, 'changed.pkl')
+        with open(result_path, 'wb') as f:
+            pickle.dump(result, f)
+        result.top7_tags.iloc[0] += 1  # e.g. a new article of the top tag
+        with open(changed_path, 'wb') as f:
+            pickle.dump(result, f)
+
+        outputs = {mode: os.path.join(directory, 'output-{}'.format(i)) for i, mode in enumerate(MODES)}
+        times = {}
+        for mode in MODES:
+            if not os.path.isdir(outputs[mode]):
+                os.mkdir(outputs[mode])
+            path = changed_path if mode == 'rerun, changed data' else result_path
+            times[mode] = []
+            for _ in range(args.repeat):
+                if mode == 'rerun, changed data':  # every run starts from files of the previous data
+                    run('concurrent', result_path, outputs[mode])
+                elif mode != 'rerun, same data':
+                    for name in os.listdir(outputs[mode]):
+                        os.unlink(os.path.join(outputs[mode], name))
+                times[mode].append(run(mode, path, outputs[mode]))
+            if mode == 'concurrent':  # files of the same data for the rerun
+                os.mkdir(outputs['rerun, same data'])
+                for name in os.listdir(outputs[mode]):
+                    os.link(os.path.join(outputs[mode], name), os.path.join(outputs['rerun, same data'], name))
+
+        for mode in MODES:
+            files = sorted(name for name in os.listdir(outputs[mode]) if not name.startswith('.'))
+            if mode == 'rerun, changed data':
+                check = 'rendered again' if not filecmp.cmp(os.path.join(outputs[mode], 'top7tags.png'), os.path.join(
+                    outputs['concurrent'], 'top7tags.png'), shallow=False) else 'NOT RENDERED'
+            else:
+                _, mismatch, errors = filecmp.cmpfiles(outputs['sequential'], outputs[mode], files, shallow=False)
+                check = 'same files' if not mismatch and not errors else 'FILES DIFFER: ' + ', '.join(mismatch + errors)
+            print('{:<20} {:>9.1f} ms  {} files  {}'.format(mode, min(times[mode]) * 1000, len(files), check))
+
+
+if __name__ == '__main__':
+    main()
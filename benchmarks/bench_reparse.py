@@ -0,0 +1,59 @@
+"""Offline re-parse of the raw pages archive: blog_scraper crawls the local mock blog with ARCHIVE_ENABLED,
+then the archived pages are re-parsed (gd_blog_spider.archive.reparse) in this process and with worker processes.
+Reports pages/sec of the crawl and of re-parse, archive size and checks csv files written by re-parse.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_reparse --articles 2000 --workers 0 2
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.bench_crawl import check_output, run_crawl
+from benchmarks.mock_blog import MockBlog, MockBlogServer
+from gd_blog_spider.archive import PageArchive, reparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--padding', type=int, default=0, help='KiB of extra markup of article pages')
+    parser.add_argument('--latency', type=float, default=0.0, help='injected delay of every response, seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, os.cpu_count()])
+    parser.add_argument('-s', dest='settings', action='append', default=[], help='scrapy setting NAME=VALUE')
+    args = parser.parse_args()
+
+    blog = MockBlog(args.authors, args.articles)
+    blog.padding, blog.latency = args.padding, args.latency
+    server = MockBlogServer(blog).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            served = blog.requests_served
+            elapsed, _ = run_crawl('blog_scraper', server.base_url, directory, ['ARCHIVE_ENABLED=1'] + args.settings)
+            pages = blog.requests_served - served
+            print('{:<16} {:>6} pages {:>8.2f}s {:>9.1f} pages/s'.format('crawl', pages, elapsed, pages / elapsed))
+            archive = PageArchive(os.path.join(directory, 'archive'))
+            fetches, blobs, size, stored = archive.counts()
+            archive.close()
+            print('{:<16} {:>6} fetches, {} unique, {:.1f} MiB raw, {:.1f} MiB stored (x{:.1f})'.format(
+                'archive', fetches, blobs, size / 2 ** 20, stored / 2 ** 20, size / max(stored, 1)))
+
+            from gd_blog_spider.spiders import blog_parse  # configures logging on import
+            logging.getLogger().setLevel(logging.WARNING)
+            for workers in args.workers:
+                output = os.path.join(directory, 'reparsed-{}'.format(workers))
+                start = time.perf_counter()
+                reparsed = reparse(os.path.join(directory, 'archive'), output, workers=workers)
+                elapsed = time.perf_counter() - start
+                problems = check_output(blog, output)
+                print('{:<16} {:>6} pages {:>8.2f}s {:>9.1f} pages/s   {}'.format(
+                    're-parse x{}'.format(workers), reparsed, elapsed, reparsed / elapsed,
+                    'output OK' if not problems else '; '.join(problems[:3])))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
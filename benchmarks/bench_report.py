@@ -0,0 +1,78 @@
+"""Report aggregation: per-tag filtering with three csv reads (old report.py behaviour)
+vs the vectorized single-load engine from gd_blog_spider.reporting
+
+Run from the root directory of the project: python3 -m benchmarks.bench_report
+"""
+import csv
+import datetime
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from gd_blog_spider.reporting import load_report
+
+ARTICLES = 20000
+TAGS = 60
+AUTHORS = 400
+
+
+def make_dataset(directory):
+    articles_path = os.path.join(directory, 'articles.csv')
+    authors_path = os.path.join(directory, 'authors.csv')
+    first_day = datetime.date(2010, 1, 1)
+    with open(articles_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['title', 'url', 'text', 'publication_date', 'author', 'tag'])
+        for i in range(ARTICLES):
+            publication_date = first_day + datetime.timedelta(days=i % 3650)
+            for author in ('Author {}'.format(i % AUTHORS), 'Author {}'.format(i * 7 % AUTHORS)):
+                for tag in ('Tag {}'.format(i % TAGS), 'Tag {}'.format(i * 3 % TAGS)):
+                    writer.writerow(['Article {}'.format(i), 'https://blog.example/article-{}/'.format(i),
+                                     'x' * 160, publication_date, author, tag])
+    with open(authors_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['full_name', 'job_title', 'linkedin', 'contact', 'articles_counter'])
+        for i in range(AUTHORS):
+            writer.writerow(['Author {}'.format(i), 'Engineer', '', '', i % 97])
+    return articles_path, authors_path
+
+
+def legacy_report(articles_path, authors_path):
+    articles = pd.read_csv(articles_path)
+    tags_count = {}
+    for tag in set(articles['tag']):
+        tags_count.update({tag: len(articles[articles.tag == tag].drop_duplicates('title'))})
+    tags_count = {k: v for k, v in sorted(tags_count.items(), key=lambda item: item[1], reverse=True)}
+    top7_tags = dict(list(tags_count.items())[:7])
+    articles = pd.read_csv(articles_path)
+    top5_articles = articles.sort_values('publication_date', ascending=False).drop_duplicates('url').head(5)
+    authors = pd.read_csv(authors_path)
+    top5_authors = authors.sort_values('articles_counter', ascending=False).drop_duplicates('full_name').head(5)
+    return top7_tags, top5_articles, top5_authors
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        articles_path, authors_path = make_dataset(directory)
+
+        start = time.perf_counter()
+        top7_tags, top5_articles, top5_authors = legacy_report(articles_path, authors_path)
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = load_report(articles_path, authors_path)
+        new = time.perf_counter() - start
+
+    assert sorted(top7_tags.values()) == sorted(result.top7_tags.tolist()), 'tags differ'
+    assert top5_articles.url.tolist() == result.top5_articles.url.tolist(), 'articles differ'
+    assert top5_authors.articles_counter.tolist() == result.top5_authors.articles_counter.tolist(), 'authors differ'
+    print('{} articles, {} tags'.format(ARTICLES, TAGS))
+    print('legacy report:     {:.3f}s'.format(old))
+    print('vectorized engine: {:.3f}s'.format(new))
+    print('speed-up: x{:.1f}'.format(old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Crash-safe crawl check: blog_scraper is killed (SIGKILL) in the middle of the crawl of the local mock blog,
+the next run resumes it from the frontier saved in crawl_state.db (see CheckpointMiddleware).
+Reports pages downloaded by both runs, pages downloaded twice (in flight or not committed when the crawl was killed)
+and checks that csv files are complete and the frontier is cleared.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_resume --articles 2000 --kill-at 0.5
+"""
+import argparse
+import os
+import signal
+import tempfile
+import time
+
+from benchmarks.bench_crawl import check_output, run_crawl, start_crawl
+from benchmarks.mock_blog import MockBlog, MockBlogServer
+from gd_blog_spider.state import CrawlState
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--kill-at', type=float, default=0.5, help='share of pages downloaded before the kill')
+    parser.add_argument('--latency', type=float, default=0.0, help='injected delay of every response, seconds')
+    parser.add_argument('-s', dest='settings', action='append', default=[], help='scrapy setting NAME=VALUE')
+    args = parser.parse_args()
+
+    blog = MockBlog(args.authors, args.articles)
+    blog.latency = args.latency
+    server = MockBlogServer(blog).start()
+    pages = 1 + len(blog.authors) + len(blog.articles)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            process = start_crawl('blog_scraper', server.base_url, directory, args.settings)
+            while blog.requests_served < pages * args.kill_at and process.poll() is None:
+                time.sleep(0.01)
+            process.send_signal(signal.SIGKILL)
+            process.wait()
+            first_run = dict(blog.paths_served)
+            state = CrawlState(os.path.join(directory, 'crawl_state.db'))
+            done, pending = state.frontier_counts('blog_scraper')
+            state.close()
+            print('killed after {} of {} pages: {} page(s) done and {} pending in the frontier'.format(
+                sum(first_run.values()), pages, done, pending))
+            if all(os.path.isfile(os.path.join(directory, name)) for name in ('articles.csv', 'authors.csv')):
+                problems = check_output(blog, directory)
+                print('output after the kill: {}'.format('; '.join(problems[:3]) or 'complete (kill came too late)'))
+
+            blog.paths_served.clear()
+            elapsed, _ = run_crawl('blog_scraper', server.base_url, directory, args.settings)
+            second_run = dict(blog.paths_served)
+            state = CrawlState(os.path.join(directory, 'crawl_state.db'))
+            interrupted = state.has_frontier('blog_scraper')
+            state.close()
+            problems = check_output(blog, directory)
+            print('resumed run: {} pages in {:.2f}s, {} page(s) downloaded again, frontier {}, {}'.format(
+                sum(second_run.values()), elapsed, len(set(first_run) & set(second_run)),
+                'NOT CLEARED' if interrupted else 'cleared', 'output OK' if not problems else '; '.join(problems[:3])))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
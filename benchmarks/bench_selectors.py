@@ -0,0 +1,52 @@
+"""Article page parsing: css selectors per field (old spiders behaviour) vs precompiled selector registry
+from gd_blog_spider.extractors (XPath compiled once at import, one pass per page)
+
+Run from the root directory of the project: python3 -m benchmarks.bench_selectors
+"""
+import time
+
+from scrapy.http import HtmlResponse
+
+from gd_blog_spider.extractors import ARTICLE, extract_text
+
+REPEAT = 2000
+
+
+def css_article(response):
+    result = []
+    for article in response.css('body > div#wrap'):
+        result.append({
+            'title': article.css('div#postcontent > h1::text').get(),
+            'text': extract_text(article.css('div#postcontent > div#mypost')),
+            'publication_date': article.css('div#postcontent > div.no-mobile > '
+                                            'div.posttag.right.nomobile > span::text').get(),
+            'authors': article.css('div#postcontent > div.no-mobile > '
+                                   'div.postauthor.left > span > a.goauthor > span::text').getall(),
+            'authors_urls': article.css('div#postcontent > div.no-mobile > '
+                                        'div.postauthor.left > span > a::attr(href)').getall(),
+            'tags': response.css('ul#mainmenu > li.current > a::text').getall(),
+        })
+    return result
+
+
+def cpu_per_page(function, response):
+    start = time.process_time()
+    for _ in range(REPEAT):
+        function(response)
+    return (time.process_time() - start) / REPEAT
+
+
+def main():
+    with open('unittests_files/article_sample.htm') as f:
+        response = HtmlResponse(url='https://blog.griddynamics.com/sample/', body=f.read(), encoding='utf-8')
+    assert css_article(response) == ARTICLE.extract(response), 'outputs differ'
+
+    old = cpu_per_page(css_article, response)
+    new = cpu_per_page(ARTICLE.extract, response)
+    print('css per field:      {:.1f} us CPU per page'.format(old * 10 ** 6))
+    print('selector registry:  {:.1f} us CPU per page'.format(new * 10 ** 6))
+    print('speed-up: x{:.1f}'.format(old / new))
+
+
+if __name__ == '__main__':
+    main()
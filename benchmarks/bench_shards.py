@@ -0,0 +1,60 @@
+"""Sharded crawl: blog_scraper crawls the local mock blog with 1, 2, 4... worker processes sharing one request
+queue (gd_blog_spider.sharding). Reports pages/sec and speed-up against one worker, checks merged csv files
+and that every page of the blog was fetched exactly once by all workers together.
+On a host with a single CPU the speed-up comes only from waiting for slow responses (--latency).
+
+Run from the root directory of the project: python3 -m benchmarks.bench_shards --articles 2000 --workers 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_crawl import check_output
+from benchmarks.mock_blog import MockBlog, MockBlogServer
+from gd_blog_spider import sharding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.0, help='injected delay of every response, seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('-s', dest='settings', action='append', default=[], help='scrapy setting NAME=VALUE')
+    args = parser.parse_args()
+
+    blog = MockBlog(args.authors, args.articles)
+    blog.latency = args.latency
+    server = MockBlogServer(blog).start()
+    cwd = os.getcwd()
+    baseline = None
+    try:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)  # merged csv files and STATE_DB are written to the current directory
+                served = blog.requests_served
+                blog.paths_served.clear()
+                start = time.perf_counter()
+                counts = sharding.crawl('blog_scraper', workers, 'shards', ['base_url=' + server.base_url],
+                                        args.settings)
+                elapsed = time.perf_counter() - start
+                pages = blog.requests_served - served
+                problems = check_output(blog, directory)
+                repeated = [path for path, n in blog.paths_served.items() if n > 1 and path != '/robots.txt']
+                if repeated:
+                    problems.append('{} page(s) fetched more than once'.format(len(repeated)))
+                if counts[sharding.FAILED] or counts[sharding.PENDING] or counts[sharding.LEASED]:
+                    problems.append('queue not finished: {}'.format(counts))
+                os.chdir(cwd)
+            baseline = baseline or elapsed
+            print('{:<12} {:>6} pages {:>8.2f}s {:>9.1f} pages/s  x{:<5.2f}  {}'.format(
+                '{} worker(s)'.format(workers), pages, elapsed, pages / elapsed, baseline / elapsed,
+                'output OK' if not problems else '; '.join(problems[:3])))
+    finally:
+        os.chdir(cwd)
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
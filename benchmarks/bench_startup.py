@@ -0,0 +1,35 @@
+"""Cold start of report.py measured with python -X importtime: crawl-only path (pandas and matplotlib are
+imported lazily) vs the same imports plus pandas and matplotlib.pyplot (what report.py loaded on start before)
+
+Run from the root directory of the project: python3 -m benchmarks.bench_startup
+"""
+import subprocess
+import sys
+
+REPEAT = 5
+CASES = (('crawl-only path', 'import report'),
+         ('eager pandas + matplotlib', 'import report, pandas, matplotlib.pyplot'))
+
+
+def import_time(statement):
+    """Function to get total import time (ms) of top level modules and list of heavy modules loaded"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):  # top level import (nested ones are indented)
+            total += int(cumulative)
+    return total / 1000
+
+
+def main():
+    for name, statement in CASES:
+        best = min(import_time(statement) for _ in range(REPEAT))
+        print('{:<26} {:>8.1f} ms  ({})'.format(name, best, statement))
+
+
+if __name__ == '__main__':
+    main()
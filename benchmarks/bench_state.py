@@ -0,0 +1,69 @@
+"""Startup cost of an incremental run as history grows: watermark from articles.csv
+(pandas read + sort, old blog_check behaviour) vs indexed lookups in CrawlState
+
+Run from the root directory of the project: python3 -m benchmarks.bench_state
+"""
+import csv
+import datetime
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from gd_blog_spider.state import CrawlState
+
+SIZES = (1000, 10000, 100000)
+TAGS = ('Search', 'ML & AI', 'E-commerce', 'DevOps', 'Cloud', 'Big Data')
+
+
+def make_history(directory, size):
+    articles_path = os.path.join(directory, 'articles_{}.csv'.format(size))
+    state = CrawlState(os.path.join(directory, 'state_{}.db'.format(size)))
+    first_day = datetime.date(2010, 1, 1)
+    with open(articles_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['title', 'url', 'text', 'publication_date', 'author', 'tag'])
+        for i in range(size):
+            article = {'title': 'Article {}'.format(i), 'url': 'https://blog.example/article-{}/'.format(i),
+                       'text': 'x' * 160, 'publication_date': first_day + datetime.timedelta(days=i % 3650),
+                       'authors': ['Author {}'.format(i % 300), 'Author {}'.format(i % 17)],
+                       'tags': [TAGS[i % 6], TAGS[i % 4]]}
+            for author in article['authors']:
+                for tag in article['tags']:
+                    writer.writerow([article['title'], article['url'], article['text'],
+                                     article['publication_date'], author, tag])
+            state.add_article(article)
+    state.commit()
+    return articles_path, state
+
+
+def csv_watermark(path):
+    data_articles = pd.read_csv(path)
+    return data_articles.sort_values('publication_date', ascending=False).head(1).iloc[0][3]
+
+
+def state_startup(state, urls):
+    state.last_publication_date()
+    for url in urls:  # dedup of cards from the first /explore/ page
+        state.is_seen(url)
+
+
+def main():
+    urls = ['https://blog.example/article-{}/'.format(i) for i in range(0, 24)]
+    with tempfile.TemporaryDirectory() as directory:
+        print('{:>10} {:>12} {:>12}'.format('articles', 'csv, ms', 'sqlite, ms'))
+        for size in SIZES:
+            articles_path, state = make_history(directory, size)
+            start = time.perf_counter()
+            csv_watermark(articles_path)
+            csv_time = time.perf_counter() - start
+            start = time.perf_counter()
+            state_startup(state, urls)
+            state_time = time.perf_counter() - start
+            state.close()
+            print('{:>10} {:>12.2f} {:>12.3f}'.format(size, csv_time * 1000, state_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
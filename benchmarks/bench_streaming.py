@@ -0,0 +1,95 @@
+"""Report over a growing articles history: in-memory engine (gd_blog_spider.reporting.load_report) vs streaming
+aggregation by chunks (gd_blog_spider.streaming.stream_report). Every report runs in a separate process, its
+peak RSS and time are compared for files of different size, results are checked to be the same.
+
+Run from the root directory of the project: python3 -m benchmarks.bench_streaming --articles 10000 40000
+"""
+import argparse
+import csv
+import datetime
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_crawl import ROOT
+
+TAGS = 60
+AUTHORS = 400
+TEXT = 1000  # symbols of text per article
+
+
+def make_dataset(directory, articles):
+    """Function to write flat articles.csv (4 rows per article) and authors.csv"""
+    articles_path = os.path.join(directory, 'articles.csv')
+    authors_path = os.path.join(directory, 'authors.csv')
+    first_day = datetime.date(2010, 1, 1)
+    with open(articles_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['title', 'url', 'text', 'publication_date', 'author', 'tag'])
+        for i in range(articles):
+            publication_date = first_day + datetime.timedelta(days=i * 7 % 3650)  # many articles of the same day
+            text = '{} {}'.format(i, 'x' * TEXT)
+            for author in ('Author {}'.format(i % AUTHORS), 'Author {}'.format(i * 7 % AUTHORS)):
+                for tag in ('Tag {}'.format(i % TAGS), 'Tag {}'.format(i * 3 % TAGS)):
+                    writer.writerow(['Article {}'.format(i), 'https://blog.example/article-{}/'.format(i),
+                                     text, publication_date, author, tag])
+    with open(authors_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['full_name', 'job_title', 'linkedin', 'contact', 'articles_counter'])
+        for i in range(AUTHORS):
+            writer.writerow(['Author {}'.format(i), 'Engineer', '', '', i % 97])
+    return articles_path, authors_path
+
+
+def run(mode, directory):
+    """Function to build report in a separate process. Returns elapsed seconds, peak RSS in MiB and result"""
+    result_path = os.path.join(directory, mode + '.pkl')
+    command = [sys.executable, '-m', 'benchmarks.bench_streaming', '--run', mode, directory]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT)
+    _, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError('{} report exited with status {}'.format(mode, status))
+    with open(result_path, 'rb') as f:
+        result = pickle.load(f)
+    return elapsed, rusage.ru_maxrss / 1024, result
+
+
+def child(mode, directory):
+    from report import df_to_str
+    from gd_blog_spider.reporting import load_report
+    from gd_blog_spider.streaming import stream_report
+
+    build = load_report if mode == 'memory' else stream_report
+    result = build(os.path.join(directory, 'articles.csv'), os.path.join(directory, 'authors.csv'))
+    rendered = (list(result.top7_tags.items()), df_to_str(result.top5_articles), df_to_str(result.top5_authors))
+    with open(os.path.join(directory, mode + '.pkl'), 'wb') as f:
+        pickle.dump(rendered, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, nargs='+', default=[10000, 40000])
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'DIRECTORY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return child(*args.run)
+
+    for articles in args.articles:
+        with tempfile.TemporaryDirectory() as directory:
+            make_dataset(directory, articles)
+            size = os.path.getsize(os.path.join(directory, 'articles.csv')) / 2 ** 20
+            memory_time, memory_rss, memory_result = run('memory', directory)
+            streaming_time, streaming_rss, streaming_result = run('streaming', directory)
+        same = 'same result' if memory_result == streaming_result else 'RESULTS DIFFER'
+        print('{:>7} articles {:>7.1f} MiB csv   in-memory {:6.2f}s {:7.1f} MiB peak RSS   '
+              'streaming {:6.2f}s {:7.1f} MiB peak RSS   {}'.format(articles, size, memory_time, memory_rss,
+                                                                    streaming_time, streaming_rss, same))
+
+
+if __name__ == '__main__':
+    main()
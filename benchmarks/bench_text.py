@@ -0,0 +1,40 @@
+"""Article text extraction: BeautifulSoup over the whole post (old spiders behaviour)
+vs extract_text walking the already parsed selector tree
+
+Run from the root directory of the project: python3 -m benchmarks.bench_text
+"""
+import timeit
+
+from bs4 import BeautifulSoup
+from scrapy.http import HtmlResponse
+
+from gd_blog_spider.extractors import extract_text
+
+REPEAT = 200
+
+
+def bs4_text(selectors):
+    text = ''
+    for row in selectors.getall():
+        soup_raw = BeautifulSoup(row, features='lxml')
+        text += soup_raw.get_text().strip()
+        if len(text) > 160:
+            text = text[:161].replace('\r', '').replace('\n', ' ')
+    return text
+
+
+def main():
+    with open('unittests_files/article_sample.htm') as f:
+        response = HtmlResponse(url='https://blog.griddynamics.com/sample/', body=f.read(), encoding='utf-8')
+    selectors = response.css('body > div#wrap div#postcontent > div#mypost')
+    assert bs4_text(selectors) == extract_text(selectors), 'outputs differ'
+
+    old = timeit.timeit(lambda: bs4_text(selectors), number=REPEAT) / REPEAT
+    new = timeit.timeit(lambda: extract_text(selectors), number=REPEAT) / REPEAT
+    print('BeautifulSoup: {:.3f} ms per article'.format(old * 1000))
+    print('extract_text:  {:.3f} ms per article'.format(new * 1000))
+    print('speed-up: x{:.0f}'.format(old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+"""Local stand-in for blog.griddynamics.com with the markup targeted by the spiders selectors.
+
+Serves a synthetic blog of N authors and M articles:
+    /all-authors/, /author/<slug>/, /<article-slug>/, /explore/ (paginated: /explore/page/<n>/)
+    /sitemap.xml (index of /sitemap-posts.xml and /sitemap-authors.xml with lastmod of every page)
+Newest articles can be hidden and published later to emulate new blog-posts for blog_check,
+articles and authors can be edited to emulate changed pages for blog_update.
+Pages are served with ETag and Last-Modified, conditional requests are answered with 304.
+Latency and errors can be injected to emulate slow or overloaded origin.
+Article pages can be padded with extra markup (real pages carry ~300 KiB of menus and widgets).
+
+Run standalone: python3 -m benchmarks.mock_blog --authors 50 --articles 1000 --port 8000
+Spiders are pointed to it with: scrapy crawl blog_scraper -a base_url=http://127.0.0.1:8000
+"""
+import argparse
+import collections
+import datetime
+import email.utils
+import hashlib
+import random
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOST_AUTHORS = ('ezra', 'anton', 'pavel-vasilyev')  # hard-coded in GDBlogCrawler, not shown at /all-authors/
+TAGS = ('Search', 'ML & AI', 'E-commerce', 'DevOps', 'Cloud', 'Big Data', 'Digital Transformation',
+        'Data Science', 'Mobile', 'QA', 'Microservices', 'CI/CD', 'Kubernetes', 'Analytics', 'Security')
+WORDS = ('online', 'retailers', 'catalog', 'search', 'ranking', 'relevance', 'model', 'cloud', 'platform',
+         'pipeline', 'latency', 'customer', 'product', 'discovery', 'quality', 'data', 'stream', 'service')
+EXPLORE_PAGE_SIZE = 24
+TEXT_LIMIT = 160
+WIDGET = ('<div class="widget"><h5>Related</h5><ul><li><a href="/tag/{i}/">Read more about {word}</a></li>'
+          '<li><span class="date">Mar 03, 2020</span></li></ul><p>{words}</p></div>\n')
+
+SITEMAP = '''<?xml version="1.0" encoding="UTF-8"?>
+<{kind} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</{kind}>'''
+
+PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<ul id="mainmenu">{menu}</ul>
+<div id="wrap">
+{content}
+</div>
+</body></html>'''
+
+
+class MockBlog(object):
+    """Synthetic blog content. Articles are sorted newest first, one article per day"""
+    def __init__(self, authors=20, articles=200, seed=0, last_date=datetime.date(2020, 3, 3)):
+        rng = random.Random(seed)
+        self.authors = []
+        for i in range(authors):
+            slug = LOST_AUTHORS[i] if i < len(LOST_AUTHORS) else 'author-{}'.format(i)
+            self.authors.append({
+                'slug': slug,
+                'full_name': 'Author {}'.format(i),
+                'job_title': 'Engineer {}'.format(i % 7),
+                'linkedin': 'https://www.linkedin.com/in/{}/'.format(slug) if i % 2 == 0 else '',
+                'contacts': ['https://twitter.com/{}'.format(slug), 'https://github.com/{}'.format(slug)][:i % 3],
+                'modified': datetime.datetime.combine(last_date, datetime.time(), datetime.timezone.utc),
+            })
+        self.articles = []
+        for i in range(articles):
+            paragraphs = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))).capitalize() + '.'
+                          for _ in range(rng.randint(3, 12))]
+            self.articles.append({
+                'slug': 'article-{}'.format(i),
+                'title': 'Article {} about {}'.format(i, rng.choice(WORDS)),
+                'publication_date': last_date - datetime.timedelta(days=i),
+                'authors': rng.sample(self.authors, rng.randint(1, min(3, authors))),
+                'tags': rng.sample(TAGS, rng.randint(1, 3)),
+                'paragraphs': paragraphs,
+                'modified': datetime.datetime.combine(last_date - datetime.timedelta(days=i), datetime.time(),
+                                                      datetime.timezone.utc),
+            })
+        self.article_index = {'/{}/'.format(article['slug']): i for i, article in enumerate(self.articles)}
+        self._hidden = 0
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.paths_served = collections.Counter()
+        self.not_modified_served = 0
+        self.base_url = ''  # absolute urls in sitemaps, set by MockBlogServer
+        self.in_flight = 0
+        self.latency = 0.0  # injected delay of every response, seconds
+        self.latency_per_request = 0.0  # extra delay for every request in flight, emulates overloaded origin
+        self.error_rate = 0.0  # share of responses replaced with 503
+        self.rng = random.Random(seed)
+        self.padding = 0  # KiB of extra markup after the content of article pages
+        self._widgets = (0, '')  # padding -> its markup
+
+    @property
+    def hidden(self):
+        """Number of newest articles not published yet"""
+        return self._hidden
+
+    @hidden.setter
+    def hidden(self, value):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for article in self.articles[value:self._hidden]:  # published right now
+            article['modified'] = now
+        self._hidden = value
+
+    def edit_article(self, index):
+        """Function to change title of article, it gets new lastmod and ETag"""
+        article = self.articles[index]
+        article['title'] += ' (updated)'
+        article['modified'] = datetime.datetime.now(datetime.timezone.utc)
+
+    def touch_article(self, index):
+        """Function to update lastmod of article without changing its content (conditional request gets 304)"""
+        self.articles[index]['modified'] = datetime.datetime.now(datetime.timezone.utc)
+
+    def edit_author(self, index):
+        """Function to change job title of author, author page gets new lastmod and ETag"""
+        author = self.authors[index]
+        author['job_title'] += ' (updated)'
+        author['modified'] = datetime.datetime.now(datetime.timezone.utc)
+
+    def author_lastmod(self, author):
+        """Author page changes with the profile and with the list of articles"""
+        return max([author['modified']] + [article['modified'] for article in self.author_articles(author)])
+
+    def lastmod(self, path):
+        """Function to get modification time of page, None if it isn't known"""
+        if path.startswith('/author/'):
+            slug = path[len('/author/'):].strip('/')
+            for author in self.authors:
+                if author['slug'] == slug:
+                    return self.author_lastmod(author)
+            return None
+        index = self.article_index.get(path)
+        return None if index is None or index < self.hidden else self.articles[index]['modified']
+
+    def visible_articles(self):
+        return self.articles[self.hidden:]
+
+    def author_articles(self, author):
+        return [article for article in self.visible_articles() if author in article['authors']]
+
+    def expected_articles(self):
+        """Function to get expected spiders output: url path -> (title, text, date, authors, tags)"""
+        expected = {}
+        for article in self.visible_articles():
+            text = '\n'.join(article['paragraphs']).strip()
+            if len(text) > TEXT_LIMIT:
+                text = text[:TEXT_LIMIT + 1].replace('\r', '').replace('\n', ' ')
+            expected['/{}/'.format(article['slug'])] = (
+                article['title'], text, article['publication_date'].isoformat(),
+                [author['full_name'] for author in article['authors']],
+                [tag for tag in TAGS if tag in article['tags']])  # spiders read tags in menu order
+        return expected
+
+    def expected_authors(self):
+        """Function to get expected spiders output: full_name -> articles counter"""
+        return {author['full_name']: len(self.author_articles(author)) for author in self.authors}
+
+    def render(self, path):
+        """Function to get html of page, None if page doesn't exist"""
+        if path == '/all-authors/':
+            return self.render_all_authors()
+        if path == '/explore/':
+            return self.render_explore()
+        if path in ('/sitemap.xml', '/sitemap-posts.xml', '/sitemap-authors.xml'):
+            return self.render_sitemap(path)
+        if path.startswith('/explore/page/'):
+            number = path[len('/explore/page/'):].strip('/')
+            return self.render_explore(int(number)) if number.isdigit() and int(number) > 0 else None
+        if path.startswith('/author/'):
+            slug = path[len('/author/'):].strip('/')
+            for author in self.authors:
+                if author['slug'] == slug:
+                    return self.render_author(author)
+            return None
+        index = self.article_index.get(path)
+        if index is None or index < self.hidden:
+            return None
+        return self.render_article(self.articles[index])
+
+    def render_all_authors(self):
+        singles = ''.join('<div class="single"><h3>{name}</h3>'
+                          '<a class="authormore" href="/author/{slug}/">More</a></div>'
+                          .format(name=escape(author['full_name']), slug=author['slug'])
+                          for author in self.authors if author['slug'] not in LOST_AUTHORS)
+        content = ('<div class="blog list authorslist"><div class="inner"><div class="row">'
+                   '<div class="left">{}</div></div></div></div>'.format(singles))
+        return PAGE.format(title='All authors', menu='', content=content)
+
+    def render_author(self, author):
+        social = ''.join('<a href="{}">link</a>'.format(url)
+                         for url in ([author['linkedin']] if author['linkedin'] else []) + author['contacts'])
+        posts = ''.join('<a href="/{slug}/">{title}</a>'.format(slug=article['slug'], title=escape(article['title']))
+                        for article in self.author_articles(author))
+        content = ('<div id="author"><div id="authorbox">'
+                   '<div class="nomobile"><div class="right"><h1>{name}</h1><h2>{job}</h2></div></div>'
+                   '<div class="mobile"><div class="right"><div class="authorsocial">{social}</div></div></div>'
+                   '<did class="postlist">{posts}</did>'
+                   '</div></div>').format(name=escape(author['full_name']), job=escape(author['job_title']),
+                                          social=social, posts=posts)
+        return PAGE.format(title=escape(author['full_name']), menu='', content=content)
+
+    def widgets(self):
+        """Function to get padding markup of article pages, it is rendered once for every padding value"""
+        if self._widgets[0] != self.padding:
+            rng, widgets, size = random.Random(self.padding), [], 0
+            while size < self.padding * 1024:
+                widgets.append(WIDGET.format(i=len(widgets), word=escape(rng.choice(WORDS)),
+                                             words=' '.join(rng.choice(WORDS) for _ in range(30))))
+                size += len(widgets[-1])
+            self._widgets = (self.padding, ''.join(widgets))
+        return self._widgets[1]
+
+    def render_article(self, article):
+        menu = ''.join('<li class="{cls}"><a href="/tag/{i}/">{tag}</a></li>'
+                       .format(cls='current' if tag in article['tags'] else '', i=i, tag=escape(tag))
+                       for i, tag in enumerate(TAGS))
+        authors = ''.join('<span><a class="goauthor" href="/author/{slug}/"><span>{name}</span></a></span>'
+                          .format(slug=author['slug'], name=escape(author['full_name']))
+                          for author in article['authors'])
+        body = '\n'.join('<p>{}</p>'.format(escape(paragraph)) for paragraph in article['paragraphs'])
+        content = ('<div id="postcontent"><h1>{title}</h1>'
+                   '<div class="no-mobile"><div class="postauthor left">{authors}</div>'
+                   '<div class="posttag right nomobile"><span>{date}</span></div></div>'
+                   '<div id="mypost">\n{body}\n</div></div>{widgets}').format(
+            title=escape(article['title']), authors=authors, body=body, widgets=self.widgets(),
+            date=article['publication_date'].strftime('%b %d, %Y'))
+        return PAGE.format(title=escape(article['title']), menu=menu, content=content)
+
+    def render_explore(self, number=1):
+        articles = self.visible_articles()[(number - 1) * EXPLORE_PAGE_SIZE:number * EXPLORE_PAGE_SIZE]
+        if not articles and number > 1:
+            return None
+        cards = ''.join('<div class="cntt"><h4><a href="/{slug}/">{title}</a></h4>'
+                        '<div class="viewauthor"><div class="authwrp"><span>{date}</span></div></div></div>'
+                        .format(slug=article['slug'], title=escape(article['title']),
+                                date=article['publication_date'].strftime('%b %d, %Y'))
+                        for article in articles)
+        if number * EXPLORE_PAGE_SIZE < len(self.visible_articles()):
+            cards += '<a rel="next" class="older-posts" href="/explore/page/{}/">Older posts</a>'.format(number + 1)
+        return PAGE.format(title='Explore', menu='', content=cards)
+
+    def render_sitemap(self, path):
+        if path == '/sitemap.xml':
+            entries = ''.join('<sitemap><loc>{}</loc></sitemap>'.format(self.base_url + name)
+                              for name in ('/sitemap-posts.xml', '/sitemap-authors.xml'))
+            return SITEMAP.format(kind='sitemapindex', entries=entries)
+        if path == '/sitemap-posts.xml':
+            pages = [('/{}/'.format(article['slug']), article['modified']) for article in self.visible_articles()]
+        else:
+            pages = [('/author/{}/'.format(author['slug']), self.author_lastmod(author)) for author in self.authors]
+        entries = ''.join('<url><loc>{}{}</loc><lastmod>{}</lastmod></url>'.format(self.base_url, page,
+                                                                                   modified.isoformat())
+                          for page, modified in pages)
+        return SITEMAP.format(kind='urlset', entries=entries)
+
+
+def not_modified(headers, etag, modified):
+    """Function to evaluate conditional request headers (If-None-Match takes precedence)"""
+    if headers.get('If-None-Match') is not None:
+        return headers['If-None-Match'] == etag
+    if headers.get('If-Modified-Since') is not None and modified is not None:
+        try:
+            return modified.replace(microsecond=0) <= email.utils.parsedate_to_datetime(headers['If-Modified-Since'])
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def make_handler(blog):
+    class MockBlogHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with blog.lock:
+                blog.requests_served += 1
+                blog.paths_served[self.path.split('?')[0]] += 1
+                blog.in_flight += 1
+                delay = blog.latency + blog.latency_per_request * blog.in_flight
+                failed = blog.rng.random() < blog.error_rate
+                path = self.path.split('?')[0]
+                html = blog.render(path)
+                modified = blog.lastmod(path)
+            if delay:
+                time.sleep(delay)
+            with blog.lock:
+                blog.in_flight -= 1
+            if failed:
+                self.send_error(503)
+                return
+            if html is None:
+                self.send_error(404)
+                return
+            body = html.encode('utf-8')
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:16])
+            if not_modified(self.headers, etag, modified):
+                with blog.lock:
+                    blog.not_modified_served += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            is_xml = path.endswith('.xml')
+            self.send_header('Content-Type', 'application/xml' if is_xml else 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            if modified is not None:
+                self.send_header('Last-Modified', email.utils.format_datetime(modified, usegmt=True))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # keep benchmark output clean
+            pass
+
+    return MockBlogHandler
+
+
+class MockBlogServer(object):
+    """HTTP server for MockBlog running in a background thread"""
+    def __init__(self, blog, host='127.0.0.1', port=0):
+        self.blog = blog
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(blog))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self.blog.base_url = self.base_url
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve synthetic GridDynamics-like blog')
+    parser.add_argument('--authors', type=int, default=20)
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of every response, seconds')
+    parser.add_argument('--latency-per-request', type=float, default=0.0, help='extra delay per request in flight')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 503 responses')
+    parser.add_argument('--padding', type=int, default=0, help='KiB of extra markup of article pages')
+    args = parser.parse_args()
+    blog = MockBlog(args.authors, args.articles)
+    blog.latency, blog.latency_per_request, blog.error_rate = args.latency, args.latency_per_request, args.error_rate
+    blog.padding = args.padding
+    server = MockBlogServer(blog, port=args.port)
+    blog.base_url = server.base_url
+    print('Serving {} authors and {} articles at {}'.format(args.authors, args.articles, server.base_url))
+    server.httpd.serve_forever()
@@ -0,0 +1,219 @@
+"""Compressed content-addressed archive of raw pages fetched by the crawler (see ArchiveMiddleware).
+
+Bodies are stored once per content as zlib-compressed files objects/<sha1[:2]>/<sha1[2:]>, every fetch is
+a row of the index (index.db: url, fetch time, digest, encoding, spider and callback), so unchanged pages
+of repeated crawls take no extra space. Changed extraction logic is applied to the archived corpus without
+network by re-parsing it with the current parse_article/parse_author of blog_scraper:
+    python3 -m gd_blog_spider.archive --reparse --output reparsed --workers 4
+"""
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from scrapy.http import HtmlResponse, Request
+
+from gd_blog_spider.loaders import link_paths
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    spider TEXT,
+    callback TEXT
+);
+CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at);
+'''
+REPARSE_CALLBACKS = ('parse_article', 'parse_author')  # callbacks of blog_scraper applied by re-parse
+CHUNK_PAGES = 50  # pages sent to a re-parse worker at once
+
+
+def blob_path(directory, digest):
+    return os.path.join(directory, 'objects', digest[:2], digest[2:])
+
+
+def read_blob(directory, digest):
+    """Function to get raw body of archived page by its digest"""
+    with open(blob_path(directory, digest), 'rb') as f:
+        return zlib.decompress(f.read())
+
+
+class PageArchive(object):
+    """Archive in directory. Index rows are committed at least every commit_interval seconds and by close()"""
+    def __init__(self, directory='archive', commit_interval=1.0, level=6):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.level = level
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.db'))
+        self.connection.executescript(SCHEMA)
+        self.last_commit = time.monotonic()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def commit(self):
+        self.connection.commit()
+        self.last_commit = time.monotonic()
+
+    def store(self, url, body, encoding, spider=None, callback=None, fetched_at=None):
+        """Function to archive fetched page, returns True if its content was not archived before"""
+        digest = hashlib.sha1(body).hexdigest()
+        new = self.connection.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is None
+        if new:
+            data = zlib.compress(body, self.level)
+            path = blob_path(self.directory, digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)  # blob is complete before it is referenced by the index
+            self.connection.execute('INSERT INTO blobs (digest, size, stored) VALUES (?, ?, ?)',
+                                    (digest, len(body), len(data)))
+        self.connection.execute('INSERT INTO pages (url, fetched_at, digest, encoding, spider, callback) '
+                                'VALUES (?, ?, ?, ?, ?, ?)',
+                                (url, fetched_at or datetime.now(timezone.utc).isoformat(), digest, encoding,
+                                 spider, callback))
+        if time.monotonic() - self.last_commit >= self.commit_interval:
+            self.commit()
+        return new
+
+    def merge(self, directory):
+        """Function to add all fetches of the archive in directory (e.g. of a worker of sharded crawl) to this one,
+        contents already stored here are not copied. Returns numbers of added fetches and contents"""
+        other = sqlite3.connect(os.path.join(directory, 'index.db'))
+        blobs = 0
+        for digest, size, stored in other.execute('SELECT digest, size, stored FROM blobs ORDER BY digest'):
+            if self.connection.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is not None:
+                continue
+            path = blob_path(self.directory, digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(blob_path(directory, digest), path + '.tmp')  # blobs are compressed already
+            os.replace(path + '.tmp', path)
+            self.connection.execute('INSERT INTO blobs (digest, size, stored) VALUES (?, ?, ?)', (digest, size, stored))
+            blobs += 1
+        pages = other.execute('SELECT url, fetched_at, digest, encoding, spider, callback FROM pages '
+                              'ORDER BY fetched_at, url').fetchall()
+        other.close()
+        self.connection.executemany('INSERT INTO pages (url, fetched_at, digest, encoding, spider, callback) '
+                                    'VALUES (?, ?, ?, ?, ?, ?)', pages)
+        self.commit()
+        return len(pages), blobs
+
+    def history(self, url):
+        """Function to get (fetched_at, digest) of all fetches of url, oldest first"""
+        return self.connection.execute('SELECT fetched_at, digest FROM pages WHERE url = ? ORDER BY fetched_at',
+                                       (url,)).fetchall()
+
+    def latest_pages(self, callbacks=REPARSE_CALLBACKS):
+        """Function to get (url, digest, encoding, callback) of the last fetch of every url fetched with
+        one of callbacks, in order of the first fetch"""
+        placeholders = ', '.join('?' * len(callbacks))
+        return self.connection.execute(
+            'SELECT p.url, p.digest, p.encoding, p.callback FROM pages p JOIN ('
+            'SELECT MAX(rowid) AS last, MIN(rowid) AS first FROM pages WHERE callback IN ({}) GROUP BY url) l '
+            'ON p.rowid = l.last ORDER BY l.first'.format(placeholders), tuple(callbacks)).fetchall()
+
+    def counts(self):
+        """Function to get numbers of fetches and stored contents, raw and compressed size of contents in bytes"""
+        fetches = self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        blobs, size, stored = self.connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored), 0) FROM blobs').fetchone()
+        return fetches, blobs, size, stored
+
+
+_spider = None  # blog_scraper instance of the re-parse process
+
+
+def parse_page(directory, url, digest, encoding, callback):
+    """Function to run spider callback over archived page, returns list of scraped items"""
+    global _spider
+    if _spider is None:
+        from gd_blog_spider.spiders.blog_parse import GDBlogCrawler
+        _spider = GDBlogCrawler()
+    response = HtmlResponse(url=url, body=read_blob(directory, digest), encoding=encoding, request=Request(url))
+    return [item for item in getattr(_spider, callback)(response) if not isinstance(item, Request)]
+
+
+def parse_chunk(directory, pages):
+    """Function to re-parse a chunk of pages in a worker process"""
+    from gd_blog_spider.spiders import blog_parse  # configures logging on import
+    logging.getLogger().setLevel(logging.WARNING)  # no log line per page
+    items = []
+    for url, digest, encoding, callback in pages:
+        items.extend(parse_page(directory, url, digest, encoding, callback))
+    return items
+
+
+def reparse(directory='archive', output='reparsed', layout='normalized', workers=0, state_db=None):
+    """Function to write csv files of blog_scraper into output directory from the last archived version of
+    every page. Returns number of re-parsed pages"""
+    from gd_blog_spider.pipelines import GdBlogSpiderPipeline
+    from gd_blog_spider.spiders.blog_parse import GDBlogCrawler
+
+    archive = PageArchive(directory)
+    pages = archive.latest_pages()
+    archive.close()
+    os.makedirs(output, exist_ok=True)
+    spider = GDBlogCrawler()
+    spider.output_articles = os.path.join(output, 'articles.csv')
+    spider.output_authors = os.path.join(output, 'authors.csv')
+    for path in (spider.output_authors, spider.output_articles) + link_paths(spider.output_articles):
+        if os.path.isfile(path):  # csv files are appended by the pipeline
+            os.remove(path)
+    pipeline = GdBlogSpiderPipeline(state_db=state_db, layout=layout)
+    pipeline.open_spider(spider)
+    if workers > 0:
+        chunks = [pages[i:i + CHUNK_PAGES] for i in range(0, len(pages), CHUNK_PAGES)]
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = executor.map(parse_chunk, [directory] * len(chunks), chunks)
+            for items in results:
+                for item in items:
+                    pipeline.process_item(item, spider)
+    else:
+        for url, digest, encoding, callback in pages:
+            for item in parse_page(directory, url, digest, encoding, callback):
+                pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    return len(pages)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Raw pages archive: statistics and offline re-parse')
+    parser.add_argument('--dir', default='archive', help='archive directory (ARCHIVE_DIR)')
+    parser.add_argument('--reparse', action='store_true', help='write csv files from archived pages')
+    parser.add_argument('--output', default='reparsed', help='directory of re-parsed csv files')
+    parser.add_argument('--layout', choices=['flat', 'normalized'], default='normalized', help='layout of csv')
+    parser.add_argument('--workers', type=int, default=0, help='parsing processes, 0 - parse in this process')
+    parser.add_argument('--db', help='also update this state database with re-parsed items')
+    args = parser.parse_args()
+    if not os.path.isfile(os.path.join(args.dir, 'index.db')):
+        parser.error('no archive in {}'.format(args.dir))
+    if args.reparse:
+        from gd_blog_spider.spiders import blog_parse  # configures logging on import
+        logging.getLogger().setLevel(logging.WARNING)
+        start = time.perf_counter()
+        reparsed = reparse(args.dir, args.output, args.layout, args.workers, args.db)
+        elapsed = time.perf_counter() - start
+        print('{} page(s) re-parsed in {:.2f}s, {:.1f} pages/s -> {}'.format(
+            reparsed, elapsed, reparsed / elapsed if elapsed else 0, args.output))
+    else:
+        archive = PageArchive(args.dir)
+        fetches, blobs, size, stored = archive.counts()
+        archive.close()
+        print('{} fetch(es), {} unique page(s), {:.1f} MiB raw, {:.1f} MiB stored'.format(
+            fetches, blobs, size / 2 ** 20, stored / 2 ** 20))
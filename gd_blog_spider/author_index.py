@@ -0,0 +1,62 @@
+import csv
+import os
+import tempfile
+
+from gd_blog_spider.pipelines import AUTHORS_HEADER, author_rows
+
+
+class AuthorIndex(object):
+    """Content of authors.csv kept in memory and keyed by full_name.
+    Loaded once when spider is opened and saved once when spider is closed"""
+    def __init__(self, path):
+        self.path = path
+        self.header = AUTHORS_HEADER
+        self.authors = {}  # full_name -> list of csv rows (one row per contact)
+        self.loaded = False
+
+    def __contains__(self, full_name):
+        return full_name in self.authors
+
+    def __len__(self):
+        return len(self.authors)
+
+    def load(self):
+        self.authors = {}
+        self.loaded = True
+        if not os.path.isfile(self.path):
+            return self
+        with open(self.path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            self.header = next(reader, AUTHORS_HEADER)
+            for row in reader:
+                if row:
+                    self.authors.setdefault(row[0], []).append(row)
+        return self
+
+    def increment(self, full_name):
+        """Function to increase articles counter of known author, returns False for unknown author"""
+        rows = self.authors.get(full_name)
+        if rows is None:
+            return False
+        for row in rows:
+            row[4] = int(row[4]) + 1  # row[4] - 'articles_counter' field in csv
+        return True
+
+    def add(self, item):
+        """Function to add (or replace) author from AuthorItem"""
+        self.authors[item['full_name']] = author_rows(item)
+
+    def save(self):
+        """Function to atomically replace csv file with the index content"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.authors-', suffix='.csv', dir=directory)
+        try:
+            with os.fdopen(fd, mode='w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.header)
+                for rows in self.authors.values():
+                    writer.writerows(rows)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,266 @@
+"""Memory-bounded dedup of requests for very large crawls (DUPEFILTER_CLASS).
+
+Request fingerprints are kept in a scalable Bloom filter (about 2 bytes per request instead of ~100 bytes
+per fingerprint of the Scrapy set), every positive answer of the filter is confirmed by the exact store
+on disk (DUPEFILTER_DB), so a false positive never drops a new request. For spiders with
+skip_known_pages = True the filter is pre-seeded with pages already in the dataset (seen urls of STATE_DB),
+so they are dropped before they are scheduled. Seeding is incremental: fingerprints of known pages are
+kept in the exact store and the filter of known pages is saved with them (meta table of DUPEFILTER_DB),
+every crawl hashes only pages saved since the last one. Both are bound to the identity token of STATE_DB
+(store_id of its meta table): known pages of a recreated or replaced store are dropped. Without a saved
+filter (or with other DUPEFILTER_CAPACITY and DUPEFILTER_ERROR_RATE) it is rebuilt from the exact store once.
+"""
+import logging
+import math
+import os
+import sqlite3
+import struct
+
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.http import Request
+from scrapy.utils.request import referer_str, request_fingerprint
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS known (fingerprint TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session (fingerprint TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+'''
+HEADER = struct.Struct('<QdddI')  # serialized filter: capacity, error rate, growth, tightening, number of filters
+COUNT = struct.Struct('<Q')  # keys of one filter, its bits follow
+
+
+def key_hashes(key):
+    """Function to get two hash values of hex digest for double hashing"""
+    return int(key[:16], 16), int(key[16:32], 16) | 1
+
+
+class BloomFilter(object):
+    """Bloom filter for hex digests (request fingerprints): hash values are taken from bits of the key itself"""
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))  # bits
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __contains__(self, key):
+        return self.contains(*key_hashes(key))
+
+    def add(self, key):
+        self.insert(*key_hashes(key))
+
+    def contains(self, h1, h2):
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % size
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def insert(self, h1, h2):
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % size
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class ScalableBloomFilter(object):
+    """Chain of Bloom filters growing with the number of keys (Almeida et al.), the error rate of the whole chain
+    stays below error_rate: every next filter is growth times bigger and has tightening times lower error rate"""
+    def __init__(self, capacity=10000, error_rate=0.001, growth=2, tightening=0.5):
+        self.initial_capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+
+    def __contains__(self, key):
+        h1, h2 = key_hashes(key)
+        for f in reversed(self.filters):  # the biggest filter has most of keys
+            if f.contains(h1, h2):
+                return True
+        return False
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+
+    def add(self, key):
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            stage = len(self.filters)
+            self.filters.append(BloomFilter(self.initial_capacity * self.growth ** stage,
+                                            self.error_rate * (1 - self.tightening) * self.tightening ** stage))
+        self.filters[-1].insert(*key_hashes(key))
+
+    @property
+    def nbytes(self):
+        return sum(len(f.bits) for f in self.filters)
+
+    def to_bytes(self):
+        """Function to serialize parameters, counters and bits of the filters (sizes follow from parameters)"""
+        data = [HEADER.pack(self.initial_capacity, self.error_rate, self.growth, self.tightening, len(self.filters))]
+        for f in self.filters:
+            data.append(COUNT.pack(f.count))
+            data.append(bytes(f.bits))
+        return b''.join(data)
+
+    def load(self, data):
+        """Function to restore filters serialized by to_bytes, returns False (keeping the filter empty)
+        if they were made with other parameters"""
+        capacity, error_rate, growth, tightening, stages = HEADER.unpack_from(data)
+        if (capacity, error_rate, growth, tightening) != (self.initial_capacity, self.error_rate, self.growth,
+                                                          self.tightening):
+            return False
+        filters, offset = [], HEADER.size
+        for stage in range(stages):
+            f = BloomFilter(capacity * growth ** stage, error_rate * (1 - tightening) * tightening ** stage)
+            f.count = COUNT.unpack_from(data, offset)[0]
+            offset += COUNT.size
+            f.bits = bytearray(data[offset:offset + len(f.bits)])
+            offset += len(f.bits)
+            filters.append(f)
+        if offset != len(data):  # truncated or damaged
+            return False
+        self.filters = filters
+        return True
+
+
+def store_identity(state):
+    """Function to get identity token of the state store (connection), None for stores without it"""
+    try:
+        row = state.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()
+    except sqlite3.OperationalError:  # store of the version without meta table
+        return None
+    return row[0] if row is not None else None
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """Request dupefilter with the Bloom filter in memory and the exact store on disk"""
+    def __init__(self, path='dupefilter.db', state_db=None, seed=False, capacity=10000, error_rate=0.001,
+                 stats=None, debug=False):
+        self.path = path
+        self.state_db = state_db
+        self.seed = seed
+        self.filter = ScalableBloomFilter(capacity, error_rate)
+        self.stats = stats
+        self.debug = debug
+        self.connection = None
+        self.negatives = 0  # requests found new by the filter alone
+        self.false_positives = 0  # positives of the filter not confirmed by the exact store
+        self.known_filtered = 0
+        self.seeded = 0  # fingerprints of known pages added to the filter when it was opened
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        spider = crawler.spider
+        return cls(settings.get('DUPEFILTER_DB', 'dupefilter_%(name)s.db') % {'name': spider.name},
+                   state_db=settings.get('STATE_DB'), seed=getattr(spider, 'skip_known_pages', False),
+                   capacity=settings.getint('DUPEFILTER_CAPACITY', 10000),
+                   error_rate=settings.getfloat('DUPEFILTER_ERROR_RATE', 0.001),
+                   stats=crawler.stats, debug=settings.getbool('DUPEFILTER_DEBUG'))
+
+    def open(self):
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA synchronous = OFF')  # the store is rebuilt from STATE_DB if lost
+        self.connection.executescript(SCHEMA)
+        self.connection.execute('DELETE FROM session')  # requests of the previous crawl
+        if self.seed:
+            loaded = self.load_filter()
+            fingerprints = self.seed_known()
+            if fingerprints is None or not loaded:  # no saved filter or known pages were reset
+                self.filter.filters = []
+                fingerprints = [fingerprint for (fingerprint,) in self.connection.execute(
+                    'SELECT fingerprint FROM known')]
+            for fingerprint in fingerprints:
+                if fingerprint not in self.filter:  # a positive answer is enough, the key is kept once
+                    self.filter.add(fingerprint)
+            self.seeded = len(fingerprints)
+            if fingerprints:
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('bloom', ?)",
+                                        (self.filter.to_bytes(),))
+            logger.info('{} known page(s) in the dupefilter, {} added since the last crawl'.format(
+                len(self.filter), self.seeded))
+        self.connection.commit()
+
+    def load_filter(self):
+        """Function to restore the filter of known pages saved by the last crawl (its bits are kept in the
+        meta table with the seen_rowid they are valid for), returns False if there is none"""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'bloom'").fetchone()
+        return row is not None and isinstance(row[0], bytes) and self.filter.load(row[0])
+
+    def seed_known(self):
+        """Function to add fingerprints of pages saved to the state store since the last seeding to the exact
+        store. Returns list of added fingerprints, None if all known pages were dropped (the store was recreated)"""
+        if not self.state_db or not os.path.isfile(self.state_db):
+            return []
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'seen_rowid'").fetchone()
+        last_rowid = row[0] if row is not None else 0
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()
+        last_store_id = row[0] if row is not None else None
+        reset = False
+        state = sqlite3.connect('file:{}?mode=ro'.format(self.state_db), uri=True)
+        try:
+            store_id = store_identity(state)
+            max_rowid = state.execute('SELECT MAX(rowid) FROM seen').fetchone()[0] or 0
+            if store_id != last_store_id or max_rowid < last_rowid:
+                self.connection.execute('DELETE FROM known')  # state store was recreated (or replaced by another)
+                last_rowid, reset = 0, last_store_id is not None or last_rowid > 0
+            rows = state.execute('SELECT rowid, url FROM seen WHERE rowid > ? ORDER BY rowid',
+                                 (last_rowid,)).fetchall()
+        except sqlite3.OperationalError:  # store without seen table yet
+            store_id, rows = None, []
+        finally:
+            state.close()
+        fingerprints = [request_fingerprint(Request(url)) for _, url in rows]
+        self.connection.executemany('INSERT OR IGNORE INTO known (fingerprint) VALUES (?)',
+                                    [(fingerprint,) for fingerprint in fingerprints])
+        if rows or reset:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seen_rowid', ?)",
+                                    (rows[-1][0] if rows else 0,))
+        if store_id is not None:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('store_id', ?)", (store_id,))
+        return None if reset else fingerprints
+
+    def request_seen(self, request):
+        fingerprint = request_fingerprint(request)
+        if fingerprint in self.filter:  # exact check, the filter may answer positive for a new request
+            if self.connection.execute('SELECT 1 FROM session WHERE fingerprint = ?',
+                                       (fingerprint,)).fetchone() is not None:
+                return True
+            if self.seed and self.connection.execute('SELECT 1 FROM known WHERE fingerprint = ?',
+                                                     (fingerprint,)).fetchone() is not None:
+                self.known_filtered += 1
+                return True
+            self.false_positives += 1
+        else:
+            self.negatives += 1
+        self.filter.add(fingerprint)
+        self.connection.execute('INSERT OR IGNORE INTO session (fingerprint) VALUES (?)', (fingerprint,))
+        return False
+
+    def close(self, reason):
+        logger.info('Dupefilter: {} request(s) in {:.1f} KiB of Bloom filter(s), {} known page(s) dropped, '
+                    '{} false positive(s)'.format(len(self.filter), self.filter.nbytes / 1024, self.known_filtered,
+                                                  self.false_positives))
+        if self.stats is not None:
+            self.stats.set_value('dupefilter/bloom_bytes', self.filter.nbytes)
+            self.stats.set_value('dupefilter/bloom_keys', len(self.filter))
+            self.stats.set_value('dupefilter/bloom_filters', len(self.filter.filters))
+            self.stats.set_value('dupefilter/known_filtered', self.known_filtered)
+            self.stats.set_value('dupefilter/seeded', self.seeded)
+            self.stats.set_value('dupefilter/false_positives', self.false_positives)
+            tested = self.negatives + self.false_positives  # new requests tested by the filter
+            self.stats.set_value('dupefilter/false_positive_rate',
+                                 round(self.false_positives / tested, 6) if tested else 0.0)
+        self.connection.commit()
+        self.connection.close()
+
+    def log(self, request, spider):
+        if self.debug:
+            logger.debug('Filtered duplicate request: %(request)s (referer: %(referer)s)',
+                         {'request': request, 'referer': referer_str(request)}, extra={'spider': spider})
+        spider.crawler.stats.inc_value('dupefilter/filtered', spider=spider)
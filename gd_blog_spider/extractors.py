@@ -0,0 +1,129 @@
+"""Helpers to extract data from already parsed Scrapy selectors.
+
+Every article and author field used by the spiders is defined once in the registry at the bottom of the module.
+Css selectors are translated to XPath and compiled when module is imported, so pages are parsed without
+cssselect translation and every field of a page is taken in one pass over its scope elements."""
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+TEXT_LIMIT = 160  # according to task text must be truncated to 160 symbols
+
+
+def _iter_text(element):
+    """Function to iterate over text nodes of lxml element in document order (comments are skipped)"""
+    if not isinstance(element.tag, str):  # comment, processing instruction or entity
+        return
+    if element.text:
+        yield element.text
+    for child in element:
+        yield from _iter_text(child)
+        if child.tail:
+            yield child.tail
+
+
+def _stripped_prefix(element, limit):
+    """Function to get stripped text of element. Walking stops as soon as text is known to be longer than limit,
+    in that case only first limit + 1 symbols are returned"""
+    text = ''
+    for chunk in _iter_text(element):
+        if not text:
+            chunk = chunk.lstrip()
+        text += chunk
+        if len(text.rstrip()) > limit:  # non-whitespace symbol found beyond the limit
+            return text[:limit + 1]
+    return text.strip()
+
+
+def elements_text(elements, limit=TEXT_LIMIT):
+    """Function to get text of lxml elements without html tags, truncated to limit + 1 symbols"""
+    text = ''
+    for element in elements:
+        text += _stripped_prefix(element, limit)
+        if len(text) > limit:
+            text = text[:limit + 1].replace('\r', '').replace('\n', ' ')
+    return text
+
+
+def extract_text(selectors, limit=TEXT_LIMIT):
+    """Function to get text of selectors without html tags, truncated to limit + 1 symbols.
+    Gives the same result as BeautifulSoup(html).get_text().strip() for every selector with truncation
+    applied after each of them"""
+    return elements_text([selector.root for selector in selectors], limit)
+
+
+_translator = HTMLTranslator()  # the same translator Scrapy uses for response.css(), supports ::text and ::attr()
+
+
+def compile_css(css):
+    """Function to translate css selector to compiled XPath (relative to the element it is applied to)"""
+    return etree.XPath(_translator.css_to_xpath(css), smart_strings=False)
+
+
+def first(results):
+    """Same as SelectorList.get()"""
+    return results[0] if results else None
+
+
+class Extractor(object):
+    """Fields of one page type. fields - {name: (css, reducer)} applied to every scope element,
+    page_fields - the same but applied once to the whole page. reducer gets list of XPath results,
+    e.g. first, list, len or elements_text"""
+    def __init__(self, scope, fields, page_fields=None):
+        self.scope = compile_css(scope)
+        self.fields = [(name, compile_css(css), reducer) for name, (css, reducer) in fields.items()]
+        self.page_fields = [(name, compile_css(css), reducer) for name, (css, reducer) in (page_fields or {}).items()]
+
+    def extract_page(self, response):
+        """Function to get (dict of page fields, list of dicts with fields of every scope element)"""
+        root = response.selector.root
+        page = {name: reducer(xpath(root)) for name, xpath, reducer in self.page_fields}
+        return page, [{name: reducer(xpath(element)) for name, xpath, reducer in self.fields}
+                      for element in self.scope(root)]
+
+    def extract(self, response):
+        """Function to get list of dicts with all fields, one dict per scope element of response"""
+        page, elements = self.extract_page(response)
+        return [dict(page, **fields) for fields in elements]
+
+
+ARTICLE = Extractor('body > div#wrap', {
+    'title': ('div#postcontent > h1::text', first),
+    'text': ('div#postcontent > div#mypost', elements_text),  # first 160 symbols without html tags
+    'publication_date': ('div#postcontent > div.no-mobile > div.posttag.right.nomobile > span::text', first),
+    'authors': ('div#postcontent > div.no-mobile > div.postauthor.left > span > a.goauthor > span::text', list),
+    'authors_urls': ('div#postcontent > div.no-mobile > div.postauthor.left > span > a::attr(href)', list),
+}, page_fields={
+    'tags': ('ul#mainmenu > li.current > a::text', list),
+})
+
+AUTHOR = Extractor('div#wrap > div#author > div#authorbox', {
+    'full_name': ('div.nomobile > div.right > h1::text', first),
+    'job_title': ('div.nomobile > div.right > h2::text', first),
+    'articles_counter': ('did.postlist > a::text', len),
+    'social_urls': ('div.mobile > div.right > div.authorsocial > a::attr(href)', list),
+}, page_fields={
+    'articles_urls': ('div#author > div#authorbox > did.postlist > a::attr(href)', list),
+})
+
+ALL_AUTHORS = Extractor('div#wrap > div.blog.list.authorslist > div.inner > div.row > div.left > div.single', {
+    'url': ('a.authormore::attr(href)', first),
+})
+
+EXPLORE = Extractor('div.cntt', {
+    'publication_date': ('div.viewauthor > div.authwrp > span::text', first),
+    'url': ('h4 > a::attr(href)', first),
+}, page_fields={
+    'next_page': ('link[rel="next"]::attr(href), a[rel="next"]::attr(href)', first),  # listing is newest first
+})
+
+
+def split_social(urls):
+    """Function to split author social urls into (linkedin url or '', list of other contacts)"""
+    linkedin = ''
+    contacts = []
+    for url in urls:
+        if 'linkedin' in url:
+            linkedin = url
+        else:
+            contacts.append(url)
+    return linkedin, contacts
@@ -4,5 +4,151 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
+#
+# Items are compact records: values are kept in __slots__ instead of a dict per item, repeated values
+# (tags, author names, job titles, publication dates) are interned, so all records share one object per value.
+# Vocabularies of interned values are bounded and cleared by the pipeline when a crawl is finished.
+
+from scrapy.item import BaseItem, Field
+
+
+class Vocabulary(object):
+    """Distinct values of one kind (e.g. tags): every value is kept once and records share it
+    instead of holding own copies of equal strings. At most limit values are kept, values seen after
+    that are not interned, so a long process doesn't grow the vocabulary without bound"""
+    def __init__(self, limit=65536):
+        self.values = {}
+        self.limit = limit
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value):
+        if len(self.values) < self.limit:
+            return self.values.setdefault(value, value)
+        return self.values.get(value, value)
+
+    def intern_list(self, values):
+        if len(self.values) < self.limit:
+            intern = self.values.setdefault
+        else:
+            intern = self.values.get
+        return [intern(value, value) for value in values]
+
+    def clear(self):
+        self.values = {}
+
+
+TAGS = Vocabulary()
+AUTHORS = Vocabulary()  # full names
+JOB_TITLES = Vocabulary()
+DATES = Vocabulary()  # publication dates (date objects or 'YYYY-MM-DD' strings)
+VOCABULARIES = (TAGS, AUTHORS, JOB_TITLES, DATES)
+
+
+def clear_vocabularies():
+    """Function to drop interned values when a crawl is finished (records made before keep their values)"""
+    for vocabulary in VOCABULARIES:
+        vocabulary.clear()
+
+
+class Record(BaseItem):
+    """Item with values in __slots__. Fields are read and set by name as in scrapy.Item (record['title'])
+    or as attributes, absent ones are None; records are equal to tuples of their values in order of fields.
+    BaseItem makes records scraped items for Scrapy (spider output must be BaseItem or dict), fields are
+    declared as in scrapy.Item (name -> Field), so item exporters of Scrapy work with records"""
+    __slots__ = ()
+    field_names = ()  # names of slots in order of values
+    fields = {}
+
+    def __new__(cls, *args, **kwargs):  # records are not tracked by scrapy.utils.trackref (no weak references)
+        return object.__new__(cls)
+
+    def __init__(self, *values, **kwargs):
+        for name, value in zip(self.field_names, values):
+            object.__setattr__(self, name, value)
+        for name in self.field_names[len(values):]:
+            object.__setattr__(self, name, kwargs.pop(name, None))
+        if kwargs:
+            raise KeyError('{} does not support field(s): {}'.format(self.__class__.__name__, ', '.join(kwargs)))
+
+    def __setattr__(self, name, value):  # BaseItem has __dict__, it's never filled
+        if name not in self.fields:
+            raise AttributeError('{} has no field {}'.format(self.__class__.__name__, name))
+        object.__setattr__(self, name, value)
+
+    def __getitem__(self, name):
+        if name not in self.fields:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in self.fields:
+            raise KeyError('{} does not support field: {}'.format(self.__class__.__name__, name))
+        object.__setattr__(self, name, value)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def __iter__(self):
+        return iter(self.field_names)
+
+    def __len__(self):
+        return len(self.field_names)
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in self.fields else None
+        return default if value is None else value
+
+    def keys(self):
+        return self.field_names
+
+    def astuple(self):
+        return tuple(getattr(self, name) for name in self.field_names)
+
+    def __eq__(self, other):
+        if isinstance(other, Record) and other.field_names == self.field_names:
+            other = other.astuple()
+        if isinstance(other, tuple):
+            return self.astuple() == other
+        return NotImplemented
+
+    __hash__ = None  # mutable as scrapy.Item
+
+    def __reduce__(self):
+        return self.__class__, self.astuple()
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__,
+                               ', '.join('{}={!r}'.format(name, getattr(self, name)) for name in self.field_names))
+
+
+class ArticleItem(Record):
+    """Single blog-post with all of its authors and tags"""
+    __slots__ = field_names = ('title', 'url', 'text', 'publication_date',
+                               'authors',  # list of full names
+                               'tags')  # list of tag names
+    fields = {name: Field() for name in field_names}
+
+    def __init__(self, *values, **kwargs):
+        super().__init__(*values, **kwargs)
+        object.__setattr__(self, 'publication_date', DATES.intern(self.publication_date))
+        if self.authors is not None:
+            object.__setattr__(self, 'authors', AUTHORS.intern_list(self.authors))
+        if self.tags is not None:
+            object.__setattr__(self, 'tags', TAGS.intern_list(self.tags))
+
+
+class AuthorItem(Record):
+    """Single author profile"""
+    __slots__ = field_names = ('full_name', 'job_title',
+                               'linkedin',  # url or empty string
+                               'contacts',  # list of other social urls
+                               'articles_counter',
+                               'url')  # author page url
+    fields = {name: Field() for name in field_names}
 
-import scrapy
+    def __init__(self, *values, **kwargs):
+        super().__init__(*values, **kwargs)
+        object.__setattr__(self, 'full_name', AUTHORS.intern(self.full_name))
+        object.__setattr__(self, 'job_title', JOB_TITLES.intern(self.job_title))
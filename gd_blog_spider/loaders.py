@@ -0,0 +1,147 @@
+"""Compact loaders for articles.csv and authors.csv shared by the spiders and the report.
+
+Repeated strings are loaded as categoricals and publication_date is parsed into datetime64. Parsed frames can be
+cached in a pickle file next to the csv, the cache is valid while modification time and size of the files
+are unchanged. pandas is imported on first load, so spiders importing this module start fast.
+
+Articles are stored in one of two layouts:
+    flat - articles.csv with one row per author and tag pair of every article (written by old versions);
+    normalized - articles.csv keyed by url plus article_authors.csv and article_tags.csv link tables.
+load_articles returns the flat shape for both of them (see flat_view).
+"""
+import csv
+import os
+import pickle
+
+ARTICLES_COLUMNS = ['title', 'url', 'text', 'publication_date', 'author', 'tag']
+ARTICLES_DTYPES = {'title': 'category', 'url': 'category', 'text': 'category',
+                   'author': 'category', 'tag': 'category'}
+AUTHORS_DTYPES = {'full_name': 'category', 'job_title': 'category', 'linkedin': 'category',
+                  'contact': object, 'articles_counter': 'int32'}
+ARTICLE_AUTHORS_FILE = 'article_authors.csv'
+ARTICLE_TAGS_FILE = 'article_tags.csv'
+CACHE_SUFFIX = '.cache.pkl'
+CHUNK_ROWS = 5000  # rows per frame of read_chunks
+
+
+def link_paths(articles_path):
+    """Function to get paths of article_authors.csv and article_tags.csv stored next to articles file"""
+    directory = os.path.dirname(articles_path)
+    return os.path.join(directory, ARTICLE_AUTHORS_FILE), os.path.join(directory, ARTICLE_TAGS_FILE)
+
+
+def is_normalized(articles_path):
+    """Function to check if articles file is stored in normalized layout (one row per article)"""
+    with open(articles_path, newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f), [])
+    return 'author' not in header
+
+
+def csv_key(*paths):
+    """Function to get cache key of csv files (modification time and size of existing ones)"""
+    key = []
+    for path in paths:
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            key.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+
+def articles_key(articles_path):
+    """Function to get cache key of articles dataset including link tables of normalized layout"""
+    return csv_key(articles_path, *link_paths(articles_path))
+
+
+def read_cache(csv_path, key=None):
+    """Function to get parsed frame cached for csv state with given key (current state by default), None on miss"""
+    try:
+        with open(csv_path + CACHE_SUFFIX, 'rb') as f:
+            cached_key, frame = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    if key is None:
+        key = csv_key(csv_path)
+    return frame if cached_key == key else None
+
+
+def write_cache(csv_path, frame, key=None):
+    """Function to cache parsed frame for csv file in its current state (or for given key)"""
+    if key is None:
+        key = csv_key(csv_path)
+    tmp_path = csv_path + CACHE_SUFFIX + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((key, frame), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, csv_path + CACHE_SUFFIX)
+
+
+def _read_csv(csv_path, dtypes, parse_dates=(), usecols=None):
+    import pandas as pd
+
+    if usecols is not None:
+        dtypes = {column: dtype for column, dtype in dtypes.items() if column in usecols}
+        parse_dates = [column for column in parse_dates if column in usecols]
+    return pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, parse_dates=list(parse_dates))
+
+
+def read_chunks(csv_path, dtypes=None, parse_dates=(), chunksize=CHUNK_ROWS):
+    """Function to iterate over csv file by frames of chunksize rows (for files bigger than memory).
+    Categorical dtypes are read as plain strings, categories of separate chunks would not match"""
+    import pandas as pd
+
+    dtypes = {column: str if dtype == 'category' else dtype for column, dtype in (dtypes or {}).items()}
+    for chunk in pd.read_csv(csv_path, dtype=dtypes, parse_dates=list(parse_dates), chunksize=chunksize):
+        yield chunk
+
+
+def flat_view(articles, article_authors, article_tags):
+    """Function to rebuild old flat shape (one row per author and tag pair) from normalized tables"""
+    flat = articles.merge(article_authors, on='url').merge(article_tags, on='url')
+    return flat[ARTICLES_COLUMNS].astype(ARTICLES_DTYPES)
+
+
+def load_normalized_articles(csv_path='articles.csv'):
+    """Function to load normalized layout as (articles, article_authors, article_tags) frames"""
+    authors_path, tags_path = link_paths(csv_path)
+    return (_read_csv(csv_path, ARTICLES_DTYPES, ['publication_date']),
+            _read_csv(authors_path, ARTICLES_DTYPES), _read_csv(tags_path, ARTICLES_DTYPES))
+
+
+def _read_articles(csv_path, columns=None):
+    if not is_normalized(csv_path):
+        return _read_csv(csv_path, ARTICLES_DTYPES, ['publication_date'], columns)
+    columns = columns or ARTICLES_COLUMNS
+    articles = _read_csv(csv_path, ARTICLES_DTYPES, ['publication_date'],
+                         [column for column in ARTICLES_COLUMNS[:4] if column in columns or column == 'url'])
+    '''link tables are read only if author or tag is requested, rows are repeated only for them'''
+    authors_path, tags_path = link_paths(csv_path)
+    if 'author' in columns:
+        articles = articles.merge(_read_csv(authors_path, ARTICLES_DTYPES), on='url')
+    if 'tag' in columns:
+        articles = articles.merge(_read_csv(tags_path, ARTICLES_DTYPES), on='url')
+    return articles[[column for column in ARTICLES_COLUMNS if column in columns]].astype(
+        {column: dtype for column, dtype in ARTICLES_DTYPES.items() if column in columns})
+
+
+def load_articles(csv_path='articles.csv', columns=None, cache=False):
+    """Function to load articles in flat shape with compact dtypes. columns - list of needed columns (all by default)"""
+    key = articles_key(csv_path)
+    frame = read_cache(csv_path, key) if cache else None
+    if frame is None:
+        frame = _read_articles(csv_path, None if cache else columns)  # cache always keeps all columns
+        if cache:
+            write_cache(csv_path, frame, key)
+    if columns is not None:
+        frame = frame[list(columns)]
+    return frame
+
+
+def load_authors(csv_path='authors.csv', columns=None, cache=False):
+    """Function to load authors with compact dtypes. columns - list of needed columns (all by default)"""
+    frame = read_cache(csv_path) if cache else None
+    if frame is None:
+        frame = _read_csv(csv_path, AUTHORS_DTYPES, usecols=None if cache else columns)
+        if cache:
+            write_cache(csv_path, frame)
+    if columns is not None:
+        frame = frame[list(columns)]
+    return frame
@@ -5,7 +5,20 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import logging
+import time
+
 from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, NotConfigured
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.request import request_fingerprint
+from twisted.internet import task
+
+from gd_blog_spider import profiling
+from gd_blog_spider.archive import PageArchive
+from gd_blog_spider.sharding import ShardQueue
+
+logger = logging.getLogger(__name__)
 
 
 class GdBlogSpiderSpiderMiddleware(object):
@@ -100,4 +113,429 @@ class GdBlogSpiderDownloaderMiddleware(object):
         pass
 
     def spider_opened(self, spider):
-        spider.logger.info('Spider opened: %s' % spider.name)
\ No newline at end of file
+        spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class ConcurrencyController(object):
+    """AIMD controller of one download slot concurrency. Decision is made once per window of responses:
+    concurrency is halved when latency is above target or too many errors happened, increased by one
+    when latency is well below target"""
+    def __init__(self, concurrency, min_concurrency=1, max_concurrency=32, target_latency=1.0,
+                 window=10, max_error_rate=0.1):
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.latency = None  # exponentially weighted moving average, seconds
+        self.responses = 0  # in current window
+        self.errors = 0  # same as above
+
+    def observe(self, latency=None, error=False):
+        """Function to register response (or failure), returns 'increase', 'decrease' or None"""
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        self.responses += 1
+        if error:
+            self.errors += 1
+        if self.responses < self.window:
+            return None
+        error_rate = self.errors / self.responses
+        self.responses = self.errors = 0
+        latency = self.latency or 0.0
+        if error_rate > self.max_error_rate or latency > self.target_latency:
+            new_concurrency = max(self.min_concurrency, self.concurrency // 2)
+            decision = 'decrease'
+        elif latency < 0.8 * self.target_latency:
+            new_concurrency = min(self.max_concurrency, self.concurrency + 1)
+            decision = 'increase'
+        else:
+            return None
+        if new_concurrency == self.concurrency:
+            return None
+        self.concurrency = new_concurrency
+        return decision
+
+
+class AdaptiveConcurrencyMiddleware(object):
+    """Adjusts number of concurrent requests per download slot (domain) by observed latency and error rate.
+    Decisions are exposed in crawl stats under 'adaptive_concurrency/' prefix"""
+    ERROR_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        settings = crawler.settings
+        self.min_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MIN', 1)
+        self.max_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MAX', 32)
+        self.target_latency = settings.getfloat('ADAPTIVE_CONCURRENCY_TARGET_LATENCY', 1.0)
+        self.window = settings.getint('ADAPTIVE_CONCURRENCY_WINDOW', 10)
+        self.max_error_rate = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE', 0.1)
+        self.controllers = {}  # download slot key -> ConcurrencyController
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        self._observe(request, request.meta.get('download_latency'), response.status in self.ERROR_STATUSES)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._observe(request, request.meta.get('download_latency'), True)
+
+    def _observe(self, request, latency, error):
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+        controller = self.controllers.get(key)
+        if controller is None:
+            controller = ConcurrencyController(slot.concurrency, self.min_concurrency, self.max_concurrency,
+                                               self.target_latency, self.window, self.max_error_rate)
+            self.controllers[key] = controller
+        if error:
+            self.stats.inc_value('adaptive_concurrency/errors')
+        decision = controller.observe(latency, error)
+        if decision is not None:
+            slot.concurrency = controller.concurrency
+            self.stats.inc_value('adaptive_concurrency/{}s'.format(decision))
+            self.stats.max_value('adaptive_concurrency/{}/max_concurrency'.format(key), controller.concurrency)
+            logger.debug('Concurrency of %s: %s to %d (latency %.3fs)', key, decision, controller.concurrency,
+                         controller.latency or 0.0)
+        self.stats.set_value('adaptive_concurrency/{}/concurrency'.format(key), controller.concurrency)
+        if controller.latency is not None:
+            self.stats.set_value('adaptive_concurrency/{}/latency_ms'.format(key), int(controller.latency * 1000))
+
+
+class ConditionalRequestMiddleware(object):
+    """Saves ETag and Last-Modified of fetched html pages in the crawl state store (spider.state) and adds
+    If-None-Match and If-Modified-Since headers with them, so unchanged pages are answered with 304 Not Modified.
+    Headers are added only for spiders with conditional_requests = True, they must handle 304 responses"""
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CONDITIONAL_REQUESTS_ENABLED'):
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_request(self, request, spider):
+        state = getattr(spider, 'state', None)
+        if not getattr(spider, 'conditional_requests', False) or state is None:
+            return None
+        validators = state.get_validators(request.url)
+        if validators is None:
+            return None
+        _, etag, last_modified = validators
+        if etag:
+            request.headers.setdefault('If-None-Match', etag)
+        if last_modified:
+            request.headers.setdefault('If-Modified-Since', last_modified)
+        if etag or last_modified:
+            self.stats.inc_value('conditional_requests/sent')
+
+    def process_response(self, request, response, spider):
+        state = getattr(spider, 'state', None)
+        if response.status == 304 and getattr(spider, 'conditional_requests', False):
+            self.stats.inc_value('conditional_requests/not_modified')
+        elif state is not None and response.status == 200 and isinstance(response, HtmlResponse):
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            if etag or last_modified:  # sitemaps are not saved, they are always read in full
+                state.set_validators(response.url, etag=etag and etag.decode('latin-1'),
+                                     last_modified=last_modified and last_modified.decode('latin-1'))
+        return response
+
+
+class ArchiveMiddleware(object):
+    """Stores raw html pages fetched with status 200 in the compressed page archive (see gd_blog_spider.archive),
+    with the name of the spider and of the request callback, so pages can be re-parsed offline"""
+    def __init__(self, directory, stats):
+        self.directory = directory
+        self.stats = stats
+        self.archive = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ARCHIVE_ENABLED'):
+            raise NotConfigured
+        middleware = cls(crawler.settings.get('ARCHIVE_DIR', 'archive'), crawler.stats)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.archive = PageArchive(self.directory)
+
+    def spider_closed(self, spider):
+        self.archive.close()
+
+    def process_response(self, request, response, spider):
+        if response.status == 200 and isinstance(response, HtmlResponse):
+            with profiling.stage('archive'):
+                new = self.archive.store(response.url, response.body, response.encoding, spider.name,
+                                         getattr(request.callback, '__name__', None))
+            self.stats.inc_value('archive/pages')
+            if new:
+                self.stats.inc_value('archive/new_pages')
+        return response
+
+
+class ProfilingSpiderMiddleware(object):
+    """Times spider callbacks: wall and CPU time spent producing their output (pipelines are not included),
+    response bytes, yielded items and requests. Enables stages of gd_blog_spider.profiling while spider runs.
+    At spider close the profile is saved to crawl stats ('profile/' prefix) and to PROFILING_OUTPUT JSON file"""
+    def __init__(self, stats, output=None):
+        self.stats = stats
+        self.output = output  # %(name)s is replaced with spider name
+        self.profile = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PROFILING_ENABLED'):
+            raise NotConfigured
+        middleware = cls(crawler.stats, crawler.settings.get('PROFILING_OUTPUT'))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.profile = profiling.active = profiling.Profile()
+
+    def spider_closed(self, spider, reason):
+        profiling.active = None
+        self.profile.export_stats(self.stats)
+        if self.output:
+            path = self.output % {'name': spider.name}
+            self.profile.dump(path, spider=spider.name, reason=reason)
+            logger.info('Crawl profile saved to %s', path)
+
+    def process_spider_input(self, response, spider):
+        latency = response.meta.get('download_latency')
+        if latency is not None:
+            self.profile.add('stage', 'download', latency, nbytes=len(response.body))
+
+    def process_spider_output(self, response, result, spider):
+        request = getattr(response, 'request', None)
+        callback = request.callback if request is not None and request.callback else spider.parse
+        wall = cpu = 0.0
+        items = requests = 0
+        iterator = iter(result)
+        while True:
+            start_wall, start_cpu = time.perf_counter(), time.thread_time()
+            try:
+                entry = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                wall += time.perf_counter() - start_wall
+                cpu += time.thread_time() - start_cpu
+            if isinstance(entry, Request):
+                requests += 1
+            else:
+                items += 1
+            yield entry
+        self.profile.add('callback', getattr(callback, '__name__', str(callback)), wall, cpu,
+                         len(response.body), items, requests)
+
+
+class CheckpointMiddleware(object):
+    """Makes crawls of spiders with resumable = True crash-safe. Every scheduled request is saved to the frontier
+    of the crawl state store (spider.state) and marked done when its callback has finished, so done markers,
+    found requests and items of the pipeline are committed together (at least every CHECKPOINT_INTERVAL seconds).
+    When the crawl is interrupted (killed or stopped), the next run of the spider is resumed from pending requests
+    of the frontier instead of start requests, known requests are not scheduled again. The frontier is cleared when
+    the crawl is finished. Requests are saved as url, callback name and priority: callbacks must be spider methods"""
+    def __init__(self, stats, interval=1.0):
+        self.stats = stats
+        self.interval = interval
+        self.last_commit = time.monotonic()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CHECKPOINT_ENABLED'):
+            raise NotConfigured
+        middleware = cls(crawler.stats, crawler.settings.getfloat('CHECKPOINT_INTERVAL', 1.0))
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        return middleware
+
+    @staticmethod
+    def enabled(spider):
+        return getattr(spider, 'resumable', False) and getattr(spider, 'state', None) is not None
+
+    def process_start_requests(self, start_requests, spider):
+        if not self.enabled(spider):
+            yield from start_requests
+            return
+        if getattr(spider, 'resumed', False):  # set by GdBlogSpiderPipeline when frontier of the spider exists
+            done, pending = spider.state.frontier_counts(spider.name)
+            logger.info('Resuming interrupted crawl: %d page(s) done, %d pending', done, pending)
+            self.stats.set_value('checkpoint/resumed_done', done)
+            for fingerprint, url, callback, priority in spider.state.pending_requests(spider.name):
+                yield Request(url, callback=getattr(spider, callback) if callback else None, priority=priority,
+                              meta={'checkpoint_fingerprint': fingerprint})
+            return
+        for request in start_requests:
+            self.add(request, spider)
+            yield request
+        spider.state.commit()  # the crawl can be resumed from now on
+
+    def process_spider_output(self, response, result, spider):
+        if not self.enabled(spider):
+            yield from result
+            return
+        for entry in result:
+            if isinstance(entry, Request) and not self.add(entry, spider):
+                self.stats.inc_value('checkpoint/known_requests')
+                continue  # done or pending in the frontier
+            yield entry
+        self.done(response, spider)
+
+    def process_spider_exception(self, response, exception, spider):
+        if self.enabled(spider):  # e.g. 404 page, it is not requested again
+            self.done(response, spider)
+
+    def add(self, request, spider):
+        """Function to save request to the frontier, returns False if it is already known and can be dropped"""
+        callback = request.callback
+        if callback is not None and getattr(callback, '__self__', None) is not spider:
+            return True  # not serializable, request is not checkpointed
+        fingerprint = request_fingerprint(request)
+        request.meta['checkpoint_fingerprint'] = fingerprint  # kept by redirected copies of request
+        added = spider.state.add_request(spider.name, fingerprint, request.url, callback and callback.__name__,
+                                         request.priority)
+        return added or request.dont_filter  # e.g. start requests
+
+    def done(self, response, spider):
+        fingerprint = response.meta.get('checkpoint_fingerprint')
+        if fingerprint is None:
+            return
+        spider.state.mark_done(spider.name, fingerprint)
+        self.stats.inc_value('checkpoint/done')
+        if time.monotonic() - self.last_commit >= self.interval:
+            spider.state.commit()  # items stored by the pipeline are committed too
+            self.stats.inc_value('checkpoint/commits')
+            self.last_commit = time.monotonic()
+
+    def spider_idle(self, spider):
+        """Function to clear the frontier when nothing is left to crawl (crawl is finished)"""
+        if self.enabled(spider):
+            spider.state.clear_frontier(spider.name)
+            spider.state.commit()
+
+
+class ShardMiddleware(object):
+    """Makes the spider one of workers of a sharded crawl (see gd_blog_spider.sharding), enabled by SHARD_QUEUE.
+    Found requests are pushed to the shared queue instead of the local scheduler, pending requests are leased
+    from it (up to SHARD_PREFETCH not finished ones) and acknowledged when their callback has finished.
+    Queue is synchronized every SHARD_SYNC_INTERVAL seconds, the spider is kept open until the queue is finished.
+    Requests are saved as url, callback name and priority: callbacks must be spider methods"""
+    def __init__(self, crawler, path, worker=0, prefetch=32, interval=0.05, lease=60.0):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.path = path
+        self.worker = worker
+        self.prefetch = prefetch
+        self.interval = interval
+        self.lease = lease
+        self.queue = None
+        self.task = None
+        self.spider = None
+        self.pushed = []  # (fingerprint, url, callback, priority) not sent to the queue yet
+        self.acks = []
+        self.failed = []
+        self.in_flight = 0  # leased requests not acknowledged yet
+        self.started = False  # all start requests are pushed
+        self.finished = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.get('SHARD_QUEUE'):
+            raise NotConfigured
+        middleware = cls(crawler, settings.get('SHARD_QUEUE'), settings.getint('SHARD_WORKER'),
+                         settings.getint('SHARD_PREFETCH', settings.getint('CONCURRENT_REQUESTS')),
+                         settings.getfloat('SHARD_SYNC_INTERVAL', 0.05), settings.getfloat('SHARD_LEASE', 60.0))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        self.queue = ShardQueue(self.path, self.lease)
+        self.task = task.LoopingCall(self.sync)
+        self.task.start(self.interval)
+        logger.info('Worker {} of sharded crawl, queue {}'.format(self.worker, self.path))
+
+    def spider_idle(self, spider):
+        """Function to keep the spider open while other workers may still find requests"""
+        if not self.finished:
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.queue.sync(self.worker, self.pushed, self.acks, self.failed)
+        self.queue.close()
+
+    def process_start_requests(self, start_requests, spider):
+        for request in start_requests:  # every worker pushes them, the queue keeps one of each
+            if not self.push(request, spider):
+                yield request
+        self.started = True
+
+    def process_spider_output(self, response, result, spider):
+        for entry in result:
+            if isinstance(entry, Request) and self.push(entry, spider):
+                continue
+            yield entry
+        self.ack(response.meta.get('shard_fingerprint'))
+
+    def process_spider_exception(self, response, exception, spider):
+        self.ack(response.meta.get('shard_fingerprint'))
+
+    def push(self, request, spider):
+        """Function to send request to the queue, returns False if it can't be saved and is crawled locally"""
+        callback = request.callback
+        if callback is not None and getattr(callback, '__self__', None) is not spider:
+            return False
+        self.pushed.append((request_fingerprint(request), request.url, callback and callback.__name__,
+                            request.priority))
+        self.stats.inc_value('shard/pushed')
+        return True
+
+    def ack(self, fingerprint, failed=False):
+        if fingerprint is None:  # request was not leased from the queue
+            return
+        (self.failed if failed else self.acks).append(fingerprint)
+        self.in_flight -= 1
+        self.stats.inc_value('shard/failed' if failed else 'shard/acked')
+
+    def download_failed(self, failure):
+        """Errback of leased requests: download errors are acknowledged as failed (they bypass spider
+        middlewares), error responses are acknowledged by process_spider_output as usual"""
+        if getattr(failure.value, 'response', None) is None:
+            logger.warning('Failed to download {}: {}'.format(failure.request.url, failure.value))
+            self.ack(failure.request.meta.get('shard_fingerprint'), failed=True)
+
+    def sync(self):
+        """Function to push found requests, acknowledge finished ones and lease new ones from the queue"""
+        spider = self.spider
+        leased = self.queue.sync(self.worker, self.pushed, self.acks, self.failed,
+                                 max(0, self.prefetch - self.in_flight))
+        self.pushed, self.acks, self.failed = [], [], []
+        for fingerprint, url, callback, priority in leased:
+            self.in_flight += 1
+            self.crawler.engine.crawl(Request(url, callback=getattr(spider, callback) if callback else None,
+                                              errback=self.download_failed, priority=priority, dont_filter=True,
+                                              meta={'shard_fingerprint': fingerprint}), spider)
+        self.stats.inc_value('shard/leased', len(leased))
+        if self.started and not leased and self.in_flight == 0 and self.queue.is_finished():
+            self.finished = True
+            if self.crawler.engine.spider_is_idle(spider):
+                self.crawler.engine.close_spider(spider, 'finished')
@@ -0,0 +1,76 @@
+"""Process pool for CPU-heavy page parsing, so extraction is not limited by the single reactor thread.
+
+ParsePool extension (PARSE_WORKERS > 0) starts worker processes when spider opens and sets spider.parse_pool.
+Callbacks send raw response body to the pool with an extraction function and get a Deferred firing with
+extracted values, items are built from them in the main process (same items as with in-thread parsing):
+    return self.parse_pool.submit(self.extract_articles, response).addCallback(self.article_items)
+The extraction function must be a module level function or a static method (it is pickled by name).
+"""
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
+
+from gd_blog_spider import profiling
+
+logger = logging.getLogger(__name__)
+
+
+def extract(function, url, body, encoding):
+    """Function to run extraction in a worker process, returns list of values yielded by function"""
+    return list(function(HtmlResponse(url=url, body=body, encoding=encoding)))
+
+
+class ParsePool(object):
+    """Scrapy extension running page extraction in a pool of worker processes"""
+    def __init__(self, workers, stats=None):
+        self.workers = workers
+        self.stats = stats
+        self.executor = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        workers = crawler.settings.getint('PARSE_WORKERS')
+        if workers <= 0:
+            raise NotConfigured
+        pool = cls(workers, crawler.stats)
+        crawler.signals.connect(pool.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(pool.spider_closed, signal=signals.spider_closed)
+        return pool
+
+    def spider_opened(self, spider):
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        '''spawned workers don't inherit reactor threads and sockets of the crawler process'''
+        spider.parse_pool = self
+        logger.info('Parsing pages in {} worker process(es)'.format(self.workers))
+
+    def spider_closed(self, spider):
+        spider.parse_pool = None
+        self.executor.shutdown(wait=True)
+
+    def submit(self, function, response):
+        """Function to extract values from response in a worker. Returns Deferred firing with list of values"""
+        deferred = defer.Deferred()
+        started = time.perf_counter()
+        future = self.executor.submit(extract, function, response.url, response.body, response.encoding)
+        future.add_done_callback(lambda done: reactor.callFromThread(self._fire, deferred, done, started))
+        return deferred
+
+    def _fire(self, deferred, future, started):
+        """Function to pass result of the worker to callbacks (runs in the reactor thread)"""
+        if profiling.active is not None:
+            profiling.active.add('stage', 'parse_pool', time.perf_counter() - started)
+        if self.stats is not None:
+            self.stats.inc_value('parse_pool/pages')
+        try:
+            result = future.result()
+        except Exception as e:  # raised in the worker, handled by Scrapy as an error of the callback
+            deferred.errback(Failure(e))
+        else:
+            deferred.callback(result)
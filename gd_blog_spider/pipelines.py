@@ -5,7 +5,206 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import csv
+import os
+import time
+
+from gd_blog_spider.items import ArticleItem, AuthorItem, clear_vocabularies
+from gd_blog_spider.loaders import link_paths
+from gd_blog_spider.profiling import stage
+from gd_blog_spider.query import update_index
+from gd_blog_spider.state import CrawlState
+
+ARTICLES_HEADER = ['title', 'url', 'text', 'publication_date', 'author', 'tag']
+AUTHORS_HEADER = ['full_name', 'job_title', 'linkedin', 'contact', 'articles_counter']
+# normalized layout: one row per article plus link tables (see gd_blog_spider.loaders)
+ARTICLES_NORMALIZED_HEADER = ['title', 'url', 'text', 'publication_date']
+ARTICLE_AUTHORS_HEADER = ['url', 'author']
+ARTICLE_TAGS_HEADER = ['url', 'tag']
+
+
+def article_rows(item):
+    """Function to expand article item into csv rows (one row per author and tag pair)"""
+    title, url, text, publication_date = item['title'], item['url'], item['text'], item['publication_date']
+    authors, tags = item['authors'], item['tags']
+    if len(tags) > len(authors):
+        return [[title, url, text, publication_date, author, tag] for tag in tags for author in authors]
+    return [[title, url, text, publication_date, author, tag] for author in authors for tag in tags]
+
+
+def normalized_rows(item):
+    """Function to split article item into (article row, author link rows, tag link rows)"""
+    url = item['url']
+    return ([item['title'], url, item['text'], item['publication_date']],
+            [[url, author] for author in item['authors']], [[url, tag] for tag in item['tags']])
+
+
+def read_header(path):
+    """Function to get header of existing csv file, None if file doesn't exist or is empty"""
+    if not os.path.isfile(path):
+        return None
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), None)
+
+
+def author_rows(item):
+    """Function to expand author item into csv rows (one row per contact)"""
+    head = [item['full_name'], item['job_title'], item['linkedin'] or '']
+    # if cell is empty default value is NaN. replacing NaN with empty symbol here
+    contacts = item['contacts'] or ['']
+    return [head + [contact, item['articles_counter']] for contact in contacts]
+
+
+class BufferedCsvWriter(object):
+    """Csv file kept open for the whole crawl, rows are written in batches"""
+    def __init__(self, path, header, buffer_size=500, flush_interval=5.0):
+        self.path = path
+        self.header = header
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.rows_written = 0
+        self.file = None
+        self.writer = None
+        self.last_flush = time.monotonic()
+
+    def open(self):
+        write_header = not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, mode='a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if write_header:  # to write column headers in csv only once
+            self.writer.writerow(self.header)
+
+    def add(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.buffer_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.file is None:
+            self.open()
+        with stage('csv_write'):
+            if self.buffer:
+                self.writer.writerows(self.buffer)
+                self.rows_written += len(self.buffer)
+                self.buffer = []
+            self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.buffer or self.file is not None:  # nothing was scraped -> don't create empty file
+            self.flush()
+            self.file.close()
+            self.file = None
+
 
 class GdBlogSpiderPipeline(object):
+    """Writes articles and authors to csv files through buffered writers and to the crawl state store.
+    The store is shared with the spider as spider.state.
+    layout - 'flat' (old format) or 'normalized' (articles.csv + article_authors.csv + article_tags.csv);
+    existing flat articles.csv is always appended in flat layout.
+    checkpoint - interrupted crawl of resumable spider is resumed (see CheckpointMiddleware): csv files are rebuilt
+    from the store first, they may be ahead or behind of the last commit.
+    query_index - path to the query index updated from the store on close (see gd_blog_spider.query)"""
+    def __init__(self, buffer_size=500, flush_interval=5.0, state_db=None, layout='flat', checkpoint=False,
+                 query_index=None):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.state_db = state_db
+        self.layout = layout
+        self.checkpoint = checkpoint
+        self.query_index = query_index
+        self.state = None
+        self.pending = 0  # items written to the store since last commit
+        self.updated = 0  # items of update_in_place spider, csv files are rewritten from the store on close
+        self.articles = None
+        self.article_authors = None
+        self.article_tags = None
+        self.authors = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(buffer_size=crawler.settings.getint('CSV_BUFFER_SIZE', 500),
+                   flush_interval=crawler.settings.getfloat('CSV_FLUSH_INTERVAL', 5.0),
+                   state_db=crawler.settings.get('STATE_DB'),
+                   layout=crawler.settings.get('OUTPUT_LAYOUT', 'flat'),
+                   checkpoint=crawler.settings.getbool('CHECKPOINT_ENABLED'),
+                   query_index=crawler.settings.get('QUERY_INDEX'))
+
+    def open_spider(self, spider):
+        if self.state_db:
+            self.state = CrawlState(self.state_db)
+            spider.state = self.state
+        articles_path = getattr(spider, 'output_articles', 'articles.csv')
+        if read_header(articles_path) == ARTICLES_HEADER:  # data of old versions, keep one format per file
+            self.layout = 'flat'
+        if self.layout == 'flat':
+            self.articles = BufferedCsvWriter(articles_path, ARTICLES_HEADER, self.buffer_size, self.flush_interval)
+        else:
+            authors_path, tags_path = link_paths(articles_path)
+            self.articles = BufferedCsvWriter(articles_path, ARTICLES_NORMALIZED_HEADER,
+                                              self.buffer_size, self.flush_interval)
+            self.article_authors = BufferedCsvWriter(authors_path, ARTICLE_AUTHORS_HEADER,
+                                                     self.buffer_size, self.flush_interval)
+            self.article_tags = BufferedCsvWriter(tags_path, ARTICLE_TAGS_HEADER, self.buffer_size, self.flush_interval)
+        self.authors = BufferedCsvWriter(getattr(spider, 'output_authors', 'authors.csv'), AUTHORS_HEADER,
+                                         self.buffer_size, self.flush_interval)
+        if (self.checkpoint and self.state is not None and getattr(spider, 'resumable', False)
+                and self.state.has_frontier(spider.name)):
+            spider.resumed = True
+            self.state.export_csv(self.articles.path, self.authors.path, self.layout)
+
+    def close_spider(self, spider):
+        if self.updated:
+            self.state.export_csv(self.articles.path, self.authors.path, self.layout)
+        self.articles.close()
+        if self.layout != 'flat':
+            self.article_authors.close()
+            self.article_tags.close()
+        self.authors.close()
+        if self.state is not None:
+            self.state.close()
+            if self.query_index:  # only articles saved by this crawl are indexed
+                with stage('query_index'):
+                    update_index(self.query_index, self.state_db)
+        clear_vocabularies()  # interned values are kept for one crawl
+
     def process_item(self, item, spider):
-        return item
\ No newline at end of file
+        with stage('pipeline'):
+            return self._process_item(item, spider)
+
+    def _process_item(self, item, spider):
+        if self.state is not None:
+            self.store_item(item)
+            if getattr(spider, 'update_in_place', False):  # changed records replace the old ones in csv files
+                self.updated += 1
+                return item
+        if isinstance(item, ArticleItem):
+            self.add_article(item)
+        elif isinstance(item, AuthorItem):
+            authors_index = getattr(spider, 'authors_index', None)
+            if authors_index is not None:  # spider rewrites authors file from its index on close
+                authors_index.add(item)
+            else:
+                self.authors.add(author_rows(item))
+        return item
+
+    def add_article(self, item):
+        if self.layout == 'flat':
+            self.articles.add(article_rows(item))
+            return
+        article, authors, tags = normalized_rows(item)
+        self.articles.add([article])
+        self.article_authors.add(authors)
+        self.article_tags.add(tags)
+
+    def store_item(self, item):
+        if isinstance(item, ArticleItem):
+            self.state.add_article(item)
+        elif isinstance(item, AuthorItem):
+            self.state.add_author(item)
+        self.pending += 1
+        if self.pending >= self.buffer_size:
+            with stage('state_commit'):
+                self.state.commit()
+            self.pending = 0
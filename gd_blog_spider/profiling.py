@@ -0,0 +1,117 @@
+"""Crawl profiling: wall and CPU time histograms of spider callbacks and of hot-path stages.
+
+Callbacks are timed by ProfilingSpiderMiddleware (see middlewares.py), stages are timed where they happen:
+    with stage('extract'):
+        ...
+When profiling is disabled stage() returns a shared no-op context manager, so instrumented code costs
+one function call. Results are saved to Scrapy stats under 'profile/' prefix and dumped to a JSON file.
+"""
+import bisect
+import json
+import time
+from contextlib import contextmanager
+
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)  # upper bounds
+
+
+class _NullStage(object):
+    """Context manager doing nothing, used when profiling is disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = _NullStage()
+active = None  # Profile of the running crawl, None when profiling is disabled
+
+
+class Histogram(object):
+    """Counts of values (milliseconds) per bucket of BUCKETS_MS, the last bucket is unbounded"""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        labels = ['<={}'.format(bound) for bound in BUCKETS_MS] + ['>{}'.format(BUCKETS_MS[-1])]
+        return {label: count for label, count in zip(labels, self.counts) if count}
+
+
+class Record(object):
+    """Timings and volumes of one callback or stage"""
+    def __init__(self):
+        self.calls = 0
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.bytes = 0
+        self.items = 0
+        self.requests = 0
+
+    def to_dict(self):
+        return {'calls': self.calls, 'wall_ms': round(self.wall.total, 3), 'cpu_ms': round(self.cpu.total, 3),
+                'max_wall_ms': round(self.wall.max, 3), 'bytes': self.bytes, 'items': self.items,
+                'requests': self.requests, 'wall_ms_histogram': self.wall.to_dict(),
+                'cpu_ms_histogram': self.cpu.to_dict()}
+
+
+class Profile(object):
+    """Records of callbacks and stages of one crawl"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.records = {'callback': {}, 'stage': {}}
+
+    def record(self, kind, name):
+        records = self.records[kind]
+        if name not in records:
+            records[name] = Record()
+        return records[name]
+
+    def add(self, kind, name, wall, cpu=None, nbytes=0, items=0, requests=0):
+        """Function to add one measurement, wall and cpu are in seconds"""
+        record = self.record(kind, name)
+        record.calls += 1
+        record.wall.add(wall * 1000)
+        if cpu is not None:
+            record.cpu.add(cpu * 1000)
+        record.bytes += nbytes
+        record.items += items
+        record.requests += requests
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add('stage', name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def to_dict(self):
+        return {kind: {name: record.to_dict() for name, record in sorted(records.items())}
+                for kind, records in self.records.items()}
+
+    def export_stats(self, stats):
+        """Function to save totals and histograms to Scrapy stats collector"""
+        for kind, records in self.to_dict().items():
+            for name, values in records.items():
+                for key, value in values.items():
+                    stats.set_value('profile/{}/{}/{}'.format(kind, name, key), value)
+
+    def dump(self, path, **extra):
+        """Function to write profile as JSON file"""
+        data = dict(extra, elapsed=round(time.perf_counter() - self.started, 3), **self.to_dict())
+        with open(path, mode='w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+
+def stage(name):
+    """Function to get context manager timing stage of the running crawl (no-op when profiling is disabled)"""
+    if active is None:
+        return NULL_STAGE
+    return active.stage(name)
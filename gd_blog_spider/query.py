@@ -0,0 +1,258 @@
+"""Indexed queries over crawled articles: articles of a tag or an author, articles published in a date range and
+articles with given words, newest first, without loading articles.csv.
+
+ArticleIndex is a SQLite database (QUERY_INDEX) with
+    docs - one row per article (title, url, publication date, authors, tags), indexed by publication date;
+    postings - inverted lists of tags, authors and terms of title and text, every list is clustered by
+        (kind, key, publication_date, doc), so newest articles of a key are read by one index range scan;
+    keys - number of articles of every key, queries of several keys scan the shortest list and check the others.
+The index is updated incrementally from the state store (STATE_DB): only articles saved since the last update
+(rows of its seen table after the watermark) are re-indexed. Pipeline updates it when a crawl is closed:
+    python3 -m gd_blog_spider.query --tag Cloud --since 2020-01-01 --limit 5
+"""
+import argparse
+import collections
+import os
+import re
+import sqlite3
+from datetime import date
+
+from gd_blog_spider.items import ArticleItem
+
+TAG, AUTHOR, TERM = 1, 2, 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS docs (
+    doc INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    publication_date TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    terms TEXT NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_publication_date ON docs (publication_date);
+CREATE TABLE IF NOT EXISTS postings (
+    kind INTEGER NOT NULL,
+    key TEXT NOT NULL COLLATE NOCASE,
+    publication_date TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    PRIMARY KEY (kind, key, publication_date, doc)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS keys (
+    kind INTEGER NOT NULL,
+    key TEXT NOT NULL COLLATE NOCASE,
+    documents INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+'''
+SEPARATOR = '\n'
+TERM_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 40  # longer "words" are urls, hashes, etc.
+BUFFERED_POSTINGS = 500000  # postings sorted and inserted at once while the index is updated
+
+
+def text_terms(text):
+    """Function to split text into distinct lowercase terms"""
+    return {term for term in TERM_RE.findall(text.lower()) if len(term) <= MAX_TERM_LENGTH}
+
+
+def iso_date(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+class ArticleIndex(object):
+    """Connection to the query index of articles"""
+    def __init__(self, path='articles_index.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.postings = collections.defaultdict(list)  # (kind, key) -> new [(publication_date, doc)]
+        self.buffered = 0
+        self.documents_delta = collections.Counter()  # (kind, key) -> change of number of articles
+
+    def close(self):
+        self.flush()
+        self.connection.commit()
+        self.connection.close()
+
+    def flush(self):
+        """Function to write buffered postings and numbers of articles of their keys"""
+        if self.postings:  # inserted in order of the primary key
+            self.connection.executemany('INSERT INTO postings (kind, key, publication_date, doc) VALUES (?, ?, ?, ?)',
+                                        ((kind, key, publication_date, doc) for kind, key in sorted(self.postings)
+                                         for publication_date, doc in sorted(self.postings[kind, key])))
+            for key, postings in self.postings.items():
+                self.documents_delta[key] += len(postings)
+            self.postings.clear()
+            self.buffered = 0
+        if self.documents_delta:
+            self.connection.executemany('INSERT INTO keys (kind, key, documents) VALUES (?, ?, ?) ON CONFLICT '
+                                        '(kind, key) DO UPDATE SET documents = documents + excluded.documents',
+                                        [(kind, key, delta) for (kind, key), delta in self.documents_delta.items()])
+            self.documents_delta.clear()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+
+    def add_article(self, article, fingerprint):
+        """Function to index new or changed article (ArticleItem or mapping with its fields), fingerprint - hash of its
+        values in the state store. Returns False if the article is indexed with the same values already"""
+        connection = self.connection
+        row = connection.execute('SELECT doc, publication_date, authors, tags, terms, fingerprint FROM docs '
+                                 'WHERE url = ?', (article['url'],)).fetchone()
+        if row is not None and row[5] == fingerprint:
+            return False
+        if row is not None:  # postings of old values are removed
+            self.flush()
+            doc, old_date = row[0], row[1]
+            self.index_keys(doc, old_date, row[2].split(SEPARATOR) if row[2] else [],
+                            row[3].split(SEPARATOR) if row[3] else [], row[4].split(), remove=True)
+        publication_date = iso_date(article['publication_date'])
+        terms = sorted(text_terms(article['title'] + ' ' + article['text']))
+        values = (article['title'], publication_date, SEPARATOR.join(article['authors']),
+                  SEPARATOR.join(article['tags']), ' '.join(terms), fingerprint, article['url'])
+        if row is None:
+            doc = connection.execute('INSERT INTO docs (title, publication_date, authors, tags, terms, fingerprint, '
+                                     'url) VALUES (?, ?, ?, ?, ?, ?, ?)', values).lastrowid
+        else:
+            connection.execute('UPDATE docs SET title = ?, publication_date = ?, authors = ?, tags = ?, terms = ?, '
+                               'fingerprint = ? WHERE url = ?', values)
+        self.index_keys(doc, publication_date, article['authors'], article['tags'], terms)
+        return True
+
+    def index_keys(self, doc, publication_date, authors, tags, terms, remove=False):
+        """Function to add (or remove) postings of article and update numbers of articles of its keys,
+        new postings are buffered until flush()"""
+        keys = {(TAG, tag.lower()) for tag in tags}  # keys are case insensitive
+        keys.update((AUTHOR, author.lower()) for author in authors)
+        keys.update((TERM, term) for term in terms)
+        if remove:
+            self.connection.executemany('DELETE FROM postings WHERE kind = ? AND key = ? AND publication_date = ? '
+                                        'AND doc = ?', [(kind, key, publication_date, doc) for kind, key in keys])
+            self.documents_delta.subtract(keys)
+            return
+        for key in keys:
+            self.postings[key].append((publication_date, doc))
+        self.buffered += len(keys)
+        if self.buffered >= BUFFERED_POSTINGS:
+            self.flush()
+
+    def update(self, state_db='crawl_state.db'):
+        """Function to index articles saved to the state store since the last update (the whole store if it was
+        recreated). Returns number of indexed articles"""
+        if not os.path.isfile(state_db):
+            return 0
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'seen_rowid'").fetchone()
+        last_rowid = row[0] if row is not None else 0
+        state = sqlite3.connect('file:{}?mode=ro'.format(state_db), uri=True)
+        try:
+            if (state.execute('SELECT MAX(rowid) FROM seen').fetchone()[0] or 0) < last_rowid:
+                self.clear()  # state store was recreated
+                last_rowid = 0
+            rows = state.execute('SELECT s.rowid, s.fingerprint, a.title, a.url, a.text, a.publication_date '
+                                 'FROM seen s JOIN articles a ON a.url = s.url WHERE s.rowid > ? ORDER BY s.rowid',
+                                 (last_rowid,)).fetchall()
+            if rows:  # rows of authors pages after the last article are read again next time, the join skips them
+                last_rowid = rows[-1][0]
+            indexed = 0
+            for _, fingerprint, title, url, text, publication_date in rows:
+                article = ArticleItem(title, url, text, publication_date, [name for (name,) in state.execute(
+                    'SELECT full_name FROM article_authors WHERE url = ? ORDER BY position', (url,))], [
+                    tag for (tag,) in state.execute('SELECT tag FROM article_tags WHERE url = ? ORDER BY position',
+                                                    (url,))])
+                indexed += self.add_article(article, fingerprint)
+        except sqlite3.OperationalError:  # store without seen table yet
+            return 0
+        finally:
+            state.close()
+        self.flush()
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seen_rowid', ?)", (last_rowid,))
+        self.connection.commit()
+        return indexed
+
+    def clear(self):
+        self.postings.clear()
+        self.buffered = 0
+        self.documents_delta.clear()
+        for table in ('docs', 'postings', 'keys', 'meta'):
+            self.connection.execute('DELETE FROM {}'.format(table))
+
+    def rebuild(self, state_db='crawl_state.db'):
+        """Function to build the index from scratch, returns number of indexed articles"""
+        self.clear()
+        return self.update(state_db)
+
+    def documents(self, kind, key):
+        """Function to get number of articles of the key (lowercase tag, author or term)"""
+        row = self.connection.execute('SELECT documents FROM keys WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        return 0 if row is None else row[0]
+
+    def find(self, tag=None, author=None, text=None, since=None, until=None, limit=10):
+        """Function to get articles (title, url, publication_date, authors, tags) with the tag, of the author,
+        with all words of the text and published between since and until (dates, inclusive), newest first.
+        Every condition is optional, limit=None returns all found articles"""
+        self.flush()
+        keys = [(kind, key.lower()) for kind, key in ((TAG, tag), (AUTHOR, author)) if key is not None]
+        keys += [(TERM, term) for term in sorted(text_terms(text or ''))]
+        counts = [self.documents(kind, key) for kind, key in keys]
+        if keys and min(counts) == 0:
+            return []
+        where, parameters = [], []
+        if keys:  # the shortest postings list is scanned, other keys are checked by primary key
+            keys = [key for _, key in sorted(zip(counts, keys))]
+            query = 'SELECT d.title, d.url, d.publication_date, d.authors, d.tags FROM postings p ' \
+                    'JOIN docs d ON d.doc = p.doc'
+            where.append('p.kind = ? AND p.key = ?')
+            parameters += keys[0]
+            for kind, key in keys[1:]:
+                where.append('EXISTS (SELECT 1 FROM postings WHERE kind = ? AND key = ? '
+                             'AND publication_date = p.publication_date AND doc = p.doc)')
+                parameters += [kind, key]
+        else:
+            query = 'SELECT p.title, p.url, p.publication_date, p.authors, p.tags FROM docs p'
+        if since is not None:
+            where.append('p.publication_date >= ?')
+            parameters.append(iso_date(since))
+        if until is not None:
+            where.append('p.publication_date <= ?')
+            parameters.append(iso_date(until))
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY p.publication_date DESC, p.doc DESC LIMIT ?'
+        parameters.append(-1 if limit is None else limit)
+        return [{'title': title, 'url': url, 'publication_date': publication_date,
+                 'authors': authors.split(SEPARATOR) if authors else [], 'tags': tags.split(SEPARATOR) if tags else []}
+                for title, url, publication_date, authors, tags in self.connection.execute(query, parameters)]
+
+
+def update_index(path='articles_index.db', state_db='crawl_state.db'):
+    """Function to update the query index from the state store, returns number of indexed articles"""
+    index = ArticleIndex(path)
+    indexed = index.update(state_db)
+    index.close()
+    return indexed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query articles by tag, author, words and publication dates')
+    parser.add_argument('--index', default='articles_index.db', help='path to the query index')
+    parser.add_argument('--db', default='crawl_state.db', help='path to the state database the index is built from')
+    parser.add_argument('--rebuild', action='store_true', help='build the index from scratch')
+    parser.add_argument('--tag')
+    parser.add_argument('--author')
+    parser.add_argument('--search', help='words of title or text')
+    parser.add_argument('--since', help='first publication date, YYYY-MM-DD')
+    parser.add_argument('--until', help='last publication date, YYYY-MM-DD')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    index = ArticleIndex(args.index)
+    indexed = index.rebuild(args.db) if args.rebuild else index.update(args.db)  # new articles are indexed first
+    if indexed:
+        print('{} article(s) indexed, {} in the index'.format(indexed, len(index)))
+    for article in index.find(args.tag, args.author, args.search, args.since, args.until, args.limit):
+        print('{}  {}  {}\n            {} | {}'.format(article['publication_date'], article['title'], article['url'],
+                                                       ', '.join(article['authors']), ', '.join(article['tags'])))
+    index.close()
@@ -0,0 +1,229 @@
+"""Report renderers: one ReportResult is rendered to every output format at once.
+
+The bar chart (the slowest part, matplotlib) is drawn in a separate process (in a thread on a host with one CPU)
+while text, json and html files are written by threads of this one. Every file is replaced atomically.
+The fingerprint of rendered data is kept next to the files (RENDER_CACHE), so the next run with the same data
+skips rendering if all outputs still exist.
+"""
+import hashlib
+import html
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+RENDERER_VERSION = 2  # is a part of the fingerprint: outputs of an older renderer are rendered again
+RENDER_CACHE = '.report_cache.json'
+OUTPUTS = {'png': ('top7tags.png',),
+           'txt': ('top5articles.txt', 'top5authors.txt'),
+           'json': ('report.json',),
+           'html': ('report.html',)}
+FORMATS = tuple(OUTPUTS)
+CONCURRENT = (os.cpu_count() or 1) > 1  # with a single CPU the chart is drawn by a thread of this process
+START_METHOD = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+'''forked worker starts without importing modules again, pyplot is not imported by the report process'''
+
+
+def get_pyplot(headless=False):
+    """Function to import pyplot, in headless mode with non-interactive backend (no window is shown)"""
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    return plt
+
+
+def draw_tags(axes, tags, counts):
+    """Function to draw bar chart of tags and their articles counters on matplotlib axes"""
+    x = range(len(tags))
+    rects = axes.bar(x, counts)
+    axes.set_xticks(x)
+    axes.set_xticklabels(counts, rotation='horizontal')
+    axes.set_yticks([])
+    axes.set_title('Tags')
+    axes.set_xlabel('Articles counter')
+    for rect, key in zip(rects, tags):  # text label above each bar, displaying its tag
+        axes.annotate('{}'.format(key),
+                      xy=(rect.get_x() + rect.get_width() / 2, rect.get_height()),
+                      xytext=(0, 3),  # 3 points vertical offset
+                      textcoords="offset points",
+                      ha='center', va='bottom')
+
+
+def plot_tags(tags, counts, headless=False):
+    """Function to render bar chart of tags and their articles counters with pyplot (e.g. to show it)"""
+    plt = get_pyplot(headless)
+    figure = plt.figure(figsize=(9, 5))
+    draw_tags(figure.add_subplot(1, 1, 1), tags, counts)
+    figure.tight_layout()
+    return plt
+
+
+def plot_top7_tags(top7_tags, headless=False):
+    """Function to render bar chart from Series: tag -> articles counter"""
+    return plot_tags(list(top7_tags.index), list(top7_tags.values), headless)
+
+
+def df_to_str(df):
+    df_for_file = df.to_string(index=False, na_rep='')  # dataframe as non-truncated string (for file)
+    df_for_console = '\n\n' + df.to_string(index=False, na_rep='', max_colwidth=20) + '\n'
+    '''dataframe as truncated string with newline characters for prettier console output'''
+    return df_for_console, df_for_file
+
+
+def json_value(value):
+    """Function to convert value of a dataframe cell to json: dates as 'YYYY-MM-DD', NaN and NaT as None"""
+    if hasattr(value, 'item') and not hasattr(value, 'strftime'):  # numpy scalar
+        value = value.item()
+    if value is None or value != value:  # NaN and NaT are not equal to themselves
+        return None
+    if hasattr(value, 'strftime'):  # Timestamp or date
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def frame_records(df):
+    return [{column: json_value(value) for column, value in zip(df.columns, row)}
+            for row in df.itertuples(index=False, name=None)]
+
+
+def report_payload(result):
+    """Function to get data of ReportResult as json-serializable dict, it's rendered by every format"""
+    return {'top7_tags': [{'tag': str(tag), 'articles': int(counter)} for tag, counter in result.top7_tags.items()],
+            'top5_articles': frame_records(result.top5_articles),
+            'top5_authors': frame_records(result.top5_authors)}
+
+
+def payload_fingerprint(payload):
+    data = json.dumps([RENDERER_VERSION, payload], sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def write_file(path, data, mode='w'):
+    """Function to replace file atomically: readers never see a partially written report"""
+    fd, tmp_path = tempfile.mkstemp(prefix='.report-', dir=os.path.dirname(path) or '.')
+    try:
+        if 'b' in mode:
+            with os.fdopen(fd, mode) as f:
+                f.write(data)
+        else:
+            with os.fdopen(fd, mode, newline='', encoding='utf-8') as f:
+                f.write(data)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files readable by owner only
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def render_png(tags, counts, path):
+    """Function to save bar chart of tags to png file. The chart is drawn on its own figure and Agg canvas,
+    pyplot and its backend are not used: the plot can still be shown in a window by this process, and
+    the function can run in a thread or in a worker process (arguments are plain lists)"""
+    import io
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=(9, 5))
+    FigureCanvasAgg(figure)
+    draw_tags(figure.add_subplot(1, 1, 1), tags, counts)
+    figure.tight_layout()
+    image = io.BytesIO()
+    figure.savefig(image, format='png', dpi=100)
+    write_file(path, image.getvalue(), mode='wb')
+
+
+def render_txt(result, articles_path, authors_path):
+    write_file(authors_path, df_to_str(result.top5_authors)[1])
+    write_file(articles_path, df_to_str(result.top5_articles)[1])
+
+
+def render_json(payload, path):
+    write_file(path, json.dumps(payload, indent=2, ensure_ascii=False) + '\n')
+
+
+def html_table(records):
+    if not records:
+        return '<p>No data</p>'
+    columns = list(records[0])
+    head = ''.join('<th>{}</th>'.format(html.escape(column)) for column in columns)
+    rows = '\n'.join('<tr>{}</tr>'.format(''.join('<td>{}</td>'.format(html.escape(str(record[column])))
+                                                  if record[column] is not None else '<td></td>'
+                                                  for column in columns)) for record in records)
+    return '<table>\n<tr>{}</tr>\n{}\n</table>'.format(head, rows)
+
+
+def render_html(payload, path):
+    """Function to save self-contained html report (styles and bar chart are inline, no other files needed)"""
+    largest = max([tag['articles'] for tag in payload['top7_tags']] or [1]) or 1
+    bars = '\n'.join('<div class="bar"><span class="label">{}</span><span class="fill" style="width: {:.1f}%">'
+                     '{}</span></div>'.format(html.escape(tag['tag']), 100 * tag['articles'] / largest, tag['articles'])
+                     for tag in payload['top7_tags'])
+    page = ('<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+            '<title>GridDynamics blog report</title>\n<style>\nbody {{font-family: sans-serif; margin: 2em}}\n'
+            'table {{border-collapse: collapse; margin-bottom: 2em}}\n'
+            'th, td {{border: 1px solid #ccc; padding: 4px 8px; text-align: left; vertical-align: top}}\n'
+            '.bar {{display: flex; align-items: center; margin: 4px 0}}\n'
+            '.label {{width: 16em}}\n'
+            '.fill {{background: #1f77b4; color: #fff; padding: 2px 6px; box-sizing: border-box}}\n'
+            '</style>\n</head>\n<body>\n'
+            '<h1>GridDynamics blog report</h1>\n'
+            '<h2>Top-7 Tags (based on articles counter)</h2>\n<div class="chart">\n{}\n</div>\n'
+            '<h2>Top-5 New Articles (based on publish data)</h2>\n{}\n'
+            '<h2>Top-5 Authors (based on articles counter)</h2>\n{}\n'
+            '</body>\n</html>\n').format(bars, html_table(payload['top5_articles']),
+                                         html_table(payload['top5_authors']))
+    write_file(path, page)
+
+
+def read_render_cache(directory):
+    try:
+        with open(os.path.join(directory, RENDER_CACHE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):  # no cache yet or it's damaged -> render again
+        return {}
+
+
+def render_all(result, directory='.', formats=FORMATS, force=False):
+    """Function to render ReportResult to files of all formats concurrently. Rendering is skipped when
+    the data is the same as of the last run and all files exist (unless force is True).
+    Returns paths of output files and True if they were rendered"""
+    paths = {name: os.path.join(directory, name) for fmt in formats for name in OUTPUTS[fmt]}
+    payload = report_payload(result)
+    fingerprint = payload_fingerprint(payload)
+    cache = read_render_cache(directory)
+    if not force and cache.get('fingerprint') == fingerprint and set(paths) <= set(cache.get('outputs', ())) \
+            and all(os.path.isfile(path) for path in paths.values()):
+        logger.info('Report data has not changed since the last run, files are up to date')
+        return list(paths.values()), False
+
+    chart = ([str(tag) for tag in result.top7_tags.index], [int(counter) for counter in result.top7_tags.values],
+             paths.get('top7tags.png'))
+    processes = None
+    with ThreadPoolExecutor(len(OUTPUTS)) as threads:  # writes of files and pandas formatting release the GIL
+        futures = []
+        if 'png' in formats and CONCURRENT:
+            processes = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context(START_METHOD))
+            futures.append(processes.submit(render_png, *chart))
+        elif 'png' in formats:
+            futures.append(threads.submit(render_png, *chart))
+        if 'txt' in formats:
+            futures.append(threads.submit(render_txt, result, paths['top5articles.txt'], paths['top5authors.txt']))
+        if 'json' in formats:
+            futures.append(threads.submit(render_json, payload, paths['report.json']))
+        if 'html' in formats:
+            futures.append(threads.submit(render_html, payload, paths['report.html']))
+        try:
+            for future in futures:
+                future.result()  # raises exception of the renderer
+        finally:
+            if processes is not None:
+                processes.shutdown(wait=True)
+    outputs = sorted(set(paths) | set(cache.get('outputs', ())) if cache.get('fingerprint') == fingerprint
+                     else paths)  # outputs of other formats are up to date if data has not changed
+    write_file(os.path.join(directory, RENDER_CACHE),
+               json.dumps({'fingerprint': fingerprint, 'outputs': outputs}, indent=2) + '\n')
+    return list(paths.values()), True
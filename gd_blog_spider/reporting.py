@@ -0,0 +1,71 @@
+"""Report engine: every dataset is loaded once and all aggregates are computed with vectorized pandas operations"""
+from gd_blog_spider.loaders import (ARTICLES_COLUMNS, ARTICLES_DTYPES, AUTHORS_DTYPES, is_normalized, load_articles,
+                                    load_authors, load_normalized_articles)
+
+
+class ReportResult(object):
+    """All data needed by the report renderers"""
+    def __init__(self, top7_tags, top5_articles, top5_authors):
+        self.top7_tags = top7_tags  # Series: tag -> number of distinct articles
+        self.top5_articles = top5_articles  # DataFrame in articles.csv format, newest first
+        self.top5_authors = top5_authors  # DataFrame in authors.csv format, biggest articles counter first
+
+
+def get_top_tags(articles, n=7):
+    """Function to get n tags with the biggest number of distinct articles, tags of the same number in name order"""
+    counts = articles.groupby('tag', observed=True)['title'].nunique()
+    counts.index = counts.index.astype(object)  # categorical groups may come in order of appearance
+    return counts.sort_index().nlargest(n)
+
+
+def get_top_articles(articles, n=5):
+    """Function to get n most recent articles (one row per article), articles of the same date keep file order"""
+    return articles.drop_duplicates('url').sort_values('publication_date', ascending=False, kind='mergesort').head(n)
+
+
+def get_top_authors(authors, n=5):
+    """Function to get n authors with the biggest articles counter, one row per author: the row with its biggest
+    counter (authors of the same counter keep file order)"""
+    return authors.sort_values('articles_counter', ascending=False, kind='mergesort') \
+        .drop_duplicates('full_name').head(n)
+
+
+def build_report(articles, authors):
+    """Function to compute all report aggregates from already loaded datasets"""
+    return ReportResult(top7_tags=get_top_tags(articles),
+                        top5_articles=get_top_articles(articles),
+                        top5_authors=get_top_authors(authors))
+
+
+def build_normalized_report(articles, article_authors, article_tags, authors):
+    """Function to compute all report aggregates from normalized tables without rebuilding flat rows"""
+    titles = article_tags.merge(articles[['url', 'title']], on='url')
+    top5_articles = articles.sort_values('publication_date', ascending=False, kind='mergesort').head(5)
+    top5_articles = top5_articles.merge(article_authors.drop_duplicates('url'), on='url', how='left').merge(
+        article_tags.drop_duplicates('url'), on='url', how='left')  # first author and tag, as in flat rows
+    return ReportResult(top7_tags=get_top_tags(titles),
+                        top5_articles=top5_articles[ARTICLES_COLUMNS],
+                        top5_authors=get_top_authors(authors))
+
+
+def load_report(articles_path='articles.csv', authors_path='authors.csv', cache=False):
+    """Function to load each csv file once (see gd_blog_spider.loaders) and compute the report"""
+    if is_normalized(articles_path):
+        return build_normalized_report(*load_normalized_articles(articles_path),
+                                       load_authors(authors_path, cache=cache))
+    return build_report(load_articles(articles_path, cache=cache), load_authors(authors_path, cache=cache))
+
+
+def state_report(state):
+    """Function to read report aggregates maintained by the crawl state store (see gd_blog_spider.state),
+    no csv file is read. Frames have the same dtypes as loaded ones, empty values are NaN as in loaded csv"""
+    import pandas as pd
+    tags = state.top_tags(7)
+    top7_tags = pd.Series([articles for _, articles in tags], index=pd.Index([tag for tag, _ in tags], name='tag'),
+                          name='title', dtype='int64')
+    top5_articles = pd.DataFrame(state.newest_articles(5), columns=ARTICLES_COLUMNS).replace('', float('nan'))
+    top5_articles['publication_date'] = pd.to_datetime(top5_articles['publication_date'])
+    top5_authors = pd.DataFrame(state.top_authors(5), columns=list(AUTHORS_DTYPES)).replace('', float('nan'))
+    return ReportResult(top7_tags=top7_tags,
+                        top5_articles=top5_articles.astype(ARTICLES_DTYPES),
+                        top5_authors=top5_authors.astype(AUTHORS_DTYPES))
@@ -21,7 +21,7 @@ NEWSPIDER_MODULE = 'gd_blog_spider.spiders'
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-# CONCURRENT_REQUESTS = 32
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -45,27 +45,84 @@ ROBOTSTXT_OBEY = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    'gd_blog_spider.middlewares.GdBlogSpiderSpiderMiddleware': 543,
-# }
+SPIDER_MIDDLEWARES = {
+   'gd_blog_spider.middlewares.ShardMiddleware': 90,
+   'gd_blog_spider.middlewares.CheckpointMiddleware': 100,
+   'gd_blog_spider.middlewares.ProfilingSpiderMiddleware': 950,
+}
+
+# Crash-safe crawls of resumable spiders (blog_scraper): frontier of requests is kept in STATE_DB and committed
+# with scraped items at least every CHECKPOINT_INTERVAL seconds, interrupted crawl is resumed by the next run
+CHECKPOINT_ENABLED = True
+CHECKPOINT_INTERVAL = 1.0
+
+# Worker of sharded crawl (set by python3 -m gd_blog_spider.sharding): requests are shared with other workers
+# through SQLite queue SHARD_QUEUE, leased in batches of up to SHARD_PREFETCH, lease expires after SHARD_LEASE seconds
+SHARD_QUEUE = None
+SHARD_WORKER = 0
+SHARD_SYNC_INTERVAL = 0.05
+SHARD_LEASE = 60.0
+
+# Wall/CPU time histograms of callbacks and stages in crawl stats and JSON file (see ProfilingSpiderMiddleware)
+# e.g. scrapy crawl blog_scraper -s PROFILING_ENABLED=1
+PROFILING_ENABLED = False
+PROFILING_OUTPUT = '%(name)s_profile.json'
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    'gd_blog_spider.middlewares.GdBlogSpiderDownloaderMiddleware': 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+   'gd_blog_spider.middlewares.ArchiveMiddleware': 100,
+   'gd_blog_spider.middlewares.ConditionalRequestMiddleware': 580,
+   'gd_blog_spider.middlewares.AdaptiveConcurrencyMiddleware': 950,
+}
+
+# Adjust concurrent requests per domain by response latency and error rate (see AdaptiveConcurrencyMiddleware)
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_MIN = 1
+ADAPTIVE_CONCURRENCY_MAX = 32  # must not exceed CONCURRENT_REQUESTS
+ADAPTIVE_CONCURRENCY_TARGET_LATENCY = 1.0  # seconds
+ADAPTIVE_CONCURRENCY_WINDOW = 10  # responses between decisions
+ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE = 0.1
+
+# Raw html pages are kept in compressed content-addressed archive for offline re-parse (see gd_blog_spider.archive)
+ARCHIVE_ENABLED = True
+ARCHIVE_DIR = 'archive'
+
+# Send If-None-Match / If-Modified-Since saved in STATE_DB (only for spiders handling 304, e.g. blog_update)
+CONDITIONAL_REQUESTS_ENABLED = True
+
+# Requests dedup by scalable Bloom filter confirmed by exact store on disk (see gd_blog_spider.dupefilter),
+# spiders with skip_known_pages = True (blog_check) also drop pages already saved to STATE_DB
+DUPEFILTER_CLASS = 'gd_blog_spider.dupefilter.BloomDupeFilter'
+DUPEFILTER_DB = 'dupefilter_%(name)s.db'
+DUPEFILTER_CAPACITY = 10000  # requests of the first filter, next ones are twice bigger
+DUPEFILTER_ERROR_RATE = 0.001
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    'scrapy.extensions.telnet.TelnetConsole': None,
-# }
+EXTENSIONS = {
+   'gd_blog_spider.parse_pool.ParsePool': 500,
+}
+
+# Worker processes parsing article and author pages of blog_scraper (see ParsePool), 0 - parse in the reactor thread
+PARSE_WORKERS = 0
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#    'gd_blog_spider.pipelines.GdBlogSpiderPipeline': 300,
-# }
+ITEM_PIPELINES = {
+   'gd_blog_spider.pipelines.GdBlogSpiderPipeline': 300,
+}
+# Rows are kept in memory and written to csv when buffer is full or flush interval (seconds) elapsed
+CSV_BUFFER_SIZE = 500
+CSV_FLUSH_INTERVAL = 5.0
+# 'normalized' - articles.csv keyed by url + article_authors.csv + article_tags.csv, 'flat' - row per author/tag pair
+OUTPUT_LAYOUT = 'normalized'
+# SQLite database with state of all crawls (watermark, seen urls, authors counters); csv files are kept as export.
+# None disables it: report.py then builds the report from items collected during the crawl and csv files
+STATE_DB = 'crawl_state.db'
+# Index of articles by tag, author, words and publication date (see gd_blog_spider.query), updated from STATE_DB
+# when a crawl is closed; None - not maintained
+QUERY_INDEX = 'articles_index.db'
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -0,0 +1,211 @@
+"""Sharded crawl: N worker processes of one spider pull requests from a shared SQLite frontier (ShardQueue).
+
+Every request found by a worker is pushed to the queue once (by fingerprint), workers lease pending requests
+in batches and acknowledge them when their callback has finished (see ShardMiddleware), so every url is
+fetched by exactly one worker. Lease of a worker that died expires after SHARD_LEASE seconds and its requests
+are leased again by other workers. Every worker writes csv files, the state store and the page archive into its own
+directory, they are merged into STATE_DB, csv files and ARCHIVE_DIR of the project in a deterministic order:
+    python3 -m gd_blog_spider.sharding --workers 4
+"""
+import argparse
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+
+PENDING, LEASED, DONE, FAILED = 0, 1, 2, 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS requests (
+    seq INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    callback TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status INTEGER NOT NULL DEFAULT 0,
+    worker INTEGER,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS requests_status ON requests (status, priority, seq);
+'''
+
+
+class ShardQueue(object):
+    """Frontier shared by worker processes, every write is a short immediate transaction"""
+    def __init__(self, path, lease=60.0):
+        self.path = path
+        self.lease = lease
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)  # transactions are explicit
+        self.connection.execute('PRAGMA journal_mode = WAL')  # workers read while one of them writes
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def sync(self, worker, requests=(), acks=(), failed=(), limit=0):
+        """Function to push found requests (fingerprint, url, callback, priority), acknowledge finished ones
+        and lease up to limit pending requests (or requests of expired leases) in one transaction.
+        Returns leased (fingerprint, url, callback, priority)"""
+        now = time.time()
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR IGNORE INTO requests (fingerprint, url, callback, priority) '
+                                   'VALUES (?, ?, ?, ?)', requests)
+            connection.executemany('UPDATE requests SET status = {} WHERE fingerprint = ?'.format(DONE),
+                                   [(fingerprint,) for fingerprint in acks])
+            connection.executemany('UPDATE requests SET status = {} WHERE fingerprint = ?'.format(FAILED),
+                                   [(fingerprint,) for fingerprint in failed])
+            leased = []
+            if limit > 0:
+                leased = connection.execute(
+                    'SELECT seq, fingerprint, url, callback, priority FROM requests WHERE status = {} OR '
+                    '(status = {} AND lease_until < ?) ORDER BY priority DESC, seq LIMIT ?'.format(PENDING, LEASED),
+                    (now, limit)).fetchall()
+                connection.executemany('UPDATE requests SET status = {}, worker = ?, lease_until = ? '
+                                       'WHERE seq = ?'.format(LEASED),
+                                       [(worker, now + self.lease, row[0]) for row in leased])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return [row[1:] for row in leased]
+
+    def counts(self):
+        """Function to get numbers of requests by status: {PENDING: n, LEASED: n, DONE: n, FAILED: n}"""
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        counts.update(self.connection.execute('SELECT status, COUNT(*) FROM requests GROUP BY status'))
+        return counts
+
+    def is_finished(self):
+        """Function to check if nothing is left to crawl: no pending requests and no leased ones"""
+        return self.connection.execute('SELECT 1 FROM requests WHERE status IN ({}, {}) LIMIT 1'.format(
+            PENDING, LEASED)).fetchone() is None
+
+
+WORKER_ARCHIVE = 'archive'  # ARCHIVE_DIR of every worker inside its directory
+
+
+def worker_dirs(directory, workers):
+    return [os.path.join(directory, 'worker-{}'.format(i)) for i in range(workers)]
+
+
+def start_workers(spider, directory, workers, spider_args=(), settings=()):
+    """Function to start worker processes (scrapy crawl) inside their directories (log goes to worker.log),
+    returns list of Popen"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, SCRAPY_SETTINGS_MODULE=os.environ.get('SCRAPY_SETTINGS_MODULE', 'gd_blog_spider.settings'),
+               PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    queue_path = os.path.abspath(os.path.join(directory, 'queue.db'))
+    processes = []
+    for i, worker_dir in enumerate(worker_dirs(directory, workers)):
+        os.makedirs(worker_dir)
+        command = [sys.executable, '-m', 'scrapy', 'crawl', spider, '--nolog',
+                   '-s', 'SHARD_QUEUE=' + queue_path, '-s', 'SHARD_WORKER={}'.format(i),
+                   '-s', 'CHECKPOINT_ENABLED=0',  # the shared queue is the frontier of the crawl
+                   '-s', 'QUERY_INDEX=']  # the index is updated from the merged store
+        for argument in spider_args:
+            command += ['-a', argument]
+        for setting in settings:
+            command += ['-s', setting]
+        command += ['-s', 'ARCHIVE_DIR=' + WORKER_ARCHIVE]  # archives of workers are merged after the crawl
+        with open(os.path.join(worker_dir, 'worker.log'), 'wb') as log:
+            processes.append(subprocess.Popen(command, cwd=worker_dir, env=env, stdout=subprocess.DEVNULL,
+                                              stderr=log))
+    return processes
+
+
+def merge(directories, state_db='crawl_state.db', articles_path='articles.csv', authors_path='authors.csv',
+          layout='flat'):
+    """Function to merge state stores of workers into state_db (articles by url, authors by full name)
+    and write csv files from it. Returns numbers of merged articles and authors"""
+    from gd_blog_spider.state import CrawlState
+
+    articles, authors = {}, {}
+    for directory in directories:
+        path = os.path.join(directory, 'crawl_state.db')
+        if not os.path.isfile(path):  # worker found nothing to crawl
+            continue
+        worker_state = CrawlState(path)
+        articles.update(worker_state.read_articles())
+        authors.update(worker_state.read_authors())
+        worker_state.close()
+    state = CrawlState(state_db)
+    for url in sorted(articles):
+        state.add_article(articles[url])
+    for full_name in sorted(authors):
+        state.add_author(authors[full_name])
+    state.commit()
+    state.export_csv(articles_path, authors_path, layout)
+    state.close()
+    return len(articles), len(authors)
+
+
+def merge_archives(directories, archive_dir='archive'):
+    """Function to merge page archives of workers into archive_dir. Returns numbers of merged fetches and
+    of contents new for archive_dir"""
+    from gd_blog_spider.archive import PageArchive
+
+    archive = None
+    fetches = blobs = 0
+    for directory in directories:
+        path = os.path.join(directory, WORKER_ARCHIVE)
+        if not os.path.isfile(os.path.join(path, 'index.db')):  # archive is disabled or worker fetched nothing
+            continue
+        archive = archive or PageArchive(archive_dir)
+        merged = archive.merge(path)
+        fetches += merged[0]
+        blobs += merged[1]
+    if archive is not None:
+        archive.close()
+    return fetches, blobs
+
+
+def crawl(spider='blog_scraper', workers=2, directory='shards', spider_args=(), settings=()):
+    """Function to run sharded crawl and merge its results. Returns queue counts by status"""
+    from scrapy.utils.project import get_project_settings
+    from gd_blog_spider.query import update_index
+
+    if os.path.isdir(directory):  # every sharded crawl starts from scratch
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    processes = start_workers(spider, directory, workers, spider_args, settings)
+    codes = [process.wait() for process in processes]
+    if any(codes):
+        logging.error('Worker(s) failed with exit codes {}'.format(codes))
+    queue = ShardQueue(os.path.join(directory, 'queue.db'))
+    counts = queue.counts()
+    queue.close()
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'gd_blog_spider.settings')  # settings of the workers
+    project = get_project_settings()
+    project.update(dict(setting.split('=', 1) for setting in settings), priority='cmdline')  # as workers got
+    state_db = project.get('STATE_DB') or 'crawl_state.db'
+    articles_len, authors_len = merge(worker_dirs(directory, workers), state_db,
+                                      layout=project.get('OUTPUT_LAYOUT', 'flat'))
+    if project.get('QUERY_INDEX'):
+        update_index(project.get('QUERY_INDEX'), state_db)
+    logging.info('{} article(s) and {} author(s) merged from {} worker(s)'.format(articles_len, authors_len, workers))
+    if project.getbool('ARCHIVE_ENABLED'):  # the shards directory is removed by the next sharded crawl
+        fetches, blobs = merge_archives(worker_dirs(directory, workers), project.get('ARCHIVE_DIR', 'archive'))
+        logging.info('{} archived fetch(es) with {} new page content(s) merged into {}'.format(
+            fetches, blobs, project.get('ARCHIVE_DIR', 'archive')))
+    return counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Crawl with several worker processes sharing one request queue')
+    parser.add_argument('--spider', default='blog_scraper')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dir', default='shards', help='directory of the queue and of worker outputs')
+    parser.add_argument('-a', dest='spider_args', action='append', default=[], help='spider argument NAME=VALUE')
+    parser.add_argument('-s', dest='settings', action='append', default=[], help='scrapy setting NAME=VALUE')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    counts = crawl(args.spider, args.workers, args.dir, args.spider_args, args.settings)
+    logging.info('{} request(s) done, {} failed, {} left in {:.2f}s'.format(
+        counts[DONE], counts[FAILED], counts[PENDING] + counts[LEASED], time.perf_counter() - start))
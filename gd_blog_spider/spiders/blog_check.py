@@ -1,10 +1,14 @@
 import logging
-import csv
 from datetime import datetime
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
+from scrapy import signals
 from scrapy.spiders import CrawlSpider
-import pandas as pd
 
+from gd_blog_spider.author_index import AuthorIndex
+from gd_blog_spider.extractors import ARTICLE, AUTHOR, EXPLORE, split_social
+from gd_blog_spider.items import ArticleItem, AuthorItem
+from gd_blog_spider.loaders import load_articles
+from gd_blog_spider.profiling import stage
 from gd_blog_spider.spiders.blog_parse import GDBlogCrawler
 
 logging.basicConfig(level=logging.INFO,
@@ -13,143 +17,158 @@ logging.basicConfig(level=logging.INFO,
 
 class BlogCheckSpider(CrawlSpider):
     """This spider is used when some data already exists"""
-    def __init__(self, *a, **kw):
+    def __init__(self, base_url=None, *a, **kw):
         super().__init__(*a, **kw)
         logging.getLogger('scrapy').propagate = False  # disable default scrapy logger
+        if base_url is not None:  # e.g. -a base_url=http://127.0.0.1:8000 for local mock blog
+            self.start_urls = [base_url.rstrip('/') + '/explore/']
+            self.allowed_domains = [urlparse(base_url).hostname]
+        self.authors_index = AuthorIndex(self.output_authors)  # filled when spider is opened
+        self.state = None  # CrawlState, set by GdBlogSpiderPipeline when STATE_DB is configured
+        self.last_date = None  # (str, date) of the most recent known blog-post, read on the first explore page
+        self.known_urls = None  # urls of blog-posts of last_date read from csv file (without the state store)
+        self.explore_pages = 0
 
     name = 'blog_check'
     allowed_domains = ['blog.griddynamics.com']
     start_urls = ['http://blog.griddynamics.com/explore/']
+    output_articles = GDBlogCrawler.output_articles  # files are written by GdBlogSpiderPipeline
+    output_authors = GDBlogCrawler.output_authors
     blog_posts_dates = []
     new_articles_len = 0  # for console output of parsing process, e.g. 'parsing [1/2] articles'
     new_article_counter = 1  # same as above
     new_authors_len = 0  # same as above
     new_author_counter = 1  # same as above
+    skip_known_pages = True  # pages saved by previous crawls are dropped by the dupefilter (see BloomDupeFilter)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        return spider
+
+    def spider_opened(self, spider):
+        """Function to load existing authors once per crawl"""
+        self.authors_index.load()
+        logging.info('{} known author(s) loaded from {}'.format(len(self.authors_index), self.output_authors))
+        if self.state is not None and not self.state.has_articles():  # first run after csv-only versions
+            articles_len, authors_len = self.state.import_csv(self.output_articles, self.output_authors)
+            logging.info('{} article(s) and {} author(s) imported to state store'.format(articles_len, authors_len))
+
+    def get_last_publication_date(self):
+        """Function to get last publication date from state store (indexed lookup) or from csv file"""
+        if self.state is not None:
+            last_date = self.state.last_publication_date()
+            if last_date is not None:
+                return last_date
+        return self.get_last_publication_date_from_csv(self.output_articles)
 
     def get_last_publication_date_from_csv(self, csv_path=None):
         """Function to get last publication date from provided csv file"""
         if csv_path is None:
-            data_articles = pd.read_csv('articles.csv')
-        else:
-            data_articles = pd.read_csv(csv_path)
-        last_article_date_csv_as_str = data_articles.sort_values(
-            'publication_date', ascending=False).head(1).iloc[0][3]  # e.g. 2020-02-28;
-        '''iloc[m][n]: m - number of row, n - number of column'''
-        last_article_date_csv = datetime.strptime(last_article_date_csv_as_str, '%Y-%m-%d').date()  # str to datetime
-        return last_article_date_csv_as_str, last_article_date_csv
+            csv_path = 'articles.csv'
+        last_article_date = load_articles(csv_path, columns=['publication_date'])['publication_date'].max()
+        return last_article_date.strftime('%Y-%m-%d'), last_article_date.date()  # e.g. 2020-02-28
+
+    def is_known(self, url, publication_date):
+        """Function to check if blog-post published on the date of the most recent known one was saved before.
+        Without the state store urls of that date are read from csv file once"""
+        if self.state is not None:
+            return self.state.is_seen(url)
+        if self.known_urls is None:
+            articles = load_articles(self.output_articles, columns=['url', 'publication_date'])
+            self.known_urls = set(articles.loc[articles['publication_date'].dt.date == publication_date, 'url'])
+        return url in self.known_urls
 
     def parse(self, response):
-        """Function to get new blog-posts"""
-        last_article_date_csv_as_str, last_article_date_csv = self.get_last_publication_date_from_csv()
-        logging.info('Most recent blog-post date is {}'.format(last_article_date_csv_as_str))
-        logging.info('Looking for a new blog-posts . . .')
-        article_info = response.css('div.cntt')
+        """Function to get new blog-posts. Explore pages are followed (newest first) until a page with a blog-post
+        older than the last known one is found, so number of requests depends on number of new blog-posts.
+        All cards of a fetched page are checked (a pinned or out-of-order older post may precede newer ones).
+        Blog-posts of the last known date are checked one by one: some of them may be published after the last run"""
+        if self.last_date is None:  # first explore page
+            with stage('watermark'):
+                self.last_date = self.get_last_publication_date()
+            logging.info('Most recent blog-post date is {}'.format(self.last_date[0]))
+            logging.info('Looking for a new blog-posts . . .')
+        last_article_date_csv_as_str, last_article_date_csv = self.last_date
+        with stage('extract'):
+            page, cards = EXPLORE.extract_page(response)
+        self.explore_pages += 1
         new_articles_urls = []
-        for element in article_info:
+        known_reached = False
+        for element in cards:
             try:  # we are looking for date
-                date_str = element.css('div.viewauthor > div.authwrp > span::text').get()
                 current_article_date = \
-                    datetime.strptime(date_str, '%b %d, %Y').date()  # trying to convert value to datetime
-                if current_article_date > last_article_date_csv:
-                    new_articles_urls.append(element.css('h4 > a::attr(href)').get())
-            except ValueError:  # value is not convertable to datetime -> drop it
-                pass
-
-        logging.info('There is {counter} blog-posts were published since {last_date}'
-                     .format(counter=len(new_articles_urls), last_date=last_article_date_csv_as_str))
-        if len(new_articles_urls) is 0:
-            self.close(self, reason='There is no new blog-posts')
-        self.new_articles_len = len(new_articles_urls)
+                    datetime.strptime(element['publication_date'], '%b %d, %Y').date()  # trying to convert to datetime
+            except (TypeError, ValueError):  # value is not convertable to datetime -> drop it
+                continue
+            if current_article_date < last_article_date_csv:  # older pages are known, the rest of this one is checked
+                known_reached = True
+                continue
+            article_url = element['url']
+            if current_article_date == last_article_date_csv:  # published on the same day as the last known one
+                if not self.is_known(response.urljoin(article_url), current_article_date):
+                    new_articles_urls.append(article_url)
+            elif self.state is None or not self.state.is_seen(response.urljoin(article_url)):
+                new_articles_urls.append(article_url)
+
+        self.new_articles_len += len(new_articles_urls)
         for article_url in new_articles_urls:
             yield response.follow(article_url, self.parse_article)  # parsing each new article
+        if not known_reached and cards and page['next_page']:
+            yield response.follow(page['next_page'], self.parse)  # all blog-posts of the page are new
+            return
+        logging.info('There is {counter} blog-posts were published since {last_date} ({pages} explore page(s) checked)'
+                     .format(counter=self.new_articles_len, last_date=last_article_date_csv_as_str,
+                             pages=self.explore_pages))
+        if self.new_articles_len == 0:
+            logging.info('There is no new blog-posts')
 
     def parse_author(self, response):
-        """Function to parse new author page and extract data to .csv file"""
+        """Function to parse new author page and pass author to the item pipeline"""
         logging.info('Parsing author page [{current}/{all}] -> {url}'.format(current=self.new_author_counter,
                                                                              all=self.new_authors_len,
                                                                              url=response.url))
         self.new_author_counter += 1
-        author_info = response.css('div#wrap > div#author > div#authorbox')
-        for field in author_info:
-            full_name = field.css('div.nomobile > div.right > h1::text').get()
-            job_title = field.css('div.nomobile > div.right > h2::text').get()
-            articles_counter = len(field.css('did.postlist > a::text').getall())
-            all_urls = field.css('div.mobile > div.right > div.authorsocial > a::attr(href)').getall()
-            linkedin = []
-            contacts = []
-            for url in all_urls:
-                if 'linkedin' in url:
-                    linkedin = url
-                else:
-                    contacts.append(url)
-            with open(GDBlogCrawler.output_authors, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                if len(contacts) is not 0:
-                    for contact in contacts:
-                        if len(linkedin) is 0:
-                            writer.writerow([full_name, job_title, '', contact, articles_counter])
-                            # if cell is empty default value is NaN. replacing NaN with empty symbol here and below
-                        else:
-                            writer.writerow([full_name, job_title, linkedin, contact, articles_counter])
-                else:
-                    if len(linkedin) is 0:
-                        writer.writerow([full_name, job_title, '', '', articles_counter])
-                    else:
-                        writer.writerow([full_name, job_title, linkedin, '', articles_counter])
+        with stage('extract'):
+            authors = AUTHOR.extract(response)
+        for author in authors:
+            linkedin, contacts = split_social(author['social_urls'])
+            yield AuthorItem(full_name=author['full_name'], job_title=author['job_title'], linkedin=linkedin,
+                             contacts=contacts, articles_counter=author['articles_counter'], url=response.url)
 
     def parse_article(self, response):
-        """Function to parse new article page and extract data to .csv file"""
+        """Function to parse new article page, pass it to the item pipeline and update authors index"""
         logging.info('Parsing article page [{current}/{all}] -> {url}'.format(current=self.new_article_counter,
                                                                               all=self.new_articles_len,
                                                                               url=response.url))
         self.new_article_counter += 1
-        search_results = response.css('body > div#wrap')
-        for article in search_results:
-            title = str(article.css('div#postcontent > h1::text').get()).replace('\r', '').replace('\n', ' ')
-            url = response.url
-            text_raw_with_tags = article.css('div#postcontent > div#mypost').getall()
-            text = ''
-            for row in text_raw_with_tags:
-                soup_raw = BeautifulSoup(row, features='lxml')
-                text += soup_raw.get_text().strip()  # getting rid of html tags
-                if len(text) > 160:  # according to task text must be truncated to 160 symbols
-                    text = text[:161].replace('\r', '').replace('\n', ' ')
-            publication_date_as_str = article.css('div#postcontent > div.no-mobile > '
-                                                  'div.posttag.right.nomobile > span::text').get()
-            publication_date = datetime.strptime(publication_date_as_str, '%b %d, %Y').date()
-            authors = article.css('div#postcontent > div.no-mobile > '
-                                  'div.postauthor.left > span > a.goauthor > span::text').getall()
-            tags = response.css('ul#mainmenu > li.current > a::text').getall()
-            author_url = article.css('div#postcontent > div.no-mobile > '
-                                     'div.postauthor.left > span > a::attr(href)').getall()
-            authors_with_urls = dict(zip(authors, author_url))
-            with open(GDBlogCrawler.output_articles, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                if len(tags) > len(authors_with_urls.keys()):
-                    for tag in tags:
-                        for author in authors_with_urls.keys():
-                            writer.writerow([title, url, text, publication_date, author, tag])
-                else:
-                    for author in authors_with_urls.keys():
-                        for tag in tags:
-                            writer.writerow([title, url, text, publication_date, author, tag])
-
-            with open(GDBlogCrawler.output_authors, 'r') as f:
-                reader = csv.reader(f)
-                authors_csv = list(reader)
-
-            with open(GDBlogCrawler.output_authors, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                looking_for = list(authors_with_urls.keys())
-                author_index = 0
-                for author in authors_csv:
-                    for target_author in looking_for:
-                        if author[0] == target_author:
-                            del authors_with_urls[target_author]
-                            author[4] = int(author[4]) + 1  # author[4] - 'articles_counter' field in csv
-                        author_index += 1
-                if len(looking_for) is not 0:  # new author(s) is present
-                    self.new_authors_len = len(looking_for)
-                    for new_author_url in authors_with_urls.values():
-                        yield response.follow(new_author_url, self.parse_author)
-                writer.writerows(authors_csv)
+        with stage('extract'):
+            articles = ARTICLE.extract(response)  # all fields of the page in one pass
+        for article in articles:
+            title = str(article['title']).replace('\r', '').replace('\n', ' ')
+            with stage('parse_date'):
+                publication_date = datetime.strptime(article['publication_date'], '%b %d, %Y').date()
+            authors_with_urls = dict(zip(article['authors'], article['authors_urls']))
+            yield ArticleItem(title=title, url=response.url, text=article['text'], publication_date=publication_date,
+                              authors=list(authors_with_urls.keys()), tags=article['tags'])
+
+            new_authors_urls = [href for author, href in authors_with_urls.items()
+                                if not self.count_new_article(author)]
+            if len(new_authors_urls) != 0:  # new author(s) is present
+                self.new_authors_len += len(new_authors_urls)
+                for new_author_url in new_authors_urls:
+                    yield response.follow(new_author_url, self.parse_author)
+
+    def count_new_article(self, full_name):
+        """Function to increase articles counter of author, returns False for unknown author"""
+        if self.state is not None:
+            self.state.increment_author(full_name)
+        return self.authors_index.increment(full_name)
+
+    def closed(self, reason):
+        """Function to save updated authors index once spider is finished"""
+        if self.authors_index.loaded:  # never overwrite authors file with an index that wasn't loaded
+            self.authors_index.save()
+        logging.info('Spider closed. {authors_len} Author(s) saved to {authors_file}.'
+                     .format(authors_len=len(self.authors_index), authors_file=self.output_authors))
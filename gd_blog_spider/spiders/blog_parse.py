@@ -1,127 +1,116 @@
-import csv
 import logging
 from datetime import datetime
+from urllib.parse import urlparse
 from scrapy.spiders import CrawlSpider
-from bs4 import BeautifulSoup
+
+from gd_blog_spider.extractors import ALL_AUTHORS, ARTICLE, AUTHOR, split_social
+from gd_blog_spider.items import ArticleItem, AuthorItem
+from gd_blog_spider.profiling import stage
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s:%(levelname)s:%(message)s', )
 
-file_handler = logging.FileHandler('gd_blog_parser.log')
-logging.getLogger().addHandler(file_handler)
-formatter = logging.Formatter('%(asctime)s:%(levelname)s:%(message)s')
-file_handler.setFormatter(formatter)
+if not any(isinstance(handler, logging.FileHandler) for handler in logging.getLogger().handlers):
+    '''report.py runs spiders in its own process and already logs into file'''
+    file_handler = logging.FileHandler('gd_blog_parser.log')
+    logging.getLogger().addHandler(file_handler)
+    formatter = logging.Formatter('%(asctime)s:%(levelname)s:%(message)s')
+    file_handler.setFormatter(formatter)
 
 
 class GDBlogCrawler(CrawlSpider):
     """This spider is used when no data exists"""
-    def __init__(self, *a, **kw):
+    def __init__(self, base_url=None, *a, **kw):
         super().__init__(*a, **kw)
         logging.getLogger('scrapy').setLevel(logging.WARNING)
+        if base_url is not None:  # e.g. -a base_url=http://127.0.0.1:8000 for local mock blog
+            self.start_urls = [base_url.rstrip('/') + '/all-authors/']
+            self.allowed_domains = [urlparse(base_url).hostname]
 
     name = 'blog_scraper'
     allowed_domains = ['blog.griddynamics.com']
     start_urls = [
         'https://blog.griddynamics.com/all-authors/'
     ]
-    output_articles = 'articles.csv'
+    output_articles = 'articles.csv'  # files are written by GdBlogSpiderPipeline
     output_authors = 'authors.csv'
-    first_row_articles = True  # to write column headers in csv only once
-    first_row_authors = True  # same as above
     author_counter = 1  # for console output of parsing process, e.g. 'parsing [1/2] articles'
     authors_len = None  # same as above
     articles_len = 0  # same as above
+    parse_pool = None  # ParsePool, set when PARSE_WORKERS > 0
+    resumable = True  # interrupted crawl is resumed by the next run (see CheckpointMiddleware)
+    resumed = False  # set by GdBlogSpiderPipeline
 
     def parse_author(self, response):
-        """Function to parse each author and extract data to .csv file"""
+        """Function to parse each author page and pass author to the item pipeline"""
         logging.info('Parsing author page [{current}/{all}] -> {url}'.format(current=self.author_counter,
                                                                              all=self.authors_len,
                                                                              url=response.url))
         self.author_counter += 1
-        author_info = response.css('div#wrap > div#author > div#authorbox')
-        for field in author_info:
-            full_name = field.css('div.nomobile > div.right > h1::text').get()
-            job_title = field.css('div.nomobile > div.right > h2::text').get()
-            articles_counter = len(field.css('did.postlist > a::text').getall())
-            all_urls = field.css('div.mobile > div.right > div.authorsocial > a::attr(href)').getall()
-            linkedin = []
-            contacts = []
-            for url in all_urls:
-                if 'linkedin' in url:
-                    linkedin = url
-                else:
-                    contacts.append(url)
-            with open(self.output_authors, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                if self.first_row_authors:
-                    writer.writerow(['full_name', 'job_title', 'linkedin', 'contact', 'articles_counter'])
-                    self.first_row_authors = False
-                if len(contacts) is not 0:
-                    for contact in contacts:
-                        if len(linkedin) is 0:
-                            writer.writerow([full_name, job_title, '', contact, articles_counter])
-                            # if cell is empty default value is NaN. replacing NaN with empty symbol here and below
-                        else:
-                            writer.writerow([full_name, job_title, linkedin, contact, articles_counter])
-                else:
-                    if len(linkedin) is 0:
-                        writer.writerow([full_name, job_title, '', '', articles_counter])
-                    else:
-                        writer.writerow([full_name, job_title, linkedin, '', articles_counter])
+        if self.parse_pool is not None:  # extraction runs in a worker process (see ParsePool)
+            return self.parse_pool.submit(GDBlogCrawler.extract_authors, response).addCallback(
+                self.author_results, response)
+        return self.author_results(self.extract_authors(response), response)
+
+    @staticmethod
+    def extract_authors(response):
+        """Function to iterate over (full_name, job_title, linkedin, contacts, articles_counter, articles_urls)
+        of authors on the page"""
+        with stage('extract'):
+            authors = AUTHOR.extract(response)
+        for author in authors:
+            linkedin, contacts = split_social(author['social_urls'])
+            yield (author['full_name'], author['job_title'], linkedin, contacts, author['articles_counter'],
+                   author['articles_urls'])
+
+    def author_results(self, authors, response):
+        """Function to iterate over author items and requests to their articles"""
+        for full_name, job_title, linkedin, contacts, articles_counter, articles_urls in authors:
+            yield AuthorItem(full_name=full_name, job_title=job_title, linkedin=linkedin,
+                             contacts=contacts, articles_counter=articles_counter, url=response.url)
 
-            author_articles = response.css('div#author > div#authorbox > did.postlist > a::attr(href)').getall()
-            for article_url in author_articles:
+            for article_url in articles_urls:
                 yield response.follow(article_url, self.parse_article)  # parsing each article
 
     def parse_article(self, response, write_to_csv=True):
-        """Function to parse each article and extract data to .csv file"""
+        """Function to parse each article and pass it to the item pipeline.
+        With write_to_csv=False the article record is returned instead (equal to the tuple of extracted values)"""
         self.articles_len += 1
         logging.info('Parsing article page -> {url}'.format(url=response.url))
-        search_results = response.css('body > div#wrap')
-        for article in search_results:
-            title = str(article.css('div#postcontent > h1::text').get()).replace('\r', '').replace('\n', ' ')
-            url = response.url
-            text_raw_with_tags = article.css('div#postcontent > div#mypost').getall()
-            text = ''
-            for row in text_raw_with_tags:
-                soup_raw = BeautifulSoup(row, features='lxml')
-                text += soup_raw.get_text().strip()  # getting rid of html tags
-                if len(text) > 160:
-                    text = text[:161].replace('\r', '').replace('\n', ' ')
-            publication_date_as_str = article.css('div#postcontent > div.no-mobile > '
-                                                  'div.posttag.right.nomobile > span::text').get()
-            publication_date = datetime.strptime(publication_date_as_str, '%b %d, %Y').date()
-            authors = article.css('div#postcontent > div.no-mobile > '
-                                  'div.postauthor.left > span > a.goauthor > span::text').getall()
-            tags = response.css('ul#mainmenu > li.current > a::text').getall()
-            if write_to_csv:
-                with open(self.output_articles, mode='a', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    if self.first_row_articles:
-                        writer.writerow(['title', 'url', 'text', 'publication_date', 'author', 'tag'])
-                        self.first_row_articles = False
-                    if len(tags) > len(authors):
-                        for tag in tags:
-                            for author in authors:
-                                writer.writerow([title, url, text, publication_date, author, tag])
-                    else:
-                        for author in authors:
-                            for tag in tags:
-                                writer.writerow([title, url, text, publication_date, author, tag])
-            else:
-                return title, url, text, publication_date, authors, tags
+        if write_to_csv and self.parse_pool is not None:
+            return self.parse_pool.submit(GDBlogCrawler.extract_articles, response).addCallback(self.article_items)
+        articles = self.extract_articles(response)
+        if not write_to_csv:
+            return next(self.article_items(articles), None)
+        return self.article_items(articles)  # parsed lazily by Scrapy
+
+    @staticmethod
+    def article_items(articles):
+        """Function to iterate over article items built from extracted values"""
+        for title, url, text, publication_date, authors, tags in articles:
+            yield ArticleItem(title=title, url=url, text=text, publication_date=publication_date,
+                              authors=authors, tags=tags)
+
+    @staticmethod
+    def extract_articles(response):
+        """Function to iterate over (title, url, text, publication_date, authors, tags) of articles on the page"""
+        with stage('extract'):
+            articles = ARTICLE.extract(response)  # all fields of the page in one pass
+        for article in articles:
+            title = str(article['title']).replace('\r', '').replace('\n', ' ')
+            with stage('parse_date'):
+                publication_date = datetime.strptime(article['publication_date'], '%b %d, %Y').date()
+            yield title, response.url, article['text'], publication_date, article['authors'], article['tags']
 
     def parse(self, response):
         """Function to parse /all-authors/ page and get url to each author page"""
         logging.info('Getting urls to authors pages -> {url}'.format(url=response.url))
-        authors_list = response.css('div#wrap > div.blog.list.authorslist > div.inner > '
-                                    'div.row > div.left > div.single')
+        authors_list = ALL_AUTHORS.extract(response)
         logging.info('Urls collected. Starting iteration process . . .')
         counter = 0
         for author in authors_list:
-            author_url = author.css('a.authormore::attr(href)').get()
             counter += 1
-            yield response.follow(author_url, self.parse_author)
+            yield response.follow(author['url'], self.parse_author)
         lost_authors = ('/author/ezra/',
                         '/author/anton/',
                         '/author/pavel-vasilyev/')
@@ -0,0 +1,114 @@
+import logging
+from datetime import datetime
+from urllib.parse import urlparse
+from scrapy.spiders import SitemapSpider
+
+from gd_blog_spider.extractors import ARTICLE, AUTHOR, split_social
+from gd_blog_spider.items import ArticleItem, AuthorItem
+from gd_blog_spider.profiling import stage
+from gd_blog_spider.spiders.blog_parse import GDBlogCrawler
+from gd_blog_spider.state import fingerprint
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s:%(levelname)s:%(message)s', )
+
+
+class BlogUpdateSpider(SitemapSpider):
+    """This spider re-crawls only changed pages when data already exists. Urls are taken from the sitemap and
+    fetched only if their lastmod is newer than the version in the state store, requests carry saved
+    ETag / Last-Modified validators (see ConditionalRequestMiddleware). Changed articles and authors are
+    updated in place"""
+    def __init__(self, base_url=None, *a, **kw):
+        super().__init__(*a, **kw)
+        logging.getLogger('scrapy').setLevel(logging.WARNING)
+        if base_url is not None:  # e.g. -a base_url=http://127.0.0.1:8000 for local mock blog
+            self.sitemap_urls = [base_url.rstrip('/') + '/sitemap.xml']
+            self.allowed_domains = [urlparse(base_url).hostname]
+        self.state = None  # CrawlState, set by GdBlogSpiderPipeline when STATE_DB is configured
+        self.lastmods = {}  # url -> sitemap lastmod of urls scheduled for fetching
+        self.counters = dict.fromkeys(('sitemap_urls', 'skipped', 'not_modified', 'unchanged', 'updated', 'new'), 0)
+
+    name = 'blog_update'
+    allowed_domains = ['blog.griddynamics.com']
+    sitemap_urls = ['https://blog.griddynamics.com/sitemap.xml']
+    sitemap_follow = ['sitemap-posts', 'sitemap-authors']  # tags and static pages are not parsed
+    sitemap_rules = [('/author/', 'parse_author'), ('', 'parse_article')]
+    handle_httpstatus_list = [304]
+    conditional_requests = True  # see ConditionalRequestMiddleware
+    update_in_place = True  # GdBlogSpiderPipeline writes items to the store and rewrites csv files from it
+    output_articles = GDBlogCrawler.output_articles
+    output_authors = GDBlogCrawler.output_authors
+
+    def start_requests(self):
+        if self.state is None:
+            logging.error('{} needs the crawl state store, set STATE_DB in settings'.format(self.name))
+            return
+        yield from super().start_requests()
+
+    def sitemap_filter(self, entries):
+        """Function to keep only sitemap urls changed since they were fetched last time"""
+        for entry in entries:
+            if entries.type == 'sitemapindex':  # nested sitemaps are always read
+                yield entry
+                continue
+            self.counters['sitemap_urls'] += 1
+            url, lastmod = entry['loc'], entry.get('lastmod')
+            if self.state.is_changed(url, lastmod):
+                self.lastmods[url] = lastmod
+                yield entry
+            else:
+                self.counters['skipped'] += 1
+
+    def remember(self, response):
+        """Function to save sitemap lastmod of fetched page (http validators are saved by the middleware)"""
+        self.state.set_validators(response.url, lastmod=self.lastmods.pop(response.url, None))
+
+    def changed(self, item, url, values):
+        """Function to yield item only if extracted values differ from the stored ones"""
+        stored = self.state.get_fingerprint(url)
+        if stored == fingerprint(values):
+            self.counters['unchanged'] += 1
+            return
+        self.counters['new' if stored is None else 'updated'] += 1
+        logging.info('{} -> {}'.format('New page' if stored is None else 'Updated page', url))
+        yield item
+
+    def parse_article(self, response):
+        """Function to re-parse changed article page"""
+        self.remember(response)
+        if response.status == 304:  # not modified since the last crawl
+            self.counters['not_modified'] += 1
+            return
+        with stage('extract'):
+            articles = ARTICLE.extract(response)
+        for article in articles:
+            title = str(article['title']).replace('\r', '').replace('\n', ' ')
+            with stage('parse_date'):
+                publication_date = datetime.strptime(article['publication_date'], '%b %d, %Y').date()
+            item = ArticleItem(title=title, url=response.url, text=article['text'], publication_date=publication_date,
+                               authors=article['authors'], tags=article['tags'])
+            yield from self.changed(item, response.url, [title, article['text'], publication_date.isoformat(),
+                                                         article['authors'], article['tags']])
+
+    def parse_author(self, response):
+        """Function to re-parse changed author page (profile and articles counter)"""
+        self.remember(response)
+        if response.status == 304:
+            self.counters['not_modified'] += 1
+            return
+        with stage('extract'):
+            authors = AUTHOR.extract(response)
+        for author in authors:
+            linkedin, contacts = split_social(author['social_urls'])
+            item = AuthorItem(full_name=author['full_name'], job_title=author['job_title'], linkedin=linkedin,
+                              contacts=contacts, articles_counter=author['articles_counter'], url=response.url)
+            yield from self.changed(item, response.url, [author['full_name'], author['job_title'], linkedin,
+                                                         contacts, author['articles_counter']])
+
+    def closed(self, reason):
+        """Function to log and save to crawl stats what was re-crawled"""
+        for key, value in self.counters.items():
+            self.crawler.stats.set_value('blog_update/{}'.format(key), value)
+        logging.info('Spider closed. {sitemap_urls} url(s) in sitemap, {skipped} skipped by lastmod, '
+                     '{not_modified} not modified, {unchanged} unchanged, {updated} updated, {new} new.'
+                     .format(**self.counters))
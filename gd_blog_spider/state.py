@@ -0,0 +1,439 @@
+"""Embedded SQLite store with the state of all crawls (articles, authors, tags and fetched urls)
+and the frontier of interrupted crawls (requests to resume from, see CheckpointMiddleware).
+
+Report aggregates are maintained as items are stored, so the report costs O(changes) instead of O(history):
+number of distinct article titles per tag is updated by add_article, newest articles and top authors are read by
+indexes on publication_date and articles_counter (see top_tags, newest_articles and top_authors).
+
+Csv files are still written by the pipeline and can be rebuilt from the store with
+    python3 -m gd_blog_spider.state --export
+"""
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+import uuid
+from datetime import date, datetime, timezone
+
+from gd_blog_spider.items import AUTHORS, TAGS, ArticleItem, AuthorItem
+from gd_blog_spider.loaders import is_normalized, link_paths
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL,
+    publication_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_publication_date ON articles (publication_date);
+CREATE TABLE IF NOT EXISTS article_authors (
+    url TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (url, full_name)
+);
+CREATE INDEX IF NOT EXISTS article_authors_full_name ON article_authors (full_name);
+CREATE TABLE IF NOT EXISTS article_tags (
+    url TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (url, tag)
+);
+CREATE INDEX IF NOT EXISTS article_tags_tag ON article_tags (tag);
+CREATE TABLE IF NOT EXISTS tag_titles (
+    tag TEXT NOT NULL,
+    title TEXT NOT NULL,
+    articles INTEGER NOT NULL,
+    PRIMARY KEY (tag, title)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag TEXT PRIMARY KEY,
+    articles INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS authors (
+    full_name TEXT PRIMARY KEY,
+    job_title TEXT,
+    linkedin TEXT NOT NULL DEFAULT '',
+    contacts TEXT NOT NULL DEFAULT '',
+    articles_counter INTEGER NOT NULL DEFAULT 0,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS authors_articles_counter ON authors (articles_counter);
+CREATE TABLE IF NOT EXISTS seen (
+    url TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    fetched_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS validators (
+    url TEXT PRIMARY KEY,
+    lastmod TEXT,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS frontier (
+    spider TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    url TEXT NOT NULL,
+    callback TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (spider, fingerprint)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+CONTACTS_SEPARATOR = '\n'
+
+
+def fingerprint(values):
+    """Function to get stable hash of extracted values (lists and dates are supported)"""
+    digest = hashlib.sha1()
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            value = CONTACTS_SEPARATOR.join(value)
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def parse_lastmod(value):
+    """Function to parse W3C datetime of sitemap lastmod (e.g. 2020-03-03 or 2020-03-03T10:00:00Z) as aware datetime"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+class CrawlState(object):
+    """Connection to the state database. All writes are committed by commit() or close()"""
+    def __init__(self, path='crawl_state.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (str(uuid.uuid4()),))
+        self.connection.commit()  # identity of the store: files of other stores (e.g. DUPEFILTER_DB) are bound to it
+        if ((self.connection.execute('SELECT 1 FROM tag_counts LIMIT 1').fetchone() is None
+             or self.connection.execute('SELECT 1 FROM tag_titles LIMIT 1').fetchone() is None)
+                and self.connection.execute('SELECT 1 FROM article_tags LIMIT 1').fetchone() is not None):
+            self.rebuild_aggregates()  # store of the version without aggregates (or with urls counted per tag)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def commit(self):
+        self.connection.commit()
+
+    def has_articles(self):
+        return self.connection.execute('SELECT 1 FROM articles LIMIT 1').fetchone() is not None
+
+    def last_publication_date(self):
+        """Function to get most recent publication date (watermark) as str and as date, None if store is empty"""
+        row = self.connection.execute('SELECT MAX(publication_date) FROM articles').fetchone()
+        if row[0] is None:
+            return None
+        return row[0], datetime.strptime(row[0], '%Y-%m-%d').date()
+
+    def is_seen(self, url):
+        return self.connection.execute('SELECT 1 FROM seen WHERE url = ?', (url,)).fetchone() is not None
+
+    def get_fingerprint(self, url):
+        row = self.connection.execute('SELECT fingerprint FROM seen WHERE url = ?', (url,)).fetchone()
+        return None if row is None else row[0]
+
+    def mark_seen(self, url, values):
+        """Function to remember fetched url with fingerprint of values extracted from it"""
+        self.connection.execute('INSERT OR REPLACE INTO seen (url, fingerprint, fetched_at) VALUES (?, ?, ?)',
+                                (url, fingerprint(values), datetime.now(timezone.utc).isoformat()))
+
+    def get_validators(self, url):
+        """Function to get (sitemap lastmod, ETag, Last-Modified) saved for url, None if url has no validators"""
+        return self.connection.execute('SELECT lastmod, etag, last_modified FROM validators WHERE url = ?',
+                                       (url,)).fetchone()
+
+    def set_validators(self, url, lastmod=None, etag=None, last_modified=None):
+        """Function to save validators of fetched url, missing values are kept from the previous fetch"""
+        old = self.get_validators(url) or (None, None, None)
+        self.connection.execute('INSERT OR REPLACE INTO validators (url, lastmod, etag, last_modified) '
+                                'VALUES (?, ?, ?, ?)',
+                                (url, lastmod or old[0], etag or old[1], last_modified or old[2]))
+
+    def is_changed(self, url, lastmod):
+        """Function to check if sitemap lastmod of url is newer than the version in the store.
+        Urls without lastmod or never fetched are always treated as changed"""
+        if not lastmod:
+            return True
+        validators = self.get_validators(url)
+        if validators is not None and validators[0]:
+            return parse_lastmod(lastmod) > parse_lastmod(validators[0])
+        row = self.connection.execute('SELECT fetched_at FROM seen WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return True
+        return parse_lastmod(lastmod) > parse_lastmod(row[0])  # page was crawled before without sitemap
+
+    def has_frontier(self, spider):
+        """Function to check if crawl of spider was interrupted (its frontier is cleared when crawl finishes)"""
+        return self.connection.execute('SELECT 1 FROM frontier WHERE spider = ? LIMIT 1',
+                                       (spider,)).fetchone() is not None
+
+    def add_request(self, spider, request_fingerprint, url, callback=None, priority=0):
+        """Function to add request to the frontier, returns False if request is already known (done or pending)"""
+        return self.connection.execute('INSERT OR IGNORE INTO frontier (spider, fingerprint, url, callback, priority) '
+                                       'VALUES (?, ?, ?, ?, ?)',
+                                       (spider, request_fingerprint, url, callback, priority)).rowcount > 0
+
+    def mark_done(self, spider, request_fingerprint):
+        self.connection.execute('UPDATE frontier SET done = 1 WHERE spider = ? AND fingerprint = ?',
+                                (spider, request_fingerprint))
+
+    def pending_requests(self, spider):
+        """Function to get (fingerprint, url, callback, priority) of requests not done yet, in order of discovery"""
+        return self.connection.execute('SELECT fingerprint, url, callback, priority FROM frontier '
+                                       'WHERE spider = ? AND done = 0 ORDER BY rowid', (spider,)).fetchall()
+
+    def frontier_counts(self, spider):
+        """Function to get numbers of done and pending requests of the frontier"""
+        return self.connection.execute('SELECT COALESCE(SUM(done), 0), COUNT(*) - COALESCE(SUM(done), 0) '
+                                       'FROM frontier WHERE spider = ?', (spider,)).fetchone()
+
+    def clear_frontier(self, spider):
+        self.connection.execute('DELETE FROM frontier WHERE spider = ?', (spider,))
+
+    def has_author(self, full_name):
+        return self.connection.execute('SELECT 1 FROM authors WHERE full_name = ?',
+                                       (full_name,)).fetchone() is not None
+
+    def increment_author(self, full_name):
+        """Function to increase articles counter of known author, returns False for unknown author"""
+        cursor = self.connection.execute('UPDATE authors SET articles_counter = articles_counter + 1 '
+                                         'WHERE full_name = ?', (full_name,))
+        return cursor.rowcount > 0
+
+    def add_article(self, article):
+        """Function to insert or update article (mapping with ArticleItem fields)"""
+        publication_date = article['publication_date']
+        if isinstance(publication_date, date):
+            publication_date = publication_date.isoformat()
+        url = article['url']
+        values = (article['title'], article['text'], publication_date, url)
+        '''updated in place, so order of articles in exported csv is kept'''
+        old_title, old_tags = None, set()
+        row = self.connection.execute('SELECT title FROM articles WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            self.connection.execute('INSERT INTO articles (title, text, publication_date, url) VALUES (?, ?, ?, ?)',
+                                    values)
+        else:
+            self.connection.execute('UPDATE articles SET title = ?, text = ?, publication_date = ? WHERE url = ?',
+                                    values)
+            old_title = row[0]
+            old_tags = {row[0] for row in self.connection.execute('SELECT tag FROM article_tags WHERE url = ?',
+                                                                  (url,))}
+        self.connection.execute('DELETE FROM article_authors WHERE url = ?', (url,))
+        self.connection.executemany('INSERT OR IGNORE INTO article_authors (url, full_name, position) '
+                                    'VALUES (?, ?, ?)',
+                                    [(url, author, i) for i, author in enumerate(article['authors'])])
+        self.connection.execute('DELETE FROM article_tags WHERE url = ?', (url,))
+        self.connection.executemany('INSERT OR IGNORE INTO article_tags (url, tag, position) VALUES (?, ?, ?)',
+                                    [(url, tag, i) for i, tag in enumerate(article['tags'])])
+        old_pairs = {(tag, old_title) for tag in old_tags}
+        new_pairs = {(tag, article['title']) for tag in article['tags']}
+        self.count_tags(new_pairs - old_pairs, old_pairs - new_pairs)
+        self.mark_seen(url, [article['title'], article['text'], publication_date,
+                             article['authors'], article['tags']])
+
+    def count_tags(self, added, removed):
+        """Function to update numbers of distinct titles of tags (articles are counted by title, as the report
+        of csv files does) when (tag, title) pairs are added to or removed from an article"""
+        for tag, title in added:
+            articles = self.connection.execute('SELECT articles FROM tag_titles WHERE tag = ? AND title = ?',
+                                               (tag, title)).fetchone()
+            if articles is None:  # new title of the tag
+                self.connection.execute('INSERT INTO tag_titles (tag, title, articles) VALUES (?, ?, 1)',
+                                        (tag, title))
+                self.connection.execute('INSERT INTO tag_counts (tag, articles) VALUES (?, 1) '
+                                        'ON CONFLICT (tag) DO UPDATE SET articles = articles + 1', (tag,))
+            else:
+                self.connection.execute('UPDATE tag_titles SET articles = articles + 1 WHERE tag = ? AND title = ?',
+                                        (tag, title))
+        for tag, title in removed:
+            articles = self.connection.execute('SELECT articles FROM tag_titles WHERE tag = ? AND title = ?',
+                                               (tag, title)).fetchone()
+            if articles is not None and articles[0] > 1:
+                self.connection.execute('UPDATE tag_titles SET articles = articles - 1 WHERE tag = ? AND title = ?',
+                                        (tag, title))
+            elif articles is not None:  # the last article of the title
+                self.connection.execute('DELETE FROM tag_titles WHERE tag = ? AND title = ?', (tag, title))
+                self.connection.execute('UPDATE tag_counts SET articles = articles - 1 WHERE tag = ?', (tag,))
+
+    def rebuild_aggregates(self):
+        """Function to recompute report aggregates from scratch"""
+        self.connection.execute('DELETE FROM tag_titles')
+        self.connection.execute('INSERT INTO tag_titles (tag, title, articles) SELECT t.tag, a.title, COUNT(*) '
+                                'FROM article_tags t JOIN articles a ON a.url = t.url GROUP BY t.tag, a.title')
+        self.connection.execute('DELETE FROM tag_counts')
+        self.connection.execute('INSERT INTO tag_counts (tag, articles) '
+                                'SELECT tag, COUNT(*) FROM tag_titles GROUP BY tag')
+        self.connection.commit()
+
+    def top_tags(self, n=7):
+        """Function to get (tag, number of distinct article titles) of n biggest tags, tags of the same number
+        in name order"""
+        return self.connection.execute('SELECT tag, articles FROM tag_counts WHERE articles > 0 '
+                                       'ORDER BY articles DESC, tag LIMIT ?', (n,)).fetchall()
+
+    def newest_articles(self, n=5):
+        """Function to get n most recent articles as rows of articles.csv (first author and tag),
+        articles of the same date in order of insertion"""
+        return self.connection.execute(
+            'SELECT a.title, a.url, a.text, a.publication_date, '
+            '(SELECT full_name FROM article_authors WHERE url = a.url ORDER BY position LIMIT 1), '
+            '(SELECT tag FROM article_tags WHERE url = a.url ORDER BY position LIMIT 1) '
+            'FROM articles a ORDER BY a.publication_date DESC, a.rowid LIMIT ?', (n,)).fetchall()
+
+    def top_authors(self, n=5):
+        """Function to get n authors with the biggest articles counter as rows of authors.csv (first contact)"""
+        return [(full_name, job_title, linkedin, contacts.split(CONTACTS_SEPARATOR)[0], counter)
+                for full_name, job_title, linkedin, contacts, counter in self.connection.execute(
+                    'SELECT full_name, job_title, linkedin, contacts, articles_counter FROM authors '
+                    'ORDER BY articles_counter DESC, rowid LIMIT ?', (n,))]
+
+    def add_author(self, author):
+        """Function to insert or update author profile (mapping with AuthorItem fields)"""
+        contacts = CONTACTS_SEPARATOR.join(author['contacts'])
+        values = (author['job_title'], author['linkedin'] or '', contacts, author['articles_counter'],
+                  author.get('url'), author['full_name'])
+        if self.connection.execute('UPDATE authors SET job_title = ?, linkedin = ?, contacts = ?, '
+                                   'articles_counter = ?, url = ? WHERE full_name = ?', values).rowcount == 0:
+            self.connection.execute('INSERT INTO authors (job_title, linkedin, contacts, articles_counter, url, '
+                                    'full_name) VALUES (?, ?, ?, ?, ?, ?)', values)
+        if author.get('url'):
+            self.mark_seen(author['url'], [author['full_name'], author['job_title'], author['linkedin'] or '',
+                                           author['contacts'], author['articles_counter']])
+
+    def read_articles(self):
+        """Function to get all articles: url -> ArticleItem, in order of insertion"""
+        articles = {}
+        for title, url, text, publication_date in self.connection.execute(
+                'SELECT title, url, text, publication_date FROM articles ORDER BY rowid'):
+            articles[url] = ArticleItem(title, url, text, publication_date, [], [])
+        for table, column, key, vocabulary in (('article_authors', 'full_name', 'authors', AUTHORS),
+                                               ('article_tags', 'tag', 'tags', TAGS)):
+            for url, value in self.connection.execute('SELECT url, {} FROM {} ORDER BY url, position'.format(
+                    column, table)):
+                if url in articles:
+                    articles[url][key].append(vocabulary.intern(value))
+        return articles
+
+    def read_authors(self):
+        """Function to get all authors: full name -> AuthorItem, in order of insertion"""
+        return {full_name: AuthorItem(full_name, job_title, linkedin,
+                                      contacts.split(CONTACTS_SEPARATOR) if contacts else [], counter, url)
+                for full_name, job_title, linkedin, contacts, counter, url in self.connection.execute(
+                    'SELECT full_name, job_title, linkedin, contacts, articles_counter, url FROM authors '
+                    'ORDER BY rowid')}
+
+    def import_csv(self, articles_path='articles.csv', authors_path='authors.csv'):
+        """Function to fill the store from csv files written by previous versions of the crawler"""
+        articles = {}
+        if os.path.isfile(articles_path) and is_normalized(articles_path):
+            articles = self.read_normalized_csv(articles_path)
+        elif os.path.isfile(articles_path):
+            with open(articles_path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    article = articles.get(row['url'])
+                    if article is None:
+                        article = articles[row['url']] = ArticleItem(row['title'], row['url'], row['text'],
+                                                                     row['publication_date'], [], [])
+                    if row['author'] not in article.authors:
+                        article.authors.append(AUTHORS.intern(row['author']))
+                    if row['tag'] not in article.tags:
+                        article.tags.append(TAGS.intern(row['tag']))
+        for article in articles.values():
+            self.add_article(article)
+        authors = {}
+        if os.path.isfile(authors_path):
+            with open(authors_path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    author = authors.get(row['full_name'])
+                    if author is None:
+                        author = authors[row['full_name']] = AuthorItem(row['full_name'], row['job_title'],
+                                                                        row['linkedin'], [], row['articles_counter'])
+                    if row['contact']:
+                        author.contacts.append(row['contact'])
+        for author in authors.values():
+            self.add_author(author)
+        self.commit()
+        return len(articles), len(authors)
+
+    @staticmethod
+    def read_normalized_csv(articles_path):
+        """Function to read articles of normalized layout: url -> ArticleItem"""
+        articles = {}
+        with open(articles_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                articles[row['url']] = ArticleItem(row['title'], row['url'], row['text'], row['publication_date'],
+                                                   [], [])
+        for path, column, key, vocabulary in zip(link_paths(articles_path), ('author', 'tag'), ('authors', 'tags'),
+                                                 (AUTHORS, TAGS)):
+            if os.path.isfile(path):
+                with open(path, newline='', encoding='utf-8') as f:
+                    for row in csv.DictReader(f):
+                        article = articles.get(row['url'])
+                        if article is not None and row[column] not in article[key]:
+                            article[key].append(vocabulary.intern(row[column]))
+        return articles
+
+    def export_csv(self, articles_path='articles.csv', authors_path='authors.csv', layout='flat'):
+        """Function to write the store content in csv format. layout - 'flat' (one row per author and tag
+        of article) or 'normalized' (article_authors.csv and article_tags.csv are written next to articles)"""
+        with open(articles_path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if layout == 'flat':
+                writer.writerow(['title', 'url', 'text', 'publication_date', 'author', 'tag'])
+                writer.writerows(self.connection.execute(
+                    'SELECT a.title, a.url, a.text, a.publication_date, aa.full_name, t.tag FROM articles a '
+                    'JOIN article_authors aa ON aa.url = a.url JOIN article_tags t ON t.url = a.url '
+                    'ORDER BY a.rowid, aa.position, t.position'))
+            else:
+                writer.writerow(['title', 'url', 'text', 'publication_date'])
+                writer.writerows(self.connection.execute(
+                    'SELECT title, url, text, publication_date FROM articles ORDER BY rowid'))
+        if layout != 'flat':
+            for path, header, query in zip(link_paths(articles_path), (['url', 'author'], ['url', 'tag']), (
+                    'SELECT l.url, l.full_name FROM article_authors l JOIN articles a ON a.url = l.url '
+                    'ORDER BY a.rowid, l.position',
+                    'SELECT l.url, l.tag FROM article_tags l JOIN articles a ON a.url = l.url '
+                    'ORDER BY a.rowid, l.position')):
+                with open(path, mode='w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(header)
+                    writer.writerows(self.connection.execute(query))
+        with open(authors_path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['full_name', 'job_title', 'linkedin', 'contact', 'articles_counter'])
+            for full_name, job_title, linkedin, contacts, counter in self.connection.execute(
+                    'SELECT full_name, job_title, linkedin, contacts, articles_counter FROM authors ORDER BY rowid'):
+                for contact in contacts.split(CONTACTS_SEPARATOR):
+                    writer.writerow([full_name, job_title, linkedin, contact, counter])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl state store maintenance')
+    parser.add_argument('--db', default='crawl_state.db', help='path to the state database')
+    parser.add_argument('--export', action='store_true', help='write articles.csv and authors.csv from the store')
+    parser.add_argument('--import-csv', action='store_true', help='fill the store from articles.csv and authors.csv')
+    parser.add_argument('--layout', choices=['flat', 'normalized'],
+                        help='layout of exported csv, layout of existing articles.csv or OUTPUT_LAYOUT by default')
+    args = parser.parse_args()
+    if args.layout is None and os.path.isfile('articles.csv'):  # spiders read the file in its own layout
+        args.layout = 'normalized' if is_normalized('articles.csv') else 'flat'
+    elif args.layout is None:
+        from scrapy.utils.project import get_project_settings
+        args.layout = get_project_settings().get('OUTPUT_LAYOUT', 'flat')
+    state = CrawlState(args.db)
+    if args.import_csv:
+        print('{} article(s) and {} author(s) imported'.format(*state.import_csv()))
+    if args.export:
+        state.export_csv(layout=args.layout)
+    state.close()
@@ -0,0 +1,178 @@
+"""Streaming report: aggregates of very large articles history computed from csv files read by chunks.
+
+Every chunk (see gd_blog_spider.loaders.read_chunks) updates online aggregates: distinct titles per tag,
+a heap of the newest articles and the row with the biggest articles counter of every author. Memory does not
+depend on the number of rows or on the size of article texts, but it is O(distinct articles): every distinct
+title (per tag) and url of the history is kept until the report is computed, and so is one row per author.
+Histories of more distinct articles than fit in memory need the state store (report of STATE_DB aggregates).
+Results are the same as of the in-memory engine (gd_blog_spider.reporting), ties included.
+"""
+import heapq
+
+from gd_blog_spider.loaders import (ARTICLES_COLUMNS, ARTICLES_DTYPES, AUTHORS_DTYPES, CHUNK_ROWS, is_normalized,
+                                    link_paths, read_chunks)
+from gd_blog_spider.reporting import ReportResult
+
+
+def _key(value):
+    """Function to make NaN values equal to each other, as pandas drop_duplicates and merge do"""
+    return None if value != value else value
+
+
+class TagTitles(object):
+    """Distinct titles per tag, every title string is kept once for all tags (O(distinct titles) memory)"""
+    def __init__(self):
+        self.titles = {}
+        self.tags = {}  # tag -> set of titles
+
+    def add(self, tag, title):
+        if tag != tag or title != title:  # NaN is not counted by groupby and nunique
+            return
+        self.tags.setdefault(tag, set()).add(self.titles.setdefault(title, title))
+
+    def update(self, chunk):
+        for tag, title in chunk[['tag', 'title']].drop_duplicates().itertuples(index=False, name=None):
+            self.add(tag, title)
+
+    def top(self, n=7):
+        """Function to get Series as returned by reporting.get_top_tags (ties in order of tags)"""
+        import pandas as pd
+        counts = sorted((-len(titles), tag) for tag, titles in self.tags.items())[:n]
+        return pd.Series([-count for count, _ in counts], index=pd.Index([tag for _, tag in counts], name='tag'),
+                         name='title')
+
+
+class TopRows(object):
+    """n rows with the biggest value of column, ties in order of rows in the file (as stable sort and nlargest).
+    unique - column of which only the first row of every value is taken (as drop_duplicates does), every value of
+    it is kept in memory"""
+    def __init__(self, column, n, unique=None, columns=None):
+        self.column = column
+        self.n = n
+        self.unique = unique
+        self.seen = set()  # values of unique column
+        self.columns = columns  # columns of rows, all columns of the file by default
+        self.heap = []  # (key, row) of n biggest keys, key: (value is not NaN, value, -position)
+        self.rows = 0
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        chunk.index = range(self.rows, self.rows + len(chunk))
+        self.rows += len(chunk)
+        if self.unique is not None:
+            first = []
+            for value in map(_key, chunk[self.unique]):
+                first.append(value not in self.seen)
+                self.seen.add(value)
+            chunk = chunk[first]
+        chunk = chunk.sort_values(self.column, ascending=False, kind='mergesort').head(self.n)
+        '''rows beyond n biggest of the chunk can't get into n biggest of the file'''
+        for position, row in zip(chunk.index, chunk[self.columns].itertuples(index=False, name=None)):
+            value = row[self.columns.index(self.column)]
+            key = (0, 0, -position) if value != value else (1, value, -position)  # NaN and NaT are the last
+            if len(self.heap) < self.n:
+                heapq.heappush(self.heap, (key, row))
+            elif key > self.heap[0][0]:
+                heapq.heapreplace(self.heap, (key, row))
+
+    def top(self):
+        """Function to get (position in file, row) pairs, the biggest first"""
+        return [(-key[2], row) for key, row in sorted(self.heap, reverse=True)]
+
+
+class TopGroups(object):
+    """n groups of rows (of the same value of group column) with the biggest value of column, every group is
+    represented by its row with the biggest value, the first one of ties (as stable sort and drop_duplicates).
+    The best row of every group is kept in memory"""
+    def __init__(self, column, n, group, columns=None):
+        self.column = column
+        self.n = n
+        self.group = group
+        self.columns = columns  # columns of rows, all columns of the file by default
+        self.best = {}  # value of group column -> (key, row), key: (value is not NaN, value, -position)
+        self.rows = 0
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        chunk.index = range(self.rows, self.rows + len(chunk))
+        self.rows += len(chunk)
+        chunk = chunk.sort_values(self.column, ascending=False, kind='mergesort').drop_duplicates(self.group)
+        '''only the best row of every group of the chunk can be the best one of the file'''
+        column, group = self.columns.index(self.column), self.columns.index(self.group)
+        for position, row in zip(chunk.index, chunk[self.columns].itertuples(index=False, name=None)):
+            value = row[column]
+            key = (0, 0, -position) if value != value else (1, value, -position)  # NaN and NaT are the last
+            name = _key(row[group])
+            if name not in self.best or key > self.best[name][0]:
+                self.best[name] = (key, row)
+
+    def top(self):
+        """Function to get (position in file, row) pairs, the biggest first"""
+        return [(-key[2], row) for key, row in heapq.nlargest(self.n, self.best.values(), key=lambda best: best[0])]
+
+
+def _frame(top, columns, dtypes, keep_index=True):
+    """Function to build frame of top rows with the same dtypes as in-memory frames have (rendered the same)"""
+    import pandas as pd
+    frame = pd.DataFrame([row for _, row in top], columns=columns,
+                         index=[position for position, _ in top] if keep_index else None)
+    return frame.astype({column: dtype for column, dtype in dtypes.items() if column in columns})
+
+
+def _stream_flat(articles_path, chunksize):
+    tags = TagTitles()
+    articles = TopRows('publication_date', 5, unique='url', columns=ARTICLES_COLUMNS)
+    for chunk in read_chunks(articles_path, ARTICLES_DTYPES, ['publication_date'], chunksize):
+        tags.update(chunk)
+        articles.update(chunk)
+    return tags.top(7), _frame(articles.top(), ARTICLES_COLUMNS, ARTICLES_DTYPES)
+
+
+def _stream_normalized(articles_path, chunksize):
+    """Function to read articles.csv, then article_tags.csv and article_authors.csv once each"""
+    titles = {}  # url -> title of every distinct article
+    repeated = {}  # url -> other titles of url repeated in articles.csv
+    articles = TopRows('publication_date', 5, columns=ARTICLES_COLUMNS[:4])
+    for chunk in read_chunks(articles_path, ARTICLES_DTYPES, ['publication_date'], chunksize):
+        articles.update(chunk)
+        for url, title in zip(map(_key, chunk['url']), chunk['title']):
+            if url not in titles:
+                titles[url] = title
+            elif titles[url] != title:
+                repeated.setdefault(url, set()).add(title)
+    top = articles.top()
+    firsts = {'author': {}, 'tag': {}}  # first author and tag of top articles, as in flat rows
+    wanted = {_key(row[1]) for _, row in top}
+
+    tags = TagTitles()
+    authors_path, tags_path = link_paths(articles_path)
+    for path, column in ((tags_path, 'tag'), (authors_path, 'author')):
+        found = firsts[column]
+        for chunk in read_chunks(path, ARTICLES_DTYPES, chunksize=chunksize):
+            for url, value in zip(map(_key, chunk['url']), chunk[column]):
+                if column == 'tag' and url in titles:
+                    tags.add(value, titles[url])
+                    for title in repeated.get(url, ()):
+                        tags.add(value, title)
+                if url in wanted and url not in found:
+                    found[url] = value
+    rows = [(position, row + (firsts['author'].get(_key(row[1]), float('nan')),
+                              firsts['tag'].get(_key(row[1]), float('nan')))) for position, row in top]
+    return tags.top(7), _frame(rows, ARTICLES_COLUMNS, ARTICLES_DTYPES, keep_index=False)
+
+
+def stream_report(articles_path='articles.csv', authors_path='authors.csv', chunksize=CHUNK_ROWS):
+    """Function to compute the same ReportResult as reporting.load_report reading csv files by chunks"""
+    import pandas as pd
+    if is_normalized(articles_path):
+        top7_tags, top5_articles = _stream_normalized(articles_path, chunksize)
+    else:
+        top7_tags, top5_articles = _stream_flat(articles_path, chunksize)
+    top5_articles['publication_date'] = pd.to_datetime(top5_articles['publication_date'])
+    authors = TopGroups('articles_counter', 5, group='full_name')
+    for chunk in read_chunks(authors_path, AUTHORS_DTYPES, chunksize=chunksize):
+        authors.update(chunk)
+    return ReportResult(top7_tags=top7_tags, top5_articles=top5_articles,
+                        top5_authors=_frame(authors.top(), authors.columns or [], AUTHORS_DTYPES))
@@ -1,9 +1,18 @@
-import shlex  # Lexical analysis of shell-style syntaxes
-import subprocess
+import argparse
 import os
 import logging
-import pandas as pd
-from matplotlib import pyplot as plt
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from gd_blog_spider.items import ArticleItem, AuthorItem
+from gd_blog_spider.loaders import (ARTICLES_DTYPES, articles_key, load_articles, load_authors, read_cache,
+                                    write_cache)
+from gd_blog_spider.pipelines import ARTICLES_HEADER, AUTHORS_HEADER, article_rows, author_rows
+from gd_blog_spider.rendering import df_to_str, plot_top7_tags, render_all
+from gd_blog_spider.reporting import build_report, get_top_articles, get_top_authors, get_top_tags, state_report
+from gd_blog_spider.state import CrawlState
+from gd_blog_spider.streaming import stream_report
 
 
 logging.basicConfig(level=logging.INFO,
@@ -15,119 +24,213 @@ formatter = logging.Formatter('%(asctime)s:%(levelname)s:%(message)s')
 file_handler.setFormatter(formatter)
 
 
-def run_command(command):
-    process = subprocess.Popen(shlex.split(command), stdout=subprocess.PIPE)
-    while True:
-        output = process.stdout.readline().decode()
-        if output == '' and process.poll() is not None:  # poll() reads a line from the stdout (None if still running)
-            break
-        if output:
-            print(output.strip())
-    rc = process.poll()  # returns 'return code' cuz process is completed
-    return rc
+class ItemCollector(object):
+    """Keeps items scraped during the crawl, so the report is built without reading csv files.
+    Items are compact records, they are expanded to csv rows only when the dataframes are built.
+    Used only when the state store is disabled (STATE_DB = None in settings) and the report is not streaming,
+    otherwise the report is read from the state store aggregates"""
+    def __init__(self):
+        self.articles = []
+        self.authors = []
+
+    def item_scraped(self, item, response, spider):
+        if isinstance(item, ArticleItem):
+            self.articles.append(item)
+        elif isinstance(item, AuthorItem):
+            self.authors.append(item)
+
+
+def run_spider(name, collect=True):
+    """Function to run spider in this process. Returns code (0 - success, 1 - crawl failed to start,
+    as 'scrapy crawl' does), rows of scraped items (kept only if collect is True) and the spider object"""
+    logging.getLogger('scrapy').setLevel(logging.WARNING)  # same as --nolog for scrapy own messages
+    process = CrawlerProcess(get_project_settings(), install_root_handler=False)
+    collector = ItemCollector()
+    crawler = process.create_crawler(name)
+    if collect:
+        crawler.signals.connect(collector.item_scraped, signal=signals.item_scraped)
+    process.crawl(crawler)
+    process.start()  # blocks until crawl is finished
+    return_code = 1 if process.bootstrap_failed else 0
+    return return_code, collector, crawler.spider
+
+
+def expand_rows(entries, item_class, item_rows):
+    """Function to iterate over csv rows of entries which are items or rows already"""
+    for entry in entries:
+        if isinstance(entry, item_class):
+            yield from item_rows(entry)
+        else:
+            yield entry
+
+
+def articles_frame(rows):
+    """Function to build articles dataframe (as returned by load_articles) from csv rows or ArticleItem records"""
+    import pandas as pd  # pandas and matplotlib are imported only when report stage runs
+    articles = pd.DataFrame(list(expand_rows(rows, ArticleItem, article_rows)), columns=ARTICLES_HEADER)
+    articles['publication_date'] = pd.to_datetime(articles['publication_date'])
+    return articles
+
+
+def authors_frame(rows):
+    """Function to build authors dataframe (as returned by load_authors) from csv rows or AuthorItem records"""
+    import pandas as pd
+    authors = pd.DataFrame(list(expand_rows(rows, AuthorItem, author_rows)), columns=AUTHORS_HEADER)
+    authors['articles_counter'] = pd.to_numeric(authors['articles_counter'])
+    return authors
+
+
+def get_report_data(spider, collector, history_key=None):
+    """Function to get articles and authors dataframes after the crawl without reading csv files back
+    (report without the state store, see ItemCollector). history_key - cache key of articles.csv taken before
+    blog_check started"""
+    import pandas as pd
+    if spider.name == 'blog_update':  # changed records were rewritten in csv files from the state store
+        return load_articles(spider.output_articles, cache=True), load_authors(spider.output_authors)
+    if spider.name == 'blog_scraper' and spider.resumed:  # data of the interrupted run is in csv files only
+        return load_articles(spider.output_articles, cache=True), load_authors(spider.output_authors)
+    if spider.name == 'blog_scraper':  # all data is scraped in this run
+        articles, authors = articles_frame(collector.articles), authors_frame(collector.authors)
+        if os.path.isfile(spider.output_articles):
+            write_cache(spider.output_articles, articles.astype(ARTICLES_DTYPES),
+                        articles_key(spider.output_articles))  # next run starts from here
+        return articles, authors
+    # new articles are added to history, authors with updated counters are kept by blog_check
+    authors = authors_frame([row for rows in spider.authors_index.authors.values() for row in rows])
+    history = read_cache(spider.output_articles, history_key) if history_key is not None else None
+    if history is not None:
+        articles = pd.concat([history, articles_frame(collector.articles)], ignore_index=True).astype(ARTICLES_DTYPES)
+        write_cache(spider.output_articles, articles, articles_key(spider.output_articles))  # same rows as csv has
+    elif os.path.isfile(spider.output_articles):  # no cache yet -> csv already contains new articles
+        articles = load_articles(spider.output_articles, cache=True)
+    else:
+        articles = articles_frame(collector.articles)
+    return articles, authors
+
+
+def data_exists(state_db='crawl_state.db', layout='flat'):
+    """Function to check if previous crawl results exist (in the state store or in csv files).
+    state_db - path of STATE_DB setting, empty if the state store is disabled.
+    Deleted csv files of the state store are exported from it again (in layout of OUTPUT_LAYOUT setting),
+    blog_check reads and rewrites them"""
+    csv_exist = os.path.isfile('authors.csv') and os.path.isfile('articles.csv')
+    if state_db and os.path.isfile(state_db):
+        state = CrawlState(state_db)
+        has_articles = state.has_articles()
+        if has_articles and not csv_exist:
+            logging.info('Csv files are missing. Exporting them from the state store . . .')
+            state.export_csv('articles.csv', 'authors.csv', layout)
+        state.close()
+        if has_articles:
+            return True
+    return csv_exist
+
+
+def crawl_interrupted(state_db='crawl_state.db', spider='blog_scraper'):
+    """Function to check if full crawl was interrupted (killed or stopped) and has to be resumed"""
+    if not state_db or not os.path.isfile(state_db):
+        return False
+    state = CrawlState(state_db)
+    interrupted = state.has_frontier(spider)
+    state.close()
+    return interrupted
 
 
 def get_top7_tags_plt(csv_path=None):
     if csv_path is None:
-        articles = pd.read_csv('articles.csv')
+        articles = load_articles(columns=['title', 'tag'])
     else:
-        articles = csv_path
-    tags = set(articles['tag'])  # get names of tags
-    tags_count = {}
-    for tag in tags:
-        tags_count.update({tag: len(articles[articles.tag == tag].drop_duplicates('title'))})  # key = tag name, value = counter
-    tags_count = {k: v for k, v in sorted(tags_count.items(), key=lambda item: item[1], reverse=True)}  # sort tags by counter, descending
-    tags_count_top7 = dict(list(tags_count.items())[:7])  # get 7 most popular tags
-
-    x = range(7)
-    plt.figure(figsize=(9, 5))
-    rects = plt.bar(x, tags_count_top7.values())
-    plt.xticks(x, tags_count_top7.values(), rotation='horizontal')
-    plt.yticks([], [])
-    plt.title('Tags')
-    plt.xlabel('Articles counter')
-
-    def autolabel(rects):
-         """Attach a text label above each bar in *rects*, displaying its title."""
-         for rect, key in zip(rects, tags_count_top7.keys()):
-             height = rect.get_height()
-             plt.annotate('{}'.format(key),
-                          xy=(rect.get_x() + rect.get_width() / 2, height),
-                          xytext=(0, 3),  # 3 points vertical offset
-                          textcoords="offset points",
-                          ha='center', va='bottom')
-
-    autolabel(rects)
-    plt.tight_layout()
-    return plt
+        articles = csv_path  # already loaded dataframe
+    return plot_top7_tags(get_top_tags(articles))
 
 
 def get_top5_articles_df(csv_path=None):
-    if csv_path is None:  # use default file
-        articles = pd.read_csv('articles.csv')
+    if csv_path is None:  # use default file (flat view of any layout)
+        articles = load_articles()
     else:
-        articles = pd.read_csv(csv_path)
-    top5_articles = articles.sort_values('publication_date', ascending=False).drop_duplicates('url').head(5)
-    return top5_articles
+        articles = load_articles(csv_path)
+    return get_top_articles(articles)
 
 
 def get_top5_authors_df(csv_path=None):
     if csv_path is None:  # use default file
-        authors = pd.read_csv('authors.csv')
+        authors = load_authors()
     else:
-        authors = pd.read_csv(csv_path)
-    top5_authors = authors.sort_values('articles_counter', ascending=False).drop_duplicates('full_name').head(5)
-    return top5_authors
-
+        authors = load_authors(csv_path)
+    return get_top_authors(authors)
 
-def df_to_str(df):
-    df_for_file = df.to_string(index=False, na_rep='')  # dataframe as non-truncated string (for file)
-    df_for_console = '\n\n' + df.to_string(index=False, na_rep='', max_colwidth=20) + '\n'
-    '''dataframe as truncated string with newline characters for prettier console output'''
-    return df_for_console, df_for_file
 
-
-def generate_report(plt, art_cons, auth_cons, art_file, auth_file):
+def render_report(result, headless=False, force=False):
+    """Function to render plot, text, json and html reports from ReportResult (see gd_blog_spider.rendering).
+    Files are not rendered again if report data has not changed since the last run (unless force is True)"""
     logging.info('Generating the report . . .')
-    plt.savefig('top7tags.png', dpi=100)
-    logging.info('To continue close pop-up window')
-    plt.show()
+    paths, _ = render_all(result, force=force)
+    if not headless:
+        plt = plot_top7_tags(result.top7_tags)
+        logging.info('To continue close pop-up window')
+        plt.show()
+    art_cons, _ = df_to_str(result.top5_articles)
+    auth_cons, _ = df_to_str(result.top5_authors)
     logging.info('Top-5 Authors (based on articles counter)')
     logging.info(auth_cons)
     logging.info('Top-5 New Articles (based on publish data)')
     logging.info(art_cons)
     logging.info('Short-form reports displayed above in the console.\n'
-                 '\t\t\t\tLong-form reports saved to the current directory:\n'
-                 '\t\t\t\t\t\t-> top5articles.txt\n'
-                 '\t\t\t\t\t\t-> top5authors.txt\n'
-                 '\t\t\t\t\t\t-> top7tags.png\n')
-
-    with open('top5authors.txt', mode='w', newline='', encoding='utf-8') as f:  # writing
-        f.writelines(auth_file)
-
-    with open('top5articles.txt', mode='w', newline='', encoding='utf-8') as f:
-        f.writelines(art_file)
+                 '\t\t\t\tLong-form reports saved to the current directory:\n' +
+                 ''.join('\t\t\t\t\t\t-> {}\n'.format(os.path.basename(path)) for path in paths))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Crawl GridDynamics blog and generate the report')
+    parser.add_argument('--headless', action='store_true',
+                        help='save report files without showing plot window (for cron, containers, CI)')
+    parser.add_argument('--update', action='store_true',
+                        help='also re-crawl articles and authors changed since the last run (sitemap lastmod)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='build the report from csv files read by chunks (for histories bigger than memory)')
+    parser.add_argument('--force', action='store_true',
+                        help='render report files even if report data has not changed since the last run')
+    args = parser.parse_args()
+    settings = get_project_settings()
+    state_db, layout = settings.get('STATE_DB'), settings.get('OUTPUT_LAYOUT', 'flat')
+    collect = not args.streaming and not state_db
+    '''streaming report reads csv files and the report of the state store (default) reads its aggregates,
+    scraped rows are kept in memory only if STATE_DB is disabled in settings and --streaming is not given'''
     logging.info('Script started')
     logging.info('Checking if file with data already exists . . .')
-    if os.path.isfile('authors.csv') and os.path.isfile('articles.csv'):  # data exists
+    if crawl_interrupted(state_db):  # partial data must not be taken for complete one by blog_check
+        logging.info('Previous crawl was interrupted. Resuming it . . .')
+        history_key = None
+        return_code, collector, spider = run_spider('blog_scraper', collect)  # continue from saved requests
+    elif data_exists(state_db, layout) and args.update:
+        logging.info('Data exists. Looking for new and changed pages in sitemap . . .')
+        history_key = None
+        return_code, collector, spider = run_spider('blog_update', collect)  # re-crawl changed pages and update data
+        '''blog_update spider is located in spiders/blog_update.py'''
+    elif data_exists(state_db, layout):
         logging.info('Data exists. Getting most recent blog-post date . . .')
-        return_code = run_command('scrapy crawl blog_check --nolog')  # check for new blog-posts and update data
+        history_key = articles_key('articles.csv') if os.path.isfile('articles.csv') else None
+        '''history is taken after the crawl from the parsed cache of csv in its current state'''
+        return_code, collector, spider = run_spider('blog_check', collect)  # check for new blog-posts and update data
         '''blog_check spider is located in spiders/blog_check.py'''
     else:
         logging.info('Data does not exists. Starting spider . . .')
-        return_code = run_command('scrapy crawl blog_scraper --nolog')  # scrape all info from scratch and save data
+        history_key = None
+        return_code, collector, spider = run_spider('blog_scraper', collect)  # scrape all info from scratch, save data
         '''blog_scraper spider is located in spiders/blog_parse.py'''
-    if return_code is 0:
+    if return_code == 0 and args.streaming:
+        logging.info('Aggregating csv files by chunks for the report . . .')
+        render_report(stream_report(spider.output_articles, spider.output_authors), args.headless, args.force)
+    elif return_code == 0 and state_db:
+        logging.info('Reading report aggregates from the state store . . .')
+        state = CrawlState(state_db)  # aggregates were updated by the pipeline with every scraped item
+        result = state_report(state)
+        state.close()
+        render_report(result, args.headless, args.force)
+    elif return_code == 0:  # STATE_DB is disabled: report of items collected during the crawl and csv files
         logging.info('Getting data for the report . . .')
-        plt = get_top7_tags_plt()
-        top5_articles_df = get_top5_articles_df()
-        top5_authors_df = get_top5_authors_df()
-        art_cons, art_file = df_to_str(top5_articles_df)
-        auth_cons, auth_file = df_to_str(top5_authors_df)
-        generate_report(plt, art_cons, auth_cons, art_file, auth_file)
+        articles, authors = get_report_data(spider, collector, history_key)
+        render_report(build_report(articles, authors), args.headless, args.force)
     else:
         logging.fatal('Script execution has been stopped because of error')
 
@@ -1,9 +1,43 @@
 import unittest
+import csv
 import datetime
-from scrapy.http import HtmlResponse
+import io
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from scrapy.exporters import CsvItemExporter, JsonLinesItemExporter
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.utils.request import request_fingerprint
+from scrapy.utils.sitemap import Sitemap
+from twisted.internet import defer
+from bs4 import BeautifulSoup
+from gd_blog_spider.archive import PageArchive, read_blob, reparse
+from gd_blog_spider.author_index import AuthorIndex
+from gd_blog_spider.dupefilter import BloomDupeFilter, ScalableBloomFilter
+from gd_blog_spider.extractors import extract_text
+from gd_blog_spider.items import TAGS, ArticleItem, AuthorItem, Vocabulary, clear_vocabularies
+from gd_blog_spider.loaders import load_articles
+from gd_blog_spider.middlewares import (CheckpointMiddleware, ConcurrencyController, ConditionalRequestMiddleware,
+                                        ProfilingSpiderMiddleware)
+from gd_blog_spider.parse_pool import extract
+from gd_blog_spider.pipelines import GdBlogSpiderPipeline
+from gd_blog_spider.profiling import NULL_STAGE, stage
+from gd_blog_spider.query import ArticleIndex
+from gd_blog_spider.state import CrawlState
 from gd_blog_spider.spiders.blog_check import BlogCheckSpider
 from gd_blog_spider.spiders.blog_parse import GDBlogCrawler
-from report import get_top5_articles_df
+from gd_blog_spider.spiders.blog_update import BlogUpdateSpider
+import matplotlib
+import pandas as pd
+from gd_blog_spider import rendering
+from gd_blog_spider.rendering import render_all
+from gd_blog_spider.reporting import build_report, load_report, state_report
+from gd_blog_spider.sharding import DONE, FAILED, ShardQueue, merge, merge_archives
+from gd_blog_spider.streaming import stream_report
+from report import ItemCollector, articles_frame, df_to_str, get_top5_articles_df
 
 
 class SpiderTest(unittest.TestCase):
@@ -26,19 +60,818 @@ class SpiderTest(unittest.TestCase):
                     ['Search', 'ML & AI', 'E-commerce'])
         self.assertEqual(crawler.parse_article(response, write_to_csv=False), expected)
 
+    def test_parse_pool(self):
+        """Test that parsing in worker processes gives the same items as in-thread parsing"""
+        class Pool(object):  # runs extraction as ParsePool workers do, but in this process
+            def submit(self, function, response):
+                function = pickle.loads(pickle.dumps(function))  # functions are sent to workers by name
+                return defer.succeed(extract(function, response.url, response.body, response.encoding))
+
+        with open(r'unittests_files/article_sample.htm') as f:
+            response = HtmlResponse(url='https://blog.griddynamics.com/sample/', body=f.read(), encoding='utf-8')
+        expected = [dict(item) for item in GDBlogCrawler().parse_article(response)]
+        crawler = GDBlogCrawler()
+        crawler.parse_pool = Pool()
+        result = []
+        crawler.parse_article(response).addCallback(lambda items: result.extend(dict(item) for item in items))
+        self.assertEqual(result, expected)
+
+    def test_extract_text(self):
+        """Test that extract_text gives the same text as BeautifulSoup for long and short posts"""
+        with open(r'unittests_files/article_sample.htm') as f:
+            response = HtmlResponse(url='https://blog.griddynamics.com/sample/', body=f.read(), encoding='utf-8')
+        selectors = response.css('div#postcontent > div#mypost')
+        self.assertEqual(extract_text(selectors),
+                         BeautifulSoup(selectors.get(), features='lxml').get_text().strip()[:161]
+                         .replace('\r', '').replace('\n', ' '))
+        short = HtmlResponse(url='https://blog.griddynamics.com/short/', encoding='utf-8',
+                             body='<div id="mypost">\n <p>Short <b>post</b><!-- note --></p>\n</div>')
+        self.assertEqual(extract_text(short.css('div#mypost')), 'Short post')
+
     def test_get_last_publication_date(self):
         """Test BlogCheckSpider.get_last_publication_date_from_csv"""
         spider = BlogCheckSpider()
         self.assertEqual(spider.get_last_publication_date_from_csv(csv_path='unittests_files/articles_sample.csv'),
                          ('2020-03-03', datetime.date(2020, 3, 3)))  # function returns values as str and as datetime
 
+    def test_explore_pagination(self):
+        """Test that BlogCheckSpider follows explore pages only until a known blog-post is found"""
+        def explore_page(dates, next_page):
+            cards = ''.join('<div class="cntt"><h4><a href="/post-{day}/">Post</a></h4><div class="viewauthor">'
+                            '<div class="authwrp"><span>Mar {day:02}, 2020</span></div></div></div>'.format(day=day)
+                            for day in dates)
+            return HtmlResponse(url='https://blog.griddynamics.com/explore/', encoding='utf-8',
+                                body='<html><body>{}<a rel="next" href="{}">Older</a></body></html>'
+                                .format(cards, next_page))
+        spider = BlogCheckSpider()
+        spider.last_date = ('2020-03-03', datetime.date(2020, 3, 3))
+        with tempfile.TemporaryDirectory() as directory:
+            spider.state = CrawlState(os.path.join(directory, 'state.db'))
+            spider.state.add_article({'title': 'Post', 'url': 'https://blog.griddynamics.com/post-3/', 'text': '',
+                                      'publication_date': '2020-03-03', 'authors': [], 'tags': []})
+            requests = list(spider.parse(explore_page([9, 8, 7], '/explore/page/2/')))
+            self.assertEqual([request.url.rsplit('/', 2)[1] for request in requests],
+                             ['post-9', 'post-8', 'post-7', '2'])  # all blog-posts are new -> next page
+            requests = list(spider.parse(explore_page([6, 5, 3, 2], '/explore/page/3/')))
+            self.assertEqual([request.url.rsplit('/', 2)[1] for request in requests], ['post-6', 'post-5'])
+            self.assertEqual(spider.new_articles_len, 5)
+            requests = list(spider.parse(explore_page([1, 4, 2], '/explore/page/4/')))  # older post pinned first
+            self.assertEqual([request.url.rsplit('/', 2)[1] for request in requests], ['post-4'])  # no next page
+            spider.state.close()
+
+    def test_explore_watermark_date(self):
+        """Test that blog-posts published later on the day of the most recent known one are not missed"""
+        known_url = ('https://blog.griddynamics.com/'
+                     'tiered-machine-learning-ranking-improves-relevance-for-the-retail-search/')
+        cards = ''.join('<div class="cntt"><h4><a href="{}">Post</a></h4><div class="viewauthor"><div class="authwrp">'
+                        '<span>{}, 2020</span></div></div></div>'.format(url, date)
+                        for url, date in [('/post-4/', 'Mar 04'), ('/later-post/', 'Mar 03'), (known_url, 'Mar 03'),
+                                          ('/post-2/', 'Mar 02'), ('/post-1/', 'Mar 01')])
+        response = HtmlResponse(url='https://blog.griddynamics.com/explore/', encoding='utf-8',
+                                body='<html><body>{}<a rel="next" href="/explore/page/2/">Older</a></body></html>'
+                                .format(cards))
+        spider = BlogCheckSpider()  # csv files only: urls of the last date are read from articles.csv
+        spider.output_articles = 'unittests_files/articles_sample.csv'
+        spider.last_date = ('2020-03-03', datetime.date(2020, 3, 3))
+        self.assertEqual([request.url.rsplit('/', 2)[1] for request in spider.parse(response)],
+                         ['post-4', 'later-post'])  # stopped at the older blog-post, next page isn't requested
+        with tempfile.TemporaryDirectory() as directory:
+            spider = BlogCheckSpider()
+            spider.state = CrawlState(os.path.join(directory, 'state.db'))
+            spider.state.add_article({'title': 'Known', 'url': known_url, 'text': '', 'publication_date': '2020-03-03',
+                                      'authors': [], 'tags': []})
+            spider.last_date = spider.get_last_publication_date()
+            self.assertEqual([request.url.rsplit('/', 2)[1] for request in spider.parse(response)],
+                             ['post-4', 'later-post'])
+            spider.state.close()
+
     def test_get_top5_articles_df(self):
         """Test report.get_top5_articles_df"""
         df = get_top5_articles_df(csv_path='unittests_files/articles_sample.csv')
-        expected = ['2020-03-03', '2020-02-28', '2020-02-22', '2020-02-18', '2020-02-11']
+        expected = [pd.Timestamp(day) for day in ('2020-03-03', '2020-02-28', '2020-02-22', '2020-02-18', '2020-02-11')]
         self.assertEqual(df.publication_date.tolist(),
                          expected)
 
+    def test_build_report(self):
+        """Test that vectorized report engine counts distinct articles per tag"""
+        articles = pd.read_csv('unittests_files/articles_sample.csv')
+        authors = pd.DataFrame({'full_name': ['Author A', 'Author A', 'Author B'],
+                                'articles_counter': [2, 2, 5]})
+        result = build_report(articles, authors)
+        for tag, counter in result.top7_tags.items():
+            self.assertEqual(counter, len(articles[articles.tag == tag].drop_duplicates('title')))
+        self.assertEqual(len(result.top7_tags), min(7, articles.tag.nunique()))
+        self.assertEqual(result.top5_articles.publication_date.tolist(),
+                         ['2020-03-03', '2020-02-28', '2020-02-22', '2020-02-18', '2020-02-11'])
+        self.assertEqual(result.top5_authors.full_name.tolist(), ['Author B', 'Author A'])
+
+    def test_stream_report(self):
+        """Test that report aggregated by chunks is the same as in-memory one"""
+        with tempfile.TemporaryDirectory() as directory:
+            authors_path = os.path.join(directory, 'authors.csv')
+            with open(authors_path, mode='w', encoding='utf-8') as f:
+                f.write('full_name,job_title,linkedin,contact,articles_counter\n'
+                        'Author A,,,,2\nAuthor B,,,,5\nAuthor A,,,,7\nAuthor C,,,,2\nAuthor D,,,,5\n'
+                        'Author B,,,,3\n')
+            expected = load_report('unittests_files/articles_sample.csv', authors_path)
+            result = stream_report('unittests_files/articles_sample.csv', authors_path, chunksize=2)
+        self.assertEqual(list(result.top7_tags.items()), list(expected.top7_tags.items()))
+        self.assertEqual(df_to_str(result.top5_articles), df_to_str(expected.top5_articles))
+        self.assertEqual(df_to_str(result.top5_authors), df_to_str(expected.top5_authors))
+        self.assertEqual(result.top5_authors.full_name.tolist(), ['Author A', 'Author B', 'Author D', 'Author C'])
+        self.assertEqual(result.top5_authors.articles_counter.tolist(), [7, 5, 5, 2])  # per-author maximum
+
+    def test_render_all(self):
+        """Test that report files of all formats are rendered from one result and are not rendered again
+        until report data changes"""
+        with tempfile.TemporaryDirectory() as directory:
+            authors_path = os.path.join(directory, 'authors.csv')
+            with open(authors_path, mode='w', encoding='utf-8') as f:
+                f.write('full_name,job_title,linkedin,contact,articles_counter\n'
+                        'Author A,Engineer,,,2\nAuthor B,<Lead>,,,5\n')
+            result = load_report('unittests_files/articles_sample.csv', authors_path)
+            directory = os.path.join(directory, 'report')
+            os.mkdir(directory)
+            concurrent, rendering.CONCURRENT = rendering.CONCURRENT, True  # chart in a worker on any host
+            try:
+                paths, rendered = render_all(result, directory)
+            finally:
+                rendering.CONCURRENT = concurrent
+            self.assertTrue(rendered)
+            self.assertEqual(sorted(os.listdir(directory)), ['.report_cache.json', 'report.html', 'report.json',
+                                                             'top5articles.txt', 'top5authors.txt', 'top7tags.png'])
+            with open(os.path.join(directory, 'report.json'), encoding='utf-8') as f:
+                report = json.load(f)
+            self.assertEqual(report['top7_tags'][0], {'tag': result.top7_tags.index[0],
+                                                      'articles': int(result.top7_tags.iloc[0])})
+            self.assertEqual([article['publication_date'] for article in report['top5_articles']],
+                             ['2020-03-03', '2020-02-28', '2020-02-22', '2020-02-18', '2020-02-11'])
+            with open(os.path.join(directory, 'top5authors.txt'), encoding='utf-8') as f:
+                self.assertEqual(f.read(), df_to_str(result.top5_authors)[1])
+            self.assertEqual(render_all(result, directory, formats=('txt', 'json')), (paths[1:4], False))
+
+            with open(paths[0], 'rb') as f:
+                png = f.read()
+            os.unlink(os.path.join(directory, 'report.html'))  # missing file is rendered again
+            backend = matplotlib.get_backend()
+            matplotlib.use('svg')  # backend of the window shown by the report (not Agg of headless mode)
+            concurrent, rendering.CONCURRENT = rendering.CONCURRENT, False  # chart in a thread of this process
+            try:
+                self.assertTrue(render_all(result, directory, force=True)[1])
+                self.assertEqual(matplotlib.get_backend(), 'svg')
+            finally:
+                rendering.CONCURRENT = concurrent
+                matplotlib.use(backend)
+            with open(paths[0], 'rb') as f:
+                self.assertEqual(f.read(), png)
+            result.top7_tags.iloc[0] += 1
+            self.assertTrue(render_all(result, directory, formats=('json',))[1])
+            self.assertTrue(render_all(result, directory, formats=('txt',))[1])  # rendered for other data
+
+    def test_blog_update(self):
+        """Test that BlogUpdateSpider fetches only sitemap urls changed since the last crawl and changed pages
+        replace the old records in csv files"""
+        url = 'https://blog.griddynamics.com/tiered-machine-learning-ranking-improves-relevance-for-the-retail-search/'
+        old = {'title': 'Old', 'url': 'https://blog.griddynamics.com/old/', 'text': 'Text',
+               'publication_date': '2020-01-01', 'authors': ['Author A'], 'tags': ['QA']}
+        with tempfile.TemporaryDirectory() as directory:
+            spider = BlogUpdateSpider()
+            spider.output_articles = os.path.join(directory, 'articles.csv')
+            spider.output_authors = os.path.join(directory, 'authors.csv')
+            pipeline = GdBlogSpiderPipeline(state_db=os.path.join(directory, 'state.db'))
+            pipeline.open_spider(spider)  # spider.state is set by the pipeline
+            spider.state.add_article(old)
+            spider.state.set_validators(old['url'], lastmod='2020-03-03')
+            spider.state.add_article(dict(old, url=url))  # crawled before without sitemap
+            entries = ''.join('<url><loc>{}</loc><lastmod>{}</lastmod></url>'.format(loc, lastmod) for loc, lastmod in
+                              [(old['url'], '2020-03-01'), (url, '2100-01-01'), (old['url'] + 'new/', '2020-03-01')])
+            sitemap = Sitemap('<?xml version="1.0" encoding="UTF-8"?><urlset '
+                              'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{}</urlset>'
+                              .format(entries).encode('utf-8'))
+            self.assertEqual([entry['loc'] for entry in spider.sitemap_filter(sitemap)], [url, old['url'] + 'new/'])
+            self.assertEqual((spider.counters['sitemap_urls'], spider.counters['skipped']), (3, 1))
+
+            with open(r'unittests_files/article_sample.htm') as f:
+                response = HtmlResponse(url=url, body=f.read(), encoding='utf-8', request=Request(url))
+            items = list(spider.parse_article(response))
+            self.assertEqual([item['title'] for item in items],
+                             ['Tiered machine learned ranking improves relevance for the retail search'])
+            self.assertEqual(spider.state.get_validators(url)[0], '2100-01-01')  # sitemap lastmod is saved
+            not_modified = Response(url=old['url'] + 'new/', status=304, request=Request(old['url'] + 'new/'))
+            self.assertEqual(list(spider.parse_article(not_modified)), [])
+            for item in items:
+                pipeline.process_item(item, spider)
+            self.assertEqual(list(spider.parse_article(response)), [])  # same content -> nothing to update
+            self.assertEqual(spider.counters, {'sitemap_urls': 3, 'skipped': 1, 'not_modified': 1,
+                                               'unchanged': 1, 'updated': 1, 'new': 0})
+            pipeline.close_spider(spider)  # csv files are written from the store
+            articles = load_articles(spider.output_articles)
+            self.assertEqual(articles.drop_duplicates('url').title.tolist(),
+                             ['Old', 'Tiered machine learned ranking improves relevance for the retail search'])
+            self.assertEqual(articles[articles.url == url].tag.unique().tolist(), ['Search', 'ML & AI', 'E-commerce'])
+
+    def run_python(self, code, cwd):
+        """Function to run code in a new interpreter (modules of this process are not imported there)"""
+        root = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run([sys.executable, '-c', code], cwd=cwd, check=True, stdout=subprocess.PIPE,
+                              universal_newlines=True, env=dict(os.environ, PYTHONPATH=root)).stdout
+
+    def test_lazy_imports(self):
+        """Test that report.py imports neither pandas nor matplotlib until the report stage runs"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = self.run_python('import sys\nimport report\n'
+                                     'print(sorted(set(sys.modules) & {"pandas", "matplotlib", "numpy"}))', directory)
+        self.assertEqual(output.strip(), '[]')
+
+    def test_headless_report(self):
+        """Test that headless report saves all files without importing pyplot (no window is opened)"""
+        articles_path = os.path.abspath('unittests_files/articles_sample.csv')
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'authors.csv'), mode='w', encoding='utf-8') as f:
+                f.write('full_name,job_title,linkedin,contact,articles_counter\nAuthor A,,,,2\n')
+            output = self.run_python('import sys\nfrom report import render_report\n'
+                                     'from gd_blog_spider.reporting import load_report\n'
+                                     'render_report(load_report({!r}, "authors.csv"), headless=True)\n'
+                                     'print("matplotlib.pyplot" in sys.modules)'.format(articles_path), directory)
+            self.assertEqual(output.strip(), 'False')
+            for name in ('top7tags.png', 'top5articles.txt', 'top5authors.txt', 'report.json', 'report.html'):
+                self.assertTrue(os.path.getsize(os.path.join(directory, name)) > 0, name)
+
+    def test_data_exists(self):
+        """Test that csv files deleted next to the state store are exported from it again"""
+        articles_path = os.path.abspath('unittests_files/articles_sample.csv')
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            state.import_csv(articles_path, os.path.join(directory, 'missing.csv'))
+            state.close()
+            output = self.run_python('from report import data_exists\n'
+                                     'print(data_exists("state.db"), data_exists(""))', directory)
+            self.assertEqual(output.strip(), 'True True')
+            with open(articles_path) as expected, open(os.path.join(directory, 'articles.csv')) as exported:
+                self.assertEqual(sorted(exported.read().splitlines()), sorted(expected.read().splitlines()))
+            self.assertTrue(os.path.isfile(os.path.join(directory, 'authors.csv')))
+
+    def test_item_collector(self):
+        """Test that scraped items are turned into articles dataframe in memory"""
+        collector = ItemCollector()
+        collector.item_scraped(ArticleItem(title='Title', url='https://blog.griddynamics.com/title/', text='Text',
+                                           publication_date=datetime.date(2020, 3, 3),
+                                           authors=['Author A'], tags=['Search', 'ML & AI']), None, None)
+        articles = articles_frame(collector.articles)
+        self.assertEqual(articles.tag.tolist(), ['Search', 'ML & AI'])
+        self.assertEqual(articles.publication_date.dtype.name, 'datetime64[ns]')
+
+    def test_load_articles(self):
+        """Test compact dtypes and csv cache of articles loader"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'articles.csv')
+            with open('unittests_files/articles_sample.csv') as src, open(path, mode='w') as dst:
+                dst.write(src.read())
+            articles = load_articles(path, cache=True)
+            self.assertEqual(articles.tag.dtype.name, 'category')
+            self.assertEqual(articles.publication_date.dtype.name, 'datetime64[ns]')
+            self.assertTrue(os.path.isfile(path + '.cache.pkl'))
+            cached = load_articles(path, columns=['publication_date', 'tag'], cache=True)
+            self.assertEqual(cached.columns.tolist(), ['publication_date', 'tag'])
+            self.assertTrue(cached.equals(articles[['publication_date', 'tag']]))
+
+
+class ItemsTest(unittest.TestCase):
+    """Unittests for compact item records"""
+
+    def test_records(self):
+        """Test field access, tuple equality, pickling and shared values of interned vocabularies"""
+        first = ArticleItem(title='Title', url='https://blog.griddynamics.com/title/', text='Text',
+                            publication_date=datetime.date(2020, 3, 3), authors=['Author A'], tags=['Search'])
+        second = ArticleItem('Other', 'https://blog.griddynamics.com/other/', 'Text', datetime.date(2020, 3, 3),
+                             [''.join(['Author ', 'A'])], [''.join(['Sea', 'rch'])])  # equal but distinct strings
+        self.assertIs(second['tags'][0], first.tags[0])
+        self.assertIs(second.authors[0], first['authors'][0])
+        self.assertIs(second.publication_date, first.publication_date)
+        self.assertEqual(first, ('Title', 'https://blog.griddynamics.com/title/', 'Text', datetime.date(2020, 3, 3),
+                                 ['Author A'], ['Search']))
+        self.assertEqual(pickle.loads(pickle.dumps(first)), first)
+        self.assertEqual(dict(AuthorItem(full_name='Author A', contacts=[])),
+                         {'full_name': 'Author A', 'job_title': None, 'linkedin': None, 'contacts': [],
+                          'articles_counter': None, 'url': None})
+        self.assertEqual(AuthorItem(full_name='Author A').get('url', ''), '')
+        with self.assertRaises(KeyError):
+            ArticleItem(title='Title', author='Author A')
+        with self.assertRaises(AttributeError):
+            first.comments = []  # no per-item dict
+        with self.assertRaises(KeyError):
+            first['comments'] = []
+
+    def test_exporters(self):
+        """Test that records are exported by Scrapy feed exporters (scrapy crawl -o items.jl / items.csv)"""
+        article = ArticleItem(title='Title', url='https://blog.griddynamics.com/title/', text='Text',
+                              publication_date=datetime.date(2020, 3, 3), authors=['Author A'], tags=['Search'])
+        self.assertEqual(list(ArticleItem.fields), list(ArticleItem.field_names))
+        output = io.BytesIO()
+        exporter = JsonLinesItemExporter(output)
+        exporter.export_item(article)
+        self.assertEqual(json.loads(output.getvalue().decode('utf-8')),
+                         {'title': 'Title', 'url': 'https://blog.griddynamics.com/title/', 'text': 'Text',
+                          'publication_date': '2020-03-03', 'authors': ['Author A'], 'tags': ['Search']})
+        output = io.BytesIO()
+        exporter = CsvItemExporter(output)
+        exporter.start_exporting()
+        exporter.export_item(AuthorItem(full_name='Author A', job_title='Engineer', contacts=[], articles_counter=2))
+        exporter.finish_exporting()
+        self.assertEqual(output.getvalue().decode('utf-8').splitlines(),
+                         ['full_name,job_title,linkedin,contacts,articles_counter,url', 'Author A,Engineer,,,2,'])
+
+    def test_vocabulary_limit(self):
+        """Test that vocabularies stop interning new values when full and are cleared after a crawl"""
+        vocabulary = Vocabulary(limit=2)
+        first = vocabulary.intern(''.join(['Tag ', 'A']))
+        self.assertEqual(vocabulary.intern_list(['Tag A', 'Tag B']), ['Tag A', 'Tag B'])
+        self.assertIs(vocabulary.intern('Tag A'), first)
+        vocabulary.intern_list(['Tag C', 'Tag D'])
+        self.assertEqual(len(vocabulary), 2)
+        vocabulary.clear()
+        self.assertEqual(len(vocabulary), 0)
+        ArticleItem(title='Title', tags=['Search'])
+        self.assertTrue(len(TAGS) > 0)
+        clear_vocabularies()
+        self.assertEqual(len(TAGS), 0)
+
+
+class PipelineTest(unittest.TestCase):
+    """Unittests for GdBlogSpiderPipeline"""
+
+    def test_buffered_csv_output(self):
+        """Test that items are expanded to csv rows and flushed on close"""
+        with tempfile.TemporaryDirectory() as directory:
+            spider = GDBlogCrawler()
+            spider.output_articles = os.path.join(directory, 'articles.csv')
+            spider.output_authors = os.path.join(directory, 'authors.csv')
+            pipeline = GdBlogSpiderPipeline(buffer_size=100)
+            pipeline.open_spider(spider)
+            pipeline.process_item(ArticleItem(title='Title', url='https://blog.griddynamics.com/title/', text='Text',
+                                              publication_date=datetime.date(2020, 3, 3),
+                                              authors=['Author A', 'Author B'], tags=['Search']), spider)
+            pipeline.process_item(AuthorItem(full_name='Author A', job_title='Engineer', linkedin='',
+                                             contacts=[], articles_counter=1), spider)
+            self.assertFalse(os.path.isfile(spider.output_articles))  # rows are still buffered
+            pipeline.close_spider(spider)
+            with open(spider.output_articles) as f:
+                self.assertEqual(f.read().splitlines(),
+                                 ['title,url,text,publication_date,author,tag',
+                                  'Title,https://blog.griddynamics.com/title/,Text,2020-03-03,Author A,Search',
+                                  'Title,https://blog.griddynamics.com/title/,Text,2020-03-03,Author B,Search'])
+            with open(spider.output_authors) as f:
+                self.assertEqual(f.read().splitlines(),
+                                 ['full_name,job_title,linkedin,contact,articles_counter',
+                                  'Author A,Engineer,,,1'])
+
+    def test_normalized_csv_output(self):
+        """Test that normalized layout stores article once and flat view gives the old rows"""
+        with tempfile.TemporaryDirectory() as directory:
+            spider = GDBlogCrawler()
+            spider.output_articles = os.path.join(directory, 'articles.csv')
+            spider.output_authors = os.path.join(directory, 'authors.csv')
+            pipeline = GdBlogSpiderPipeline(buffer_size=100, layout='normalized')
+            pipeline.open_spider(spider)
+            pipeline.process_item(ArticleItem(title='Title', url='https://blog.griddynamics.com/title/', text='Text',
+                                              publication_date=datetime.date(2020, 3, 3),
+                                              authors=['Author A', 'Author B'], tags=['Search', 'QA']), spider)
+            pipeline.close_spider(spider)
+            with open(spider.output_articles) as f:
+                self.assertEqual(f.read().splitlines(),
+                                 ['title,url,text,publication_date',
+                                  'Title,https://blog.griddynamics.com/title/,Text,2020-03-03'])
+            with open(os.path.join(directory, 'article_tags.csv')) as f:
+                self.assertEqual(f.read().splitlines(), ['url,tag', 'https://blog.griddynamics.com/title/,Search',
+                                                         'https://blog.griddynamics.com/title/,QA'])
+            articles = load_articles(spider.output_articles)
+            self.assertEqual(list(zip(articles.author, articles.tag)),
+                             [('Author A', 'Search'), ('Author A', 'QA'), ('Author B', 'Search'), ('Author B', 'QA')])
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            self.assertEqual(state.import_csv(spider.output_articles, spider.output_authors), (1, 0))
+            state.close()
+
+    def test_author_index(self):
+        """Test AuthorIndex counters update and atomic save"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'authors.csv')
+            with open(path, mode='w', newline='', encoding='utf-8') as f:
+                f.write('full_name,job_title,linkedin,contact,articles_counter\n'
+                        'Author A,Engineer,,https://twitter.com/a,1\n'
+                        'Author A,Engineer,,https://github.com/a,1\n')
+            index = AuthorIndex(path).load()
+            self.assertTrue(index.increment('Author A'))
+            self.assertFalse(index.increment('Author B'))  # unknown author -> must be parsed
+            index.add(AuthorItem(full_name='Author B', job_title='Manager', linkedin='https://linkedin.com/b',
+                                 contacts=[], articles_counter=1))
+            index.save()
+            with open(path) as f:
+                self.assertEqual(f.read().splitlines(),
+                                 ['full_name,job_title,linkedin,contact,articles_counter',
+                                  'Author A,Engineer,,https://twitter.com/a,2',
+                                  'Author A,Engineer,,https://github.com/a,2',
+                                  'Author B,Manager,https://linkedin.com/b,,1'])
+
+
+class StateTest(unittest.TestCase):
+    """Unittests for CrawlState"""
+
+    def test_import_and_export_csv(self):
+        """Test that csv data survives a round trip through the state store"""
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            state.import_csv('unittests_files/articles_sample.csv', os.path.join(directory, 'missing.csv'))
+            self.assertEqual(state.last_publication_date(), ('2020-03-03', datetime.date(2020, 3, 3)))
+            self.assertTrue(state.is_seen('https://blog.griddynamics.com/understanding-search-query-intent-'
+                                          'with-deep-learning/'))
+            state.export_csv(os.path.join(directory, 'articles.csv'), os.path.join(directory, 'authors.csv'))
+            state.close()
+            with open('unittests_files/articles_sample.csv') as expected, \
+                    open(os.path.join(directory, 'articles.csv')) as exported:
+                self.assertEqual(sorted(exported.read().splitlines()), sorted(expected.read().splitlines()))
+
+    def test_change_detection(self):
+        """Test that sitemap lastmod is compared with saved lastmod or with time of the last fetch"""
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            url = 'https://blog.griddynamics.com/title/'
+            self.assertTrue(state.is_changed(url, '2020-03-03'))  # never fetched
+            state.add_article({'title': 'Title', 'url': url, 'text': 'Text', 'publication_date': '2020-03-03',
+                               'authors': ['Author A'], 'tags': ['Search']})
+            self.assertFalse(state.is_changed(url, '2020-03-03T10:00:00Z'))  # fetched after that
+            state.set_validators(url, lastmod='2020-03-05T10:00:00+00:00', etag='"abc"')
+            state.set_validators(url, last_modified='Thu, 05 Mar 2020 10:00:00 GMT')
+            self.assertEqual(state.get_validators(url),
+                             ('2020-03-05T10:00:00+00:00', '"abc"', 'Thu, 05 Mar 2020 10:00:00 GMT'))
+            self.assertFalse(state.is_changed(url, '2020-03-05T10:00:00Z'))
+            self.assertTrue(state.is_changed(url, '2020-03-06'))
+            self.assertTrue(state.is_changed(url, None))  # no lastmod -> conditional request decides
+            state.close()
+
+    def test_report_aggregates(self):
+        """Test that aggregates are updated with every stored item and give the same report as csv files"""
+        with tempfile.TemporaryDirectory() as directory:
+            authors_path = os.path.join(directory, 'authors.csv')
+            with open(authors_path, mode='w', encoding='utf-8') as f:
+                f.write('full_name,job_title,linkedin,contact,articles_counter\n'
+                        'Author A,Engineer,,a@example.com,2\nAuthor A,Engineer,,b@example.com,2\n'
+                        'Author B,,https://linkedin.com/b,,5\nAuthor C,,,,2\n')
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            state.import_csv('unittests_files/articles_sample.csv', authors_path)
+            expected = load_report('unittests_files/articles_sample.csv', authors_path)
+            result = state_report(state)
+            self.assertEqual(list(result.top7_tags.items()), list(expected.top7_tags.items()))
+            self.assertEqual(df_to_str(result.top5_articles), df_to_str(expected.top5_articles))
+            self.assertEqual(df_to_str(result.top5_authors), df_to_str(expected.top5_authors))
+
+            url = 'https://blog.griddynamics.com/title/'
+            article = {'title': 'Title', 'url': url, 'text': 'Text', 'publication_date': '2021-01-01',
+                       'authors': ['Author A'], 'tags': ['Brand new', 'Search']}
+            counts = dict(state.top_tags(100))
+            state.add_article(article)
+            state.add_article(dict(article, tags=['Brand new', 'Brand new']))  # updated article
+            self.assertEqual(dict(state.top_tags(100)), dict(counts, **{'Brand new': 1}))
+            self.assertEqual(state.newest_articles(1)[0][:2], ('Title', url))
+            other = dict(article, url='https://blog.griddynamics.com/same-title/', tags=['Brand new'])
+            state.add_article(other)  # articles are counted by title, as pandas nunique of titles does
+            self.assertEqual(dict(state.top_tags(100)), dict(counts, **{'Brand new': 1}))
+            state.add_article(dict(other, title='Other title'))
+            self.assertEqual(dict(state.top_tags(100)), dict(counts, **{'Brand new': 2}))
+            state.add_article(dict(other, title='Title'))
+            self.assertEqual(dict(state.top_tags(100)), dict(counts, **{'Brand new': 1}))
+            state.connection.execute('DELETE FROM tag_counts')
+            state.close()
+            state = CrawlState(os.path.join(directory, 'state.db'))  # aggregates are rebuilt
+            self.assertEqual(dict(state.top_tags(100)), dict(counts, **{'Brand new': 1}))
+            state.export_csv(os.path.join(directory, 'articles.csv'), authors_path)
+            expected = load_report(os.path.join(directory, 'articles.csv'), authors_path)
+            self.assertEqual(list(state_report(state).top7_tags.items()), list(expected.top7_tags.items()))
+            state.connection.execute('DELETE FROM tag_titles')  # store counting urls per tag
+            state.close()
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            self.assertEqual(dict(state.top_tags(100)), dict(counts, **{'Brand new': 1}))
+            state.close()
+
+
+class QueryTest(unittest.TestCase):
+    """Unittests for the query index of articles"""
+
+    def test_article_index(self):
+        """Test lookups by tag, author, words and dates and incremental update of changed articles"""
+        with tempfile.TemporaryDirectory() as directory:
+            state_db = os.path.join(directory, 'state.db')
+            state = CrawlState(state_db)
+            for i in range(6):
+                state.add_article({'title': 'Article {}'.format(i), 'url': 'https://blog.example/{}/'.format(i),
+                                   'text': 'Kubernetes operators' if i % 2 else 'Spark streaming',
+                                   'publication_date': datetime.date(2020, 3, i + 1),
+                                   'authors': ['Author A', 'Author B'] if i < 2 else ['Author A'],
+                                   'tags': ['Cloud'] if i % 3 == 0 else ['Big Data']})
+            state.close()
+            index = ArticleIndex(os.path.join(directory, 'index.db'))
+            self.assertEqual((index.update(state_db), index.update(state_db)), (6, 0))
+
+            def urls(articles):  # numbers of found articles, newest first
+                return [article['url'][-2] for article in articles]
+
+            self.assertEqual(urls(index.find(tag='cloud')), ['3', '0'])
+            self.assertEqual(urls(index.find(author='Author B', limit=None)), ['1', '0'])
+            self.assertEqual(urls(index.find(text='kubernetes', tag='Big Data', since='2020-03-02', limit=2)),
+                             ['5', '1'])
+            self.assertEqual(urls(index.find(since=datetime.date(2020, 3, 3), until='2020-03-04')), ['3', '2'])
+            self.assertEqual(index.find(text='kubernetes spark'), [])
+
+            state = CrawlState(state_db)
+            state.add_article({'title': 'Article 3', 'url': 'https://blog.example/3/', 'text': 'Spark streaming',
+                               'publication_date': '2020-03-04', 'authors': ['Author C'], 'tags': ['Big Data']})
+            state.close()
+            self.assertEqual(index.update(state_db), 1)
+            self.assertEqual(urls(index.find(tag='cloud')), ['0'])
+            self.assertEqual(index.find(author='author c'),
+                             [{'title': 'Article 3', 'url': 'https://blog.example/3/', 'publication_date': '2020-03-04',
+                               'authors': ['Author C'], 'tags': ['Big Data']}])
+            self.assertEqual(urls(index.find(text='kubernetes')), ['5', '1'])
+            index.close()
+
+
+class ArchiveTest(unittest.TestCase):
+    """Unittests for PageArchive and offline re-parse"""
+
+    def test_archive_and_reparse(self):
+        """Test that same content is stored once and re-parse uses the last fetch of every page"""
+        url = 'https://blog.griddynamics.com/sample/'
+        with open(r'unittests_files/article_sample.htm', 'rb') as f:
+            body = f.read()
+        with tempfile.TemporaryDirectory() as directory:
+            archive = PageArchive(os.path.join(directory, 'archive'))
+            self.assertTrue(archive.store(url, b'<html><body>old version</body></html>', 'utf-8',
+                                          'blog_scraper', 'parse_article', fetched_at='2020-03-01T00:00:00'))
+            self.assertTrue(archive.store(url, body, 'utf-8', 'blog_scraper', 'parse_article',
+                                          fetched_at='2020-03-02T00:00:00'))
+            self.assertFalse(archive.store('https://blog.griddynamics.com/all-authors/', body, 'utf-8',
+                                           'blog_scraper', 'parse'))  # same content, not a re-parsed callback
+            self.assertEqual(archive.counts()[:2], (3, 2))
+            self.assertEqual(len(archive.history(url)), 2)
+            archive.close()
+            output = os.path.join(directory, 'reparsed')
+            self.assertEqual(reparse(os.path.join(directory, 'archive'), output, layout='flat'), 1)
+            with open(os.path.join(output, 'articles.csv'), newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(len(rows), 6)  # 2 authors x 3 tags
+            self.assertEqual({row['title'] for row in rows},
+                             {'Tiered machine learned ranking improves relevance for the retail search'})
+
+
+class DupeFilterTest(unittest.TestCase):
+    """Unittests for Bloom filter dedup of requests"""
+
+    def test_scalable_bloom_filter(self):
+        """Test that filter has no false negatives, grows and keeps error rate"""
+        bloom = ScalableBloomFilter(capacity=1000, error_rate=0.01)
+        keys = [request_fingerprint(Request('https://blog.example/{}/'.format(i))) for i in range(5000)]
+        for key in keys[:2500]:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys[:2500]))
+        self.assertEqual(len(bloom.filters), 2)  # 1000 + 2000 keys
+        false_positives = sum(key in bloom for key in keys[2500:])
+        self.assertLess(false_positives / 2500, 0.03)
+        restored = ScalableBloomFilter(capacity=1000, error_rate=0.01)
+        self.assertTrue(restored.load(bloom.to_bytes()))
+        self.assertEqual((len(restored), restored.nbytes), (len(bloom), bloom.nbytes))
+        self.assertEqual([key in restored for key in keys], [key in bloom for key in keys])
+        self.assertFalse(ScalableBloomFilter(capacity=2000, error_rate=0.01).load(bloom.to_bytes()))
+
+    def test_bloom_dupefilter(self):
+        """Test that duplicates and known pages are dropped and false positives are confirmed by the exact store"""
+        with tempfile.TemporaryDirectory() as directory:
+            state = CrawlState(os.path.join(directory, 'state.db'))
+            state.add_article({'title': 'Known', 'url': 'https://blog.example/known/', 'text': 'Text',
+                               'publication_date': '2020-03-03', 'authors': ['Author A'], 'tags': ['Search']})
+            state.close()
+            dupefilter = BloomDupeFilter(os.path.join(directory, 'dupefilter.db'),
+                                         state_db=os.path.join(directory, 'state.db'), seed=True)
+            dupefilter.open()
+            self.assertTrue(dupefilter.request_seen(Request('https://blog.example/known/')))
+            self.assertFalse(dupefilter.request_seen(Request('https://blog.example/new/')))
+            self.assertTrue(dupefilter.request_seen(Request('https://blog.example/new/')))
+            dupefilter.filter.add(request_fingerprint(Request('https://blog.example/other/')))  # false positive
+            self.assertFalse(dupefilter.request_seen(Request('https://blog.example/other/')))
+            self.assertEqual((dupefilter.known_filtered, dupefilter.false_positives), (1, 1))
+            dupefilter.close('finished')
+
+            dupefilter = BloomDupeFilter(os.path.join(directory, 'dupefilter.db'),
+                                         state_db=os.path.join(directory, 'state.db'))
+            dupefilter.open()  # not seeded, requests of the previous crawl are forgotten
+            self.assertFalse(dupefilter.request_seen(Request('https://blog.example/known/')))
+            self.assertFalse(dupefilter.request_seen(Request('https://blog.example/new/')))
+            dupefilter.close('finished')
+
+    def test_saved_filter(self):
+        """Test that the filter of known pages is restored and only pages saved since the last crawl are hashed"""
+        with tempfile.TemporaryDirectory() as directory:
+            state_db, path = os.path.join(directory, 'state.db'), os.path.join(directory, 'dupefilter.db')
+            state = CrawlState(state_db)
+            for i in range(3):
+                state.add_article({'title': 'Known', 'url': 'https://blog.example/{}/'.format(i), 'text': 'Text',
+                                   'publication_date': '2020-03-03', 'authors': [], 'tags': []})
+            state.commit()
+            dupefilter = BloomDupeFilter(path, state_db=state_db, seed=True)
+            dupefilter.open()
+            self.assertEqual((len(dupefilter.filter), dupefilter.seeded), (3, 3))
+            self.assertFalse(dupefilter.request_seen(Request('https://blog.example/new/')))
+            dupefilter.close('finished')
+
+            state.add_article({'title': 'Known', 'url': 'https://blog.example/new/', 'text': 'Text',
+                               'publication_date': '2020-03-04', 'authors': [], 'tags': []})
+            state.close()
+            dupefilter = BloomDupeFilter(path, state_db=state_db, seed=True)
+            dupefilter.open()
+            self.assertEqual((len(dupefilter.filter), dupefilter.seeded), (4, 1))  # requests of the session
+            self.assertTrue(all(dupefilter.request_seen(Request('https://blog.example/{}/'.format(page)))
+                                for page in (0, 1, 2, 'new')))  # of the previous crawl are not in the filter
+            self.assertEqual((dupefilter.known_filtered, dupefilter.false_positives), (4, 0))
+            dupefilter.close('finished')
+
+            dupefilter = BloomDupeFilter(path, state_db=state_db, seed=True, capacity=100)
+            dupefilter.open()  # filter of other parameters -> rebuilt from the exact store
+            self.assertEqual((len(dupefilter.filter), dupefilter.seeded), (4, 4))
+            dupefilter.close('finished')
+
+            os.remove(state_db)  # recreated store, it has more seen urls than the old one had
+            state = CrawlState(state_db)
+            for i in range(10, 16):
+                state.add_article({'title': 'Other', 'url': 'https://blog.example/{}/'.format(i), 'text': 'Text',
+                                   'publication_date': '2020-03-05', 'authors': [], 'tags': []})
+            state.close()
+            dupefilter = BloomDupeFilter(path, state_db=state_db, seed=True)
+            dupefilter.open()
+            self.assertEqual((len(dupefilter.filter), dupefilter.seeded), (6, 6))
+            self.assertFalse(dupefilter.request_seen(Request('https://blog.example/0/')))  # known by the old store
+            self.assertTrue(dupefilter.request_seen(Request('https://blog.example/10/')))
+            dupefilter.close('finished')
+
+
+class ShardTest(unittest.TestCase):
+    """Unittests for the sharded crawl"""
+
+    def test_shard_queue(self):
+        """Test that requests are pushed once, leased by one worker and leased again when the lease expires"""
+        with tempfile.TemporaryDirectory() as directory:
+            worker0 = ShardQueue(os.path.join(directory, 'queue.db'), lease=0.0)  # its leases expire at once
+            queue = ShardQueue(os.path.join(directory, 'queue.db'), lease=60.0)
+            requests = [('fp{}'.format(i), 'https://blog.example/{}/'.format(i), 'parse', i % 2) for i in range(4)]
+            self.assertEqual(worker0.sync(0, requests, limit=2), [requests[1], requests[3]])  # by priority
+            worker0.sync(0, acks=['fp1'])
+            worker0.close()
+            self.assertEqual(queue.sync(1, requests[:2], limit=2), [requests[3], requests[0]])  # fp3 expired
+            self.assertEqual(queue.sync(1, acks=['fp3', 'fp0'], limit=10), [requests[2]])
+            self.assertFalse(queue.is_finished())
+            queue.sync(1, failed=['fp2'])
+            self.assertTrue(queue.is_finished())
+            self.assertEqual((queue.counts()[DONE], queue.counts()[FAILED]), (3, 1))
+            queue.close()
+
+    def test_merge(self):
+        """Test that state stores of workers are merged into one dataset"""
+        with tempfile.TemporaryDirectory() as directory:
+            directories = [os.path.join(directory, 'worker-{}'.format(i)) for i in range(2)]
+            for i, worker_dir in enumerate(directories):
+                os.makedirs(worker_dir)
+                state = CrawlState(os.path.join(worker_dir, 'crawl_state.db'))
+                state.add_article({'title': 'Article {}'.format(i), 'url': 'https://blog.example/{}/'.format(i),
+                                   'text': 'Text', 'publication_date': '2020-03-0{}'.format(i + 1),
+                                   'authors': ['Author A'], 'tags': ['Tag {}'.format(i)]})
+                state.add_author({'full_name': 'Author A', 'job_title': 'Engineer', 'linkedin': '',
+                                  'contacts': [], 'articles_counter': 2})
+                state.close()
+                archive = PageArchive(os.path.join(worker_dir, 'archive'))
+                archive.store('https://blog.example/{}/'.format(i), b'page', 'utf-8', 'blog_scraper', 'parse_article')
+                archive.store('https://blog.example/authors/{}/'.format(i), 'author {}'.format(i).encode(), 'utf-8')
+                archive.close()
+            articles_path = os.path.join(directory, 'articles.csv')
+            authors_path = os.path.join(directory, 'authors.csv')
+            self.assertEqual(merge(directories, os.path.join(directory, 'state.db'), articles_path, authors_path),
+                             (2, 1))
+            with open(articles_path, newline='', encoding='utf-8') as f:
+                self.assertEqual([row['title'] for row in csv.DictReader(f)], ['Article 0', 'Article 1'])
+            with open(authors_path, newline='', encoding='utf-8') as f:
+                self.assertEqual([row['full_name'] for row in csv.DictReader(f)], ['Author A'])
+            archive_dir = os.path.join(directory, 'archive')
+            self.assertEqual(merge_archives(directories, archive_dir), (4, 3))  # same content is stored once
+            archive = PageArchive(archive_dir)
+            self.assertEqual(archive.counts()[:2], (4, 3))
+            self.assertEqual(read_blob(archive_dir, archive.history('https://blog.example/1/')[0][1]), b'page')
+            archive.close()
+
+
+class MiddlewareTest(unittest.TestCase):
+    """Unittests for downloader and spider middlewares"""
+
+    def test_concurrency_controller(self):
+        """Test that concurrency grows on fast responses and is halved on slow ones and errors"""
+        controller = ConcurrencyController(8, min_concurrency=2, max_concurrency=10, target_latency=1.0, window=5)
+        decisions = [controller.observe(0.1) for _ in range(15)]
+        self.assertEqual(decisions.count('increase'), 2)
+        self.assertEqual(controller.concurrency, 10)  # bounded by max_concurrency
+        for _ in range(5):
+            controller.observe(0.1, error=True)
+        self.assertEqual(controller.concurrency, 5)
+        for _ in range(30):
+            controller.observe(5.0)
+        self.assertEqual(controller.concurrency, 2)  # bounded by min_concurrency
+
+    def test_profiling_middleware(self):
+        """Test that callback output is timed and profile is saved to stats and JSON file"""
+        class Stats(dict):
+            def set_value(self, key, value):
+                self[key] = value
+
+        with tempfile.TemporaryDirectory() as directory:
+            spider = GDBlogCrawler()
+            middleware = ProfilingSpiderMiddleware(Stats(), os.path.join(directory, '%(name)s_profile.json'))
+            self.assertIs(stage('extract'), NULL_STAGE)  # profiling is disabled
+            middleware.spider_opened(spider)
+            response = HtmlResponse(url='https://blog.griddynamics.com/all-authors/', encoding='utf-8',
+                                    body='<html><body><div id="wrap"></div></body></html>',
+                                    request=Request('https://blog.griddynamics.com/all-authors/'))
+            middleware.process_spider_input(response, spider)
+            output = list(middleware.process_spider_output(response, spider.parse(response), spider))
+            middleware.spider_closed(spider, 'finished')
+            self.assertIs(stage('extract'), NULL_STAGE)
+            self.assertEqual(len(output), 3)  # requests for authors not shown at /all-authors/
+            self.assertEqual(middleware.stats['profile/callback/parse/requests'], 3)
+            self.assertEqual(middleware.stats['profile/callback/parse/bytes'], len(response.body))
+            with open(os.path.join(directory, 'blog_scraper_profile.json')) as f:
+                profile = json.load(f)
+            self.assertEqual(profile['callback']['parse']['calls'], 1)
+
+    def test_conditional_request_middleware(self):
+        """Test that validators of fetched pages are saved and sent back, and 304 responses are passed to spider"""
+        class Stats(dict):
+            def inc_value(self, key):
+                self[key] = self.get(key, 0) + 1
+
+        url = 'https://blog.griddynamics.com/title/'
+        with tempfile.TemporaryDirectory() as directory:
+            spider = BlogUpdateSpider()
+            spider.state = CrawlState(os.path.join(directory, 'state.db'))
+            middleware = ConditionalRequestMiddleware(Stats())
+            request = Request(url)
+            self.assertIsNone(middleware.process_request(request, spider))
+            self.assertNotIn('If-None-Match', request.headers)  # page was never fetched
+            response = HtmlResponse(url=url, body=b'<html></html>', encoding='utf-8', request=request,
+                                    headers={'ETag': '"v1"', 'Last-Modified': 'Tue, 03 Mar 2020 10:00:00 GMT'})
+            self.assertIs(middleware.process_response(request, response, spider), response)
+            self.assertEqual(spider.state.get_validators(url), (None, '"v1"', 'Tue, 03 Mar 2020 10:00:00 GMT'))
+
+            request = Request(url)
+            middleware.process_request(request, spider)
+            self.assertEqual((request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')),
+                             (b'"v1"', b'Tue, 03 Mar 2020 10:00:00 GMT'))
+            not_modified = Response(url=url, status=304, request=request)
+            self.assertIs(middleware.process_response(request, not_modified, spider), not_modified)
+            self.assertEqual(spider.state.get_validators(url), (None, '"v1"', 'Tue, 03 Mar 2020 10:00:00 GMT'))
+            self.assertEqual(middleware.stats, {'conditional_requests/sent': 1, 'conditional_requests/not_modified': 1})
+
+            crawler = GDBlogCrawler()  # spider without conditional_requests never gets 304
+            crawler.state = spider.state
+            request = Request(url)
+            middleware.process_request(request, crawler)
+            self.assertNotIn('If-None-Match', request.headers)
+            spider.state.close()
+
+    def test_checkpoint_middleware(self):
+        """Test that requests are saved to the frontier, known ones are dropped and pending ones are resumed"""
+        class Stats(dict):
+            def set_value(self, key, value):
+                self[key] = value
+
+            def inc_value(self, key):
+                self[key] = self.get(key, 0) + 1
+
+        with tempfile.TemporaryDirectory() as directory:
+            spider = GDBlogCrawler()
+            spider.state = CrawlState(os.path.join(directory, 'state.db'))
+            middleware = CheckpointMiddleware(Stats(), interval=0)
+            start = list(middleware.process_start_requests(spider.start_requests(), spider))
+            self.assertTrue(spider.state.has_frontier(spider.name))
+            response = HtmlResponse(url=start[0].url, encoding='utf-8', request=start[0],
+                                    body='<html><body><div id="wrap"></div></body></html>')
+            output = list(middleware.process_spider_output(response, spider.parse(response), spider))
+            self.assertEqual(len(output), 3)
+            again = list(middleware.process_spider_output(response, spider.parse(response), spider))
+            self.assertEqual(again, [])  # requests are known already
+            self.assertEqual(middleware.stats['checkpoint/known_requests'], 3)
+            self.assertEqual(spider.state.frontier_counts(spider.name), (1, 3))
+
+            spider.resumed = True  # next run after the crawl was interrupted
+            resumed = list(middleware.process_start_requests(spider.start_requests(), spider))
+            self.assertEqual([request.url for request in resumed], [request.url for request in output])
+            self.assertEqual([request.callback for request in resumed], [request.callback for request in output])
+            middleware.spider_idle(spider)
+            self.assertFalse(spider.state.has_frontier(spider.name))
+            spider.state.close()
+
 
 if __name__ == '__main__':
     unittest.main()